@@ -33,17 +33,11 @@ class FileCleanerApp:
         """清理资源"""
         print("Cleaning up resources...")
         try:
-            # 确保GUI关闭
+            # 确保GUI关闭：取消扫描和备份、保存检查点后销毁窗口，可重复调用
             if hasattr(self, 'gui') and hasattr(self.gui, 'on_close'):
                 self.gui.on_close()
-                # gui.on_close已经包含了os._exit调用，所以这个函数不会继续执行
-            
-            # 如果on_close没有退出程序，那么我们在这里强制退出
-            print("Force exit from cleanup")
-            os._exit(0)
         except Exception as e:
             print(f"Error during cleanup: {e}")
-            os._exit(1)
 
 def signal_handler(sig, frame):
     """处理信号以确保正确关闭"""
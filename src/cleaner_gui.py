@@ -4,15 +4,35 @@ from tkinter import ttk, filedialog, messagebox
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import math
-import time
+import queue
 import threading
 import shutil
 
+from core.dedup import collapse_duplicates, directories_identical
+from core.scan_events import (
+    FILE_DISCOVERED, LARGE_FILE, OLD_FILE, DUPLICATE_GROUP, HARDLINK_GROUP, DUPLICATE_DIRECTORY
+)
+from src.utils.cancellation import CancellationToken
+
+# 界面线程取出后台扫描事件的间隔和每次最多处理的事件数
+SCAN_POLL_INTERVAL_MS = 50
+SCAN_EVENTS_PER_POLL = 500
+
 class CleanerGUI:
     def __init__(self, scanner, optimizer, advisor):
         self.scanner = scanner
         self.optimizer = optimizer
         self.advisor = advisor
+        # 重复分组哈希 -> 界面中的行，扫描结束后按重复目录合并
+        self.duplicate_rows = {}
+        # 重复目录 -> 所在分组的全部副本，删除前用于再次确认
+        self.duplicate_folders = {}
+        # 正在进行的扫描的取消令牌，Stop按钮和关闭窗口时取消
+        self.scan_token = None
+        # 后台扫描线程交给界面线程的事件队列
+        self.scan_events = None
+        self.files_found = 0
+        self.closing = False
         self.window = tk.Tk()
         self.window.title("File Cleaner Assistant")
         self.window.geometry("800x600")
@@ -38,6 +58,19 @@ class CleanerGUI:
         
         self.scan_button = ttk.Button(self.scan_frame, text="Start Scan", command=self.start_scan)
         self.scan_button.grid(row=0, column=2, padx=5, pady=5)
+
+        self.stop_button = ttk.Button(self.scan_frame, text="Stop", command=self.stop_scan,
+                                      state=tk.DISABLED)
+        self.stop_button.grid(row=0, column=3, padx=5, pady=5)
+
+        # 保存检查点以便中断后继续，默认取自配置；开启后改用顺序遍历并把每个文件写入检查点
+        self.checkpoint_var = tk.BooleanVar(value=getattr(self.scanner, 'checkpoint_enabled', False))
+        if hasattr(self.scanner, 'checkpoint_enabled'):
+            self.checkpoint_check = ttk.Checkbutton(
+                self.scan_frame, text="Resumable (slower: no parallel walk)",
+                variable=self.checkpoint_var
+            )
+            self.checkpoint_check.grid(row=0, column=4, padx=5, pady=5)
         
         # 结果显示区域
         self.results_frame = ttk.LabelFrame(self.main_frame, text="Results", padding="5")
@@ -81,71 +114,167 @@ class CleanerGUI:
             self.path_var.set(directory)
     
     def start_scan(self):
-        """开始扫描目录"""
+        """开始扫描目录
+
+        扫描在后台线程中进行，事件经队列交给界面线程显示，界面在整个扫描期间
+        （包括大小分组和哈希单个大文件时）保持响应，Stop按钮和关闭窗口随时生效。
+        """
+        # 同一时间只进行一个扫描
+        if self.scan_token is not None:
+            return
         directory = self.path_var.get()
         if not directory:
             messagebox.showerror("Error", "Please select a directory first")
             return
         
+        # 上次扫描被中断时询问是否从检查点继续
+        resume = False
+        if hasattr(self.scanner, 'has_checkpoint') and self.scanner.has_checkpoint(directory):
+            resume = messagebox.askyesno(
+                "Resume Scan", "A previous scan of this directory was interrupted. Resume it?"
+            )
+
+        if hasattr(self.scanner, 'checkpoint_enabled'):
+            self.scanner.checkpoint_enabled = self.checkpoint_var.get()
+        self.status_var.set("Scanning...")
+        
+        # 清空现有结果
+        for item in self.tree.get_children():
+            self.tree.delete(item)
+        self.duplicate_rows = {}
+        self.duplicate_folders = {}
+        self.files_found = 0
+        
+        # 流式扫描，结果一经确定就显示
+        self.scan_token = CancellationToken()
+        self.scan_events = queue.Queue()
+        # 扫描期间禁用扫描按钮，结束后由finish_scan恢复
+        self.scan_button.config(state=tk.DISABLED)
+        self.stop_button.config(state=tk.NORMAL)
+        threading.Thread(target=self.run_scan, name='gui_scan', daemon=True,
+                         args=(directory, resume, self.scan_token, self.scan_events)).start()
+        self.window.after(SCAN_POLL_INTERVAL_MS, self.poll_scan)
+
+    def run_scan(self, directory, resume, token, events):
+        """后台线程：扫描并把事件和最终结果放入队列，不访问界面"""
         try:
-            self.status_var.set("Scanning...")
-            self.window.update()
-            
-            # 执行扫描
-            scan_results = self.scanner.scan_directory(directory)
-            
-            # 获取优化建议
-            optimization_suggestions = self.optimizer.suggest_optimizations(scan_results)
-            
-            # 获取管理建议
-            recommendations = self.advisor.generate_recommendations(scan_results)
-            
-            # 清空现有结果
-            for item in self.tree.get_children():
-                self.tree.delete(item)
-            
-            # 显示扫描结果
-            self.display_results(scan_results, optimization_suggestions, recommendations)
-            
-            self.status_var.set("Scan completed")
-            
-            # 显示统计图表
-            self.show_statistics(scan_results)
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred during scanning: {str(e)}")
+            scan_results = self.scanner.new_results()
+            for event in self.scanner.iter_scan(directory, resume=resume, cancel=token):
+                self.scanner.collect_event(scan_results, event)
+                events.put(('event', event))
+            events.put(('done', scan_results))
+        except BaseException as e:
+            events.put(('error', e))
+
+    def poll_scan(self):
+        """界面线程：定期取出后台扫描的事件并显示，每次最多处理一批以免阻塞界面"""
+        for _ in range(SCAN_EVENTS_PER_POLL):
+            try:
+                kind, data = self.scan_events.get_nowait()
+            except queue.Empty:
+                break
+            if kind != 'event':
+                self.finish_scan(kind, data)
+                return
+            # 正在关闭窗口时只等待扫描结束，不再显示
+            if not self.closing:
+                self.display_event(data)
+            if data.type == FILE_DISCOVERED:
+                self.files_found += 1
+        if not self.scan_token.cancelled:
+            self.status_var.set(f"Scanning... {self.files_found} files")
+        self.window.after(SCAN_POLL_INTERVAL_MS, self.poll_scan)
+
+    def finish_scan(self, kind, data):
+        """界面线程：后台扫描结束后显示汇总"""
+        self.scan_token = None
+        self.scan_events = None
+        # 扫描期间关闭了窗口：扫描已取消并保存检查点，此时再销毁窗口
+        if self.closing:
+            self.window.destroy()
+            return
+        self.stop_button.config(state=tk.DISABLED)
+        self.scan_button.config(state=tk.NORMAL)
+        if kind == 'error':
+            messagebox.showerror("Error", f"An error occurred during scanning: {str(data)}")
             self.status_var.set("Scan failed")
+            return
+
+        scan_results = data
+        self.collapse_duplicate_rows(scan_results)
+        if scan_results['complete']:
+            self.status_var.set("Scan completed")
+        else:
+            self.status_var.set(f"Scan cancelled, showing partial results ({self.files_found} files)")
+        
+        # 显示统计图表
+        self.show_statistics(scan_results)
+
+    def stop_scan(self):
+        """取消正在进行的扫描，保留已得到的结果"""
+        if self.scan_token is not None:
+            self.scan_token.cancel('stopped by user')
+            self.status_var.set("Stopping scan...")
     
-    def display_results(self, scan_results, optimization_suggestions, recommendations):
-        """显示扫描结果"""
-        # 显示重复文件
-        for hash_value, duplicates in scan_results['duplicates'].items():
-            for file_path in duplicates:
-                size = os.path.getsize(file_path)
-                if math.isnan(size):
-                    size = 0
-                self.tree.insert('', 'end', values=('Duplicate', file_path, 
-                                                  self.format_size(size),
+    def display_event(self, event):
+        """显示单个流式扫描事件"""
+        if event.type == DUPLICATE_GROUP:
+            file_hash, files = event.data
+            self.duplicate_rows[file_hash] = [
+                self.tree.insert('', 'end', values=('Duplicate', file_path,
+                                                  self.format_size(os.path.getsize(file_path)),
                                                   'Remove duplicate'))
-        
-        # 显示大文件
-        for file_info in scan_results['large_files']:
-            size = file_info['size']
-            if math.isnan(size):
-                size = 0
-            self.tree.insert('', 'end', values=('Large File', file_info['path'],
-                                              self.format_size(size),
+                for file_path in files
+            ]
+        elif event.type == DUPLICATE_DIRECTORY:
+            for directory in event.data[1]:
+                self.duplicate_folders[directory] = event.data[1]
+                self.tree.insert('', 'end', values=('Duplicate Folder', directory,
+                                                  self.format_size(self.directory_size(directory)),
+                                                  'Remove duplicate folder'))
+        elif event.type == HARDLINK_GROUP:
+            # 硬链接共享同一份数据，删除不释放空间
+            for file_path in event.data[1]:
+                self.tree.insert('', 'end', values=('Hardlink', file_path,
+                                                  self.format_size(os.path.getsize(file_path)),
+                                                  'Shared storage'))
+        elif event.type == LARGE_FILE:
+            self.tree.insert('', 'end', values=('Large File', event.path,
+                                              self.format_size(event.data),
                                               'Optimize'))
-        
-        # 显示旧文件
-        for file_info in scan_results['old_files']:
-            size = os.path.getsize(file_info['path'])
-            if math.isnan(size):
-                size = 0
-            self.tree.insert('', 'end', values=('Old File', file_info['path'],
-                                              self.format_size(size),
+        elif event.type == OLD_FILE:
+            self.tree.insert('', 'end', values=('Old File', event.path,
+                                              self.format_size(os.path.getsize(event.path)),
                                               'Archive'))
     
+    def collapse_duplicate_rows(self, scan_results):
+        """扫描结束后移除已由重复目录覆盖的重复文件行"""
+        remaining = collapse_duplicates(scan_results['duplicates'],
+                                        scan_results.get('duplicate_directories', {}))
+        for file_hash, items in self.duplicate_rows.items():
+            if file_hash not in remaining:
+                self.tree.delete(*items)
+        self.duplicate_rows = {}
+
+    def identical_copy(self, directory):
+        """同一分组中与目录完全相同（不经过滤逐字节比较）的另一个副本，没有时返回None"""
+        for other in self.duplicate_folders.get(directory, ()):
+            if other != directory and directories_identical(directory, other):
+                return other
+        return None
+
+    @staticmethod
+    def directory_size(directory):
+        """目录中全部文件的大小之和"""
+        total = 0
+        for root, _, files in os.walk(directory):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
     def format_size(self, size):
         """格式化文件大小显示"""
         for unit in ['B', 'KB', 'MB', 'GB']:
@@ -202,7 +331,16 @@ class CleanerGUI:
             for item in selected_items:
                 values = self.tree.item(item)['values']
                 try:
-                    os.remove(values[1])  # values[1] 是文件路径
+                    if values[0] == 'Duplicate Folder':
+                        # 扫描结果可能已过时，只有仍存在逐字节相同的副本时才删除
+                        if self.identical_copy(values[1]) is None:
+                            messagebox.showerror(
+                                "Error", f"Not deleting {values[1]}: no identical copy remains"
+                            )
+                            continue
+                        shutil.rmtree(values[1])
+                    else:
+                        os.remove(values[1])  # values[1] 是文件路径
                     self.tree.delete(item)
                 except Exception as e:
                     messagebox.showerror("Error", f"Failed to delete {values[1]}: {str(e)}")
@@ -348,7 +486,7 @@ class CleanerGUI:
                 f"{base_name} - 副本{ext}",
                 f"{base_name}_副本{ext}",
                 f"{base_name}(副本){ext}",
-                f"{base_name} - 副本 ({d}){ext}" for d in range(1, 10)
+                *(f"{base_name} - 副本 ({d}){ext}" for d in range(1, 10))
             ]
             
             # 遍历目录查找匹配的副本文件
@@ -389,48 +527,52 @@ class CleanerGUI:
         messagebox.showinfo("Success", "Selected items have been backed up")
     
     def on_close(self):
-        """关闭应用程序并终止所有后台线程"""
+        """关闭应用程序：取消正在进行的扫描和备份，保存检查点后销毁窗口
+
+        后台线程在各自检查取消令牌后退出，进程正常结束，不再强制终止。
+        """
+        if self.closing:
+            return
+        self.closing = True
         try:
             print("Closing application...")
             
-            # 终止扫描器中的线程
+            # 取消正在进行的扫描，后台扫描结束后由finish_scan销毁窗口
+            if self.scan_token is not None:
+                print("Cancelling scan...")
+                self.scan_token.cancel('application closing')
+
+            # 取消多线程扫描器中的扫描
             if hasattr(self.scanner, 'threaded_scanner'):
                 print("Stopping scanner threads...")
-                # 设置停止事件
-                self.scanner.threaded_scanner.stop_event.set()
+                self.scanner.threaded_scanner.cancel('application closing')
+
+            # 保存正在进行的扫描的检查点，下次可以继续
+            if hasattr(self.scanner, 'save_checkpoint'):
+                print("Saving scan checkpoint...")
+                self.scanner.save_checkpoint()
                 
             # 终止优化器中的线程
             if hasattr(self.optimizer, 'stop_all_tasks'):
                 print("Stopping optimizer tasks...")
                 self.optimizer.stop_all_tasks()
                 
-            # 终止备份过程中的线程
+            # 取消正在进行的备份并停止定时备份
             if hasattr(self.optimizer, 'backup') and hasattr(self.optimizer.backup, 'stop_auto_backup'):
                 print("Stopping backup threads...")
                 self.optimizer.backup.stop_auto_backup()
-                
-            # 等待一小段时间以确保线程有机会终止
-            time.sleep(0.5)
             
             # 打印所有线程信息
             print("Current threads:")
             for thread in threading.enumerate():
                 print(f"  - {thread.name} (daemon: {thread.daemon})")
-                
-            # 销毁窗口
-            print("Destroying window...")
-            self.window.destroy()
-            
-            # 强制终止进程 - 最后的手段
-            print("Forcing application exit...")
-            import os
-            os._exit(0)  # 强制退出，不会调用清理处理程序
             
         except Exception as e:
             print(f"Error while closing application: {e}")
-            # 如果出现异常，仍然强制退出
-            import os
-            os._exit(1)
+
+        if self.scan_token is None:
+            print("Destroying window...")
+            self.window.destroy()
     
     def run(self):
         """运行应用程序"""
@@ -64,19 +64,62 @@ FILE_TYPES = {
 # 扫描配置
 SCAN_CONFIG = {
     'max_workers': multiprocessing.cpu_count(),
+    'queue_size': 4096,  # 多线程扫描的有界文件队列长度
+    'device_scheduling': True,  # 按设备（st_dev）分配哈希读取的线程池和队列深度
+    'device_adaptive': True,  # 按观测到的读取延迟自动调整每个设备的并发数
+    'device_profiles': {},  # 按设备类型(ssd/hdd/network/unknown)覆盖默认参数，如 {'hdd': {'max_workers': 1}}
+    'physical_read_order': True,  # 机械硬盘上按物理位置（FIEMAP，否则inode号）顺序读取待哈希的文件
+    'compare_max_files': 4,  # 成员不超过该数的大文件分组逐块比较而不计算完整哈希，0为禁用
+    'compare_min_size': 16 * 1024 * 1024,  # 逐块比较的最小文件大小
+    'compare_block_size': 1024 * 1024,  # 逐块比较时每次读取的字节数
+    'directory_dedup': True,  # 按Merkle树摘要报告整体重复的目录，并合并其中的重复文件分组
+    'near_duplicate_enabled': False,  # 对大文件做内容定义分块，报告共享大量内容的近似副本
+    'near_duplicate_min_ratio': 0.5,  # 共享字节数占较小文件的最低比例
+    'cdc_min_chunk_size': 8 * 1024,
+    'cdc_avg_chunk_size': 32 * 1024,
+    'cdc_max_chunk_size': 128 * 1024,
+    'walker_threads': 1,  # 目录遍历线程数，大于1时并行遍历（适合NFS等高延迟存储）
+    'walker_deterministic': True,  # 并行遍历时保持与顺序遍历一致的输出顺序
     'chunk_size': 1024 * 1024,  # 1MB
-    'ignore_patterns': [
-        '.*',  # 隐藏文件
+    'ignore_patterns': [  # 与文件名或目录名匹配，含'/'的模式与完整路径匹配
+        '.*',  # 隐藏文件（包括.git等目录）
         '~$*',  # 临时文件
         'Thumbs.db',
         '.DS_Store',
         '*.tmp',
-        '*.temp'
+        '*.temp',
+        'node_modules',
+        'venv',
+        '__pycache__'
     ],
     'min_file_size': 1024,  # 1KB
     'max_file_size': 10 * 1024 * 1024 * 1024,  # 10GB
     'follow_symlinks': False,
     'scan_system_files': False,
+    'hash_algorithm': 'xxh3_128',  # 重复检测哈希算法: xxh3_64/xxh3_128/md5/sha256
+    'hash_verify': False,  # 是否用加密哈希再次确认重复文件
+    'hash_verify_algorithm': 'sha256',
+    'hash_cache_enabled': True,  # 持久化哈希缓存
+    'hash_cache_path': DATA_DIR / 'hash_cache.db',
+    'hash_cache_max_entries': 1000000,
+    'scan_state_path': DATA_DIR / 'scan_state.db',  # 增量扫描保存的目录指纹
+    'checkpoint_enabled': False,  # 完整扫描（顺序遍历时）也定期保存检查点；关闭时只有 resume=True 时保存，界面中可单独勾选
+    'checkpoint_path': DATA_DIR / 'scan_checkpoint.db',
+    'checkpoint_interval': 30,  # 保存检查点的间隔（秒）
+    'throttle_enabled': False,  # 节流扫描，适合在繁忙的生产主机上运行
+    'throttle_read_bytes_per_sec': 32 * 1024 * 1024,  # 节流时每秒最多读取的字节数，None为不限
+    'throttle_stat_per_sec': 2000,  # 节流时每秒最多stat的文件数，None为不限
+    'throttle_adaptive_workers': True,  # 按CPU、内存（PERFORMANCE_CONFIG）和磁盘繁忙度调整哈希并发数
+    'throttle_max_disk_busy': 0.8,  # 最繁忙磁盘的繁忙度超过该值时减少并发
+    'throttle_sample_interval': 1.0,  # 采样系统负载的间隔（秒）
+    'throttle_idle_io_priority': True,  # Linux上扫描线程使用idle I/O调度类（ioprio_set）
+    'distributed_address': ('127.0.0.1', 0),  # 分布式扫描协调者的监听地址，'host:port' 或Unix套接字路径
+    'distributed_authkey': None,  # 工作节点连接时的认证密钥，None时随机生成
+    'distributed_partitions_per_worker': 4,  # 每个工作节点平均分到的子树分区数
+    'distributed_task_timeout': 600,  # 任务超过该秒数未完成时同时分配给其他节点
+    'distributed_max_attempts': 3,  # 每个任务最多分配的次数
+    'incremental_verify': 'strict',  # strict: 未变化目录中的文件仍重新stat；trust: 直接复用上次的stat
+    'watch_debounce': 0.5,  # 实时监视模式下，事件停止多少秒后应用变化
 }
 
 # AI模型配置
@@ -226,6 +269,12 @@ def load_env_config():
     # 扫描配置
     if 'SCAN_MAX_WORKERS' in os.environ:
         SCAN_CONFIG['max_workers'] = int(os.getenv('SCAN_MAX_WORKERS'))
+    if 'SCAN_WALKER_THREADS' in os.environ:
+        SCAN_CONFIG['walker_threads'] = int(os.getenv('SCAN_WALKER_THREADS'))
+    if 'SCAN_HASH_ALGORITHM' in os.environ:
+        SCAN_CONFIG['hash_algorithm'] = os.getenv('SCAN_HASH_ALGORITHM').lower()
+    if 'SCAN_HASH_CACHE' in os.environ:
+        SCAN_CONFIG['hash_cache_enabled'] = os.getenv('SCAN_HASH_CACHE').lower() == 'true'
     
     # AI配置
     if 'AI_USE_GPU' in os.environ:
@@ -2,17 +2,20 @@ import os
 import shutil
 import threading
 import schedule
-import time
 from datetime import datetime
 import json
 from pathlib import Path
 import logging
+import zipfile
 from concurrent.futures import ThreadPoolExecutor
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from src.config.settings import BACKUP_CONFIG
+from src.utils.cancellation import CancellationToken, OperationCancelled
 from src.utils.file_utils import FileUtils
 from src.utils.system_utils import SystemUtils
+from .file_filter import FileFilter
+from .walker import DirectoryWalker
 
 class AutoBackup:
     def __init__(self, backup_dir: str):
@@ -21,8 +24,12 @@ class AutoBackup:
         self.backup_log_file = self.backup_dir / "backup_log.json"
         self.backup_thread = None
         self.stop_flag = threading.Event()
+        # 正在进行的备份或恢复的取消令牌
+        self.cancel_token = None
         self.backup_history = self._load_backup_history()
         self.logger = logging.getLogger(__name__)
+        # 排除规则与扫描器共用同一个过滤引擎，排除的目录不会被遍历
+        self.walker = DirectoryWalker(file_filter=FileFilter.from_backup_config(BACKUP_CONFIG))
 
     def _load_backup_history(self) -> Dict:
         """加载备份历史记录"""
@@ -39,8 +46,21 @@ class AutoBackup:
         with open(self.backup_log_file, 'w') as f:
             json.dump(self.backup_history, f, indent=4)
 
-    def create_backup(self, source_paths: List[str], backup_name: str = None) -> Dict[str, Any]:
-        """创建备份"""
+    def cancel(self, reason: str = 'cancelled'):
+        """取消正在进行的备份或恢复"""
+        token = self.cancel_token
+        if token is not None:
+            token.cancel(reason)
+
+    def create_backup(self, source_paths: List[str], backup_name: str = None,
+                      cancel: Optional[CancellationToken] = None) -> Dict[str, Any]:
+        """创建备份
+
+        cancel 在遍历每个目录项和复制每块之前检查。被取消时已复制完的文件作为
+        未压缩的备份记入历史，backup_info['complete'] 为False。
+        """
+        cancel = cancel or CancellationToken()
+        self.cancel_token = cancel
         try:
             # 生成备份名称
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -50,34 +70,36 @@ class AutoBackup:
             # 创建备份目录
             backup_path.mkdir(exist_ok=True)
 
-            # 收集要备份的文件
-            files_to_backup = []
-            total_size = 0
-            for source_path in source_paths:
-                source_path = Path(source_path)
-                if source_path.is_file():
-                    files_to_backup.append(source_path)
-                    total_size += source_path.stat().st_size
-                elif source_path.is_dir():
-                    for file_path in source_path.rglob('*'):
-                        if file_path.is_file():
-                            files_to_backup.append(file_path)
-                            total_size += file_path.stat().st_size
-
-            # 检查备份大小限制
-            if total_size > BACKUP_CONFIG['max_backup_size']:
-                raise ValueError("Total backup size exceeds limit")
-
-            # 使用线程池复制文件
-            with ThreadPoolExecutor(max_workers=BACKUP_CONFIG.get('max_workers', 4)) as executor:
-                for file_path in files_to_backup:
-                    relative_path = file_path.relative_to(file_path.parent)
-                    dest_path = backup_path / relative_path
-                    dest_path.parent.mkdir(parents=True, exist_ok=True)
-                    executor.submit(shutil.copy2, str(file_path), str(dest_path))
-
-            # 如果启用压缩
-            if BACKUP_CONFIG['compression']:
+            copied = []
+            complete = True
+            try:
+                # 收集要备份的文件
+                files_to_backup = []
+                total_size = 0
+                for source_path in source_paths:
+                    cancel.raise_if_cancelled()
+                    source_path = Path(source_path)
+                    if source_path.is_file():
+                        files_to_backup.append(source_path)
+                        total_size += source_path.stat().st_size
+                    elif source_path.is_dir():
+                        for entry in self.walker.walk(str(source_path), on_error=self._log_walk_error,
+                                                      cancel=cancel):
+                            files_to_backup.append(Path(entry.path))
+                            total_size += entry.size
+
+                # 检查备份大小限制
+                if total_size > BACKUP_CONFIG['max_backup_size']:
+                    raise ValueError("Total backup size exceeds limit")
+
+                self._copy_files(files_to_backup, backup_path, cancel, copied)
+            except OperationCancelled:
+                complete = False
+                self.logger.warning(f"Backup cancelled after {len(copied)} files: {backup_name}")
+
+            # 如果启用压缩，取消的备份不再压缩
+            compressed = BACKUP_CONFIG['compression'] and complete
+            if compressed:
                 zip_path = str(backup_path) + '.zip'
                 FileUtils.create_zip_file(str(backup_path), zip_path)
                 shutil.rmtree(str(backup_path))
@@ -88,8 +110,9 @@ class AutoBackup:
                 'name': backup_name,
                 'timestamp': timestamp,
                 'size': FileUtils.get_file_info(str(backup_path))['size'],
-                'files_count': len(files_to_backup),
-                'compressed': BACKUP_CONFIG['compression'],
+                'files_count': len(copied),
+                'compressed': compressed,
+                'complete': complete,
                 'path': str(backup_path),
                 'system_info': SystemUtils.get_system_info()
             }
@@ -97,12 +120,43 @@ class AutoBackup:
             self.backup_history['backups'].append(backup_info)
             self._save_backup_history()
             
-            self.logger.info(f"Backup created successfully: {backup_name}")
+            if complete:
+                self.logger.info(f"Backup created successfully: {backup_name}")
             return backup_info
 
         except Exception as e:
             self.logger.error(f"Backup creation failed: {str(e)}")
             raise
+        finally:
+            if self.cancel_token is cancel:
+                self.cancel_token = None
+
+    def _copy_files(self, files: List[Path], backup_path: Path, cancel: CancellationToken,
+                    copied: List[Path]):
+        """使用线程池复制文件，复制完成的文件按顺序加入 copied，被取消时抛出 OperationCancelled"""
+        cancelled = False
+        with ThreadPoolExecutor(max_workers=BACKUP_CONFIG.get('max_workers', 4)) as executor:
+            futures = []
+            for file_path in files:
+                relative_path = file_path.relative_to(file_path.parent)
+                dest_path = backup_path / relative_path
+                dest_path.parent.mkdir(parents=True, exist_ok=True)
+                futures.append((file_path, executor.submit(
+                    FileUtils.copy_file, str(file_path), str(dest_path), cancel
+                )))
+            for file_path, future in futures:
+                try:
+                    future.result()
+                    copied.append(file_path)
+                except OperationCancelled:
+                    cancelled = True
+                except Exception as e:
+                    self.logger.warning(f"Failed to copy {file_path}: {str(e)}")
+        if cancelled:
+            raise OperationCancelled(cancel.reason)
+
+    def _log_walk_error(self, path, error):
+        self.logger.warning(f"Skipping {path}: {str(error)}")
 
     def start_auto_backup(self, source_paths: List[str]):
         """启动自动备份"""
@@ -116,7 +170,8 @@ class AutoBackup:
         def run_schedule():
             while not self.stop_flag.is_set():
                 schedule.run_pending()
-                time.sleep(60)
+                # 停止时立即醒来，不等满一分钟
+                self.stop_flag.wait(60)
 
         # 确保停止旧的备份任务
         self.stop_auto_backup()
@@ -138,7 +193,8 @@ class AutoBackup:
         self.logger.info("Auto backup started")
 
     def stop_auto_backup(self):
-        """停止自动备份"""
+        """停止自动备份，正在进行的备份被取消并保留已复制的文件"""
+        self.cancel('stopped')
         if not self.backup_thread or not self.backup_thread.is_alive():
             self.logger.info("No active backup thread to stop")
             return
@@ -164,8 +220,11 @@ class AutoBackup:
         schedule.clear()
         self.logger.info("Auto backup stopped")
 
-    def restore_backup(self, backup_name: str, restore_path: str) -> bool:
-        """从备份恢复文件"""
+    def restore_backup(self, backup_name: str, restore_path: str,
+                       cancel: Optional[CancellationToken] = None) -> bool:
+        """从备份恢复文件，被取消时已恢复的文件保留并返回False"""
+        cancel = cancel or CancellationToken()
+        self.cancel_token = cancel
         try:
             # 查找备份信息
             backup_info = next(
@@ -184,25 +243,40 @@ class AutoBackup:
             # 创建恢复目录
             restore_path.mkdir(parents=True, exist_ok=True)
 
-            # 如果是压缩备份
+            # 如果是压缩备份，逐个成员解压
             if backup_info['compressed']:
-                shutil.unpack_archive(str(backup_path), str(restore_path))
+                with zipfile.ZipFile(str(backup_path)) as zf:
+                    for member in zf.infolist():
+                        cancel.raise_if_cancelled()
+                        zf.extract(member, str(restore_path))
             else:
                 # 复制所有文件
                 with ThreadPoolExecutor(max_workers=BACKUP_CONFIG.get('max_workers', 4)) as executor:
+                    futures = []
                     for src in backup_path.rglob('*'):
+                        cancel.raise_if_cancelled()
                         if src.is_file():
                             relative_path = src.relative_to(backup_path)
                             dest = restore_path / relative_path
                             dest.parent.mkdir(parents=True, exist_ok=True)
-                            executor.submit(shutil.copy2, str(src), str(dest))
+                            futures.append(executor.submit(
+                                FileUtils.copy_file, str(src), str(dest), cancel
+                            ))
+                    for future in futures:
+                        future.result()
 
             self.logger.info(f"Backup restored successfully: {backup_name}")
             return True
 
+        except OperationCancelled:
+            self.logger.warning(f"Restore cancelled: {backup_name}")
+            return False
         except Exception as e:
             self.logger.error(f"Restore failed: {str(e)}")
             return False
+        finally:
+            if self.cancel_token is cancel:
+                self.cancel_token = None
 
     def cleanup_old_backups(self):
         """清理旧的备份"""
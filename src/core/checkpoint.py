@@ -0,0 +1,248 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Callable, Iterator, List, Optional, Set, Tuple, Union
+
+from src.utils.cancellation import CancellationToken
+from .incremental import StoredStat
+from .walker import FileEntry, directory_key, list_directory
+
+
+class ScanCheckpoint:
+    """断点续扫的检查点
+
+    保存一次扫描尚未遍历的目录栈、已遍历到的文件和错误（分类、大文件等
+    部分结果由这些记录重新生成），以及重复检测中已算出的哈希。状态只在
+    目录边界更新，任意时刻保存都是一致的。扫描完成后检查点被删除。
+    """
+
+    def __init__(self, db_path: str, root: str, config_key: str, interval: float = 30.0):
+        self.root = os.path.abspath(root)
+        self.config_key = config_key
+        self.interval = interval
+        self.started_at = None
+        # 待遍历的目录栈，None 表示遍历已完成
+        self.pending: Optional[List[str]] = None
+        # 跟随符号链接时已列出目录的 (st_dev, st_ino)，与目录栈一起保存
+        self.visited: Set[Tuple[int, int]] = set()
+        self._lock = threading.Lock()
+        self._entries = []
+        # (阶段, 路径) -> (大小, 修改时间, 哈希)
+        self._digests = {}
+        self._new_digests = []
+        self._last_save = time.monotonic()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, timeout=30)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS scans (
+                root TEXT PRIMARY KEY,
+                config_key TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                pending TEXT
+            )
+        ''')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                root TEXT NOT NULL,
+                path TEXT NOT NULL,
+                name TEXT,
+                stat TEXT,
+                error TEXT
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_root ON entries (root)')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS digests (
+                root TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                PRIMARY KEY (root, kind, path)
+            )
+        ''')
+        self._conn.commit()
+
+    @classmethod
+    def exists(cls, db_path: str, root: str, config_key: str) -> bool:
+        """是否有可以继续的检查点"""
+        if not os.path.exists(str(db_path)):
+            return False
+        checkpoint = cls(db_path, root, config_key)
+        try:
+            row = checkpoint._row()
+            return row is not None and row[0] == config_key
+        finally:
+            checkpoint.close()
+
+    def _row(self):
+        return self._conn.execute(
+            'SELECT config_key, started_at, pending FROM scans WHERE root=?', (self.root,)
+        ).fetchone()
+
+    def start(self, directory: str, started_at: float):
+        """丢弃旧的检查点，从头开始记录"""
+        with self._lock:
+            self._delete()
+            self.started_at = started_at
+            self.pending = [directory]
+            self.visited = set()
+            self._conn.execute(
+                'INSERT INTO scans (root, config_key, started_at, pending) VALUES (?, ?, ?, ?)',
+                (self.root, self.config_key, started_at, self._dump_pending())
+            )
+            self._conn.commit()
+            self._last_save = time.monotonic()
+
+    def load(self) -> bool:
+        """读取检查点，不存在或扫描配置已变化时返回False"""
+        row = self._row()
+        if row is None or row[0] != self.config_key:
+            return False
+        _, self.started_at, pending = row
+        self.pending = None
+        self.visited = set()
+        if pending is not None:
+            pending = json.loads(pending)
+            # 旧版本只保存目录栈
+            if isinstance(pending, dict):
+                self.visited = {tuple(key) for key in pending['visited']}
+                pending = pending['stack']
+            self.pending = pending
+        for kind, path, size, mtime_ns, digest in self._conn.execute(
+                'SELECT kind, path, size, mtime_ns, digest FROM digests WHERE root=?', (self.root,)):
+            self._digests[(kind, path)] = (size, mtime_ns, digest)
+        return True
+
+    def replay(self) -> Iterator[Union[FileEntry, Tuple[str, str]]]:
+        """按原顺序产出已保存的FileEntry和 (路径, 错误信息)"""
+        rows = self._conn.execute(
+            'SELECT path, name, stat, error FROM entries WHERE root=? ORDER BY rowid', (self.root,)
+        ).fetchall()
+        for path, name, stat, error in rows:
+            if error is not None:
+                yield path, error
+            else:
+                yield FileEntry(path, name, StoredStat(*json.loads(stat)))
+
+    def record_directory(self, files: List[FileEntry], errors, stack: List[str],
+                         key: Optional[Tuple[int, int]] = None):
+        """记录一个已列出的目录及遍历后剩余的目录栈，key 为跟随符号链接时目录的 (st_dev, st_ino)"""
+        with self._lock:
+            if key is not None:
+                self.visited.add(key)
+            for path, error in errors:
+                self._entries.append((self.root, path, None, None, str(error)))
+            for entry in files:
+                stat = json.dumps(StoredStat.from_stat(entry.stat).to_list())
+                self._entries.append((self.root, entry.path, entry.name, stat, None))
+            self.pending = list(stack)
+        self.maybe_save()
+
+    def finish_walk(self):
+        """遍历完成，此后只剩重复检测"""
+        with self._lock:
+            self.pending = None
+            self.visited = set()
+        self.save()
+
+    def get(self, kind: str, path: str) -> Optional[str]:
+        """返回已算出的哈希，文件在此后被修改时返回None"""
+        stored = self._digests.get((kind, path))
+        if stored is None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if (st.st_size, st.st_mtime_ns) != stored[:2]:
+            return None
+        return stored[2]
+
+    def put(self, kind: str, path: str, digest: str):
+        """记录算出的哈希（可在工作线程中调用）"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        with self._lock:
+            self._digests[(kind, path)] = (st.st_size, st.st_mtime_ns, digest)
+            self._new_digests.append((self.root, kind, path, st.st_size, st.st_mtime_ns, digest))
+        self.maybe_save()
+
+    def maybe_save(self):
+        """距上次保存超过间隔时保存"""
+        if time.monotonic() - self._last_save >= self.interval:
+            self.save()
+
+    def save(self):
+        """把未保存的记录和目录栈写入数据库"""
+        with self._lock:
+            # 未开始或未读取的检查点没有可保存的状态
+            if self._conn is None or self.started_at is None:
+                return
+            self._conn.executemany('INSERT INTO entries VALUES (?, ?, ?, ?, ?)', self._entries)
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?)', self._new_digests
+            )
+            self._conn.execute('UPDATE scans SET pending=? WHERE root=?',
+                               (self._dump_pending(), self.root))
+            self._conn.commit()
+            self._entries = []
+            self._new_digests = []
+            self._last_save = time.monotonic()
+
+    def _dump_pending(self):
+        if self.pending is None:
+            return None
+        return json.dumps({'stack': self.pending, 'visited': sorted(self.visited)})
+
+    def _delete(self):
+        for table in ('scans', 'entries', 'digests'):
+            self._conn.execute(f'DELETE FROM {table} WHERE root=?', (self.root,))
+
+    def discard(self):
+        """扫描完成后删除检查点"""
+        with self._lock:
+            if self._conn is None:
+                return
+            self._delete()
+            self._conn.commit()
+            self._entries = []
+            self._new_digests = []
+            self.started_at = None
+
+    def close(self):
+        """保存并关闭数据库连接"""
+        self.save()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def checkpointed_walk(checkpoint: ScanCheckpoint, follow_symlinks: bool = False, file_filter=None,
+                      on_error: Optional[Callable[[str, OSError], None]] = None,
+                      cancel: Optional[CancellationToken] = None) -> Iterator[FileEntry]:
+    """从检查点的目录栈继续深度优先遍历，顺序与 DirectoryWalker 一致
+
+    每个目录在产出其文件之前先记入检查点，中断后恢复时由 replay() 重放。
+    列出目录时被取消，该目录不记入检查点，恢复时重新列出。
+    跟随符号链接时已列出过的目录（符号链接环、同一目录的多个链接）被跳过。
+    """
+    stack = list(checkpoint.pending or ())
+    while stack:
+        current = stack.pop()
+        key = directory_key(current) if follow_symlinks else None
+        if key is not None and key in checkpoint.visited:
+            continue
+        files, subdirs, errors = list_directory(current, follow_symlinks, file_filter, cancel)
+        stack.extend(reversed(subdirs))
+        checkpoint.record_directory(files, errors, stack, key)
+        for path, error in errors:
+            if on_error is not None:
+                on_error(path, error)
+        yield from files
+    checkpoint.finish_walk()
@@ -0,0 +1,196 @@
+import os
+import hashlib
+from collections import Counter
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import xxhash
+
+from .device_io import ReadResult
+
+# Gear表：每个字节值对应一个固定的32位随机数，由md5派生，与NumPy版本无关
+GEAR = np.array(
+    [int.from_bytes(hashlib.md5(bytes([i])).digest()[:4], 'little') for i in range(256)],
+    dtype=np.uint32
+)
+# 滚动哈希的窗口：每个位置的哈希只取决于其前32个字节
+WINDOW = 32
+
+MIN_CHUNK_SIZE = 8 * 1024
+AVG_CHUNK_SIZE = 32 * 1024
+MAX_CHUNK_SIZE = 128 * 1024
+READ_SIZE = 4 * 1024 * 1024
+
+
+def gear_hashes(data: np.ndarray) -> np.ndarray:
+    """计算每个位置的Gear滚动哈希 sum(GEAR[b[i-j]] << j), j < 32
+
+    窗口和是线性的，窗口翻倍时 h2w[i] = hw[i] + (hw[i-w] << w)，
+    因此5次向量运算即可得到全部位置的32字节窗口哈希。
+    """
+    hashes = GEAR[data]
+    shifted = np.empty_like(hashes)
+    width = 1
+    while width < WINDOW:
+        np.left_shift(hashes[:-width], width, out=shifted[width:])
+        shifted[:width] = 0
+        hashes += shifted
+        width *= 2
+    return hashes
+
+
+def boundary_mask(min_size: int, avg_size: int) -> np.uint32:
+    """分块条件的掩码，取哈希的高位，使满足条件的位置平均间隔 avg_size - min_size"""
+    bits = max(1, int(np.log2(max(2, avg_size - min_size))))
+    return np.uint32(((1 << bits) - 1) << (32 - bits))
+
+
+def iter_chunks(f: BinaryIO, min_size: int = MIN_CHUNK_SIZE, avg_size: int = AVG_CHUNK_SIZE,
+                max_size: int = MAX_CHUNK_SIZE, read_size: int = READ_SIZE,
+                throttle: Optional[Callable[[int], None]] = None) -> Iterator[memoryview]:
+    """按内容定义的边界切分文件，产出各块的内容
+
+    块的边界只取决于边界附近的内容，文件中间插入或追加数据后，
+    其余位置的块仍然相同。min_size 不小于滚动哈希的窗口，保证边界判断
+    不依赖读取的缓冲区划分。
+    """
+    min_size = max(min_size, WINDOW)
+    mask = boundary_mask(min_size, avg_size)
+    carry = b''
+    while True:
+        if throttle is not None:
+            throttle(read_size)
+        data = f.read(read_size)
+        buffer = carry + data if carry else data
+        if not buffer:
+            return
+        if not data:
+            # 文件末尾剩余的数据作为最后一块
+            yield memoryview(buffer)
+            return
+        # 切点位于满足条件的字节之后
+        cuts = np.flatnonzero((gear_hashes(np.frombuffer(buffer, dtype=np.uint8)) & mask) == 0) + 1
+        view = memoryview(buffer)
+        start = 0
+        while True:
+            index = np.searchsorted(cuts, start + min_size)
+            if index < len(cuts) and cuts[index] <= start + max_size:
+                cut = int(cuts[index])
+            elif start + max_size <= len(buffer):
+                cut = start + max_size
+            else:
+                # 需要更多数据才能确定下一个边界
+                break
+            yield view[start:cut]
+            start = cut
+        carry = buffer[start:]
+
+
+def chunk_file(path: str, throttle: Optional[Callable[[int], None]] = None,
+               **chunk_options) -> List[Tuple[bytes, int]]:
+    """返回文件各块的 (摘要, 长度) 列表"""
+    with open(path, 'rb', buffering=0) as f:
+        return [(xxhash.xxh3_128_digest(chunk), len(chunk))
+                for chunk in iter_chunks(f, throttle=throttle, **chunk_options)]
+
+
+class ChunkIndex:
+    """块摘要索引，找出共享大量相同块的文件对
+
+    每个文件按块摘要计数，两个文件共享的字节数为各公共块在两边出现次数的
+    较小值乘以块长度。出现在过多文件中的块（如全零块）不参与配对。
+    """
+
+    def __init__(self, max_files_per_chunk: int = 64):
+        self.max_files_per_chunk = max_files_per_chunk
+        self.paths: List[str] = []
+        self.sizes: List[int] = []
+        self.counts: List[Counter] = []
+        self.lengths: Dict[bytes, int] = {}
+        self.files_by_chunk: Dict[bytes, List[int]] = {}
+
+    def add(self, path: str, chunks: Iterable[Tuple[bytes, int]]):
+        """登记一个文件的块列表"""
+        file_id = len(self.paths)
+        counts = Counter()
+        size = 0
+        for digest, length in chunks:
+            counts[digest] += 1
+            self.lengths[digest] = length
+            size += length
+        for digest in counts:
+            self.files_by_chunk.setdefault(digest, []).append(file_id)
+        self.paths.append(path)
+        self.sizes.append(size)
+        self.counts.append(counts)
+
+    def shared_bytes(self) -> Dict[Tuple[int, int], int]:
+        """各文件对共享的字节数 {(文件编号, 文件编号): 字节数}"""
+        shared = Counter()
+        for digest, file_ids in self.files_by_chunk.items():
+            if len(file_ids) < 2 or len(file_ids) > self.max_files_per_chunk:
+                continue
+            length = self.lengths[digest]
+            for i, first in enumerate(file_ids):
+                first_count = self.counts[first][digest]
+                for second in file_ids[i + 1:]:
+                    shared[first, second] += min(first_count, self.counts[second][digest]) * length
+        return shared
+
+    def similar_pairs(self, min_ratio: float = 0.5) -> List[dict]:
+        """共享字节数占较小文件的比例不低于 min_ratio 的文件对，按可释放字节数从大到小排列
+
+        reclaimable_bytes 为块级去重（或删除被包含的旧版本）可节省的字节数，即共享字节数。
+        """
+        pairs = []
+        for (first, second), shared in self.shared_bytes().items():
+            smaller = min(self.sizes[first], self.sizes[second])
+            ratio = shared / smaller if smaller else 0.0
+            if ratio < min_ratio:
+                continue
+            pairs.append({
+                'files': [self.paths[first], self.paths[second]],
+                'sizes': [self.sizes[first], self.sizes[second]],
+                'shared_bytes': shared,
+                'ratio': ratio,
+                'reclaimable_bytes': shared,
+            })
+        pairs.sort(key=lambda pair: (-pair['reclaimable_bytes'], pair['files']))
+        return pairs
+
+
+def find_similar_files(paths: Iterable[str], min_ratio: float = 0.5,
+                       map_func: Optional[Callable] = None,
+                       on_error: Optional[Callable[[str, Exception], None]] = None,
+                       max_files_per_chunk: int = 64,
+                       throttle: Optional[Callable[[int], None]] = None,
+                       **chunk_options) -> List[dict]:
+    """对文件做内容定义分块并建立索引，返回共享字节比例高的文件对
+
+    map_func 可传入 executor.map 并行分块，元素为 (大小, 路径)，与重复检测一致。
+    """
+    map_func = map_func or map
+
+    def job(item):
+        try:
+            chunks = chunk_file(item[1], throttle, **chunk_options)
+            return ReadResult((item[1], chunks, None), sum(length for _, length in chunks))
+        except Exception as e:
+            return ReadResult((item[1], None, e))
+
+    items = []
+    for path in paths:
+        try:
+            items.append((os.path.getsize(path), path))
+        except OSError as e:
+            if on_error is not None:
+                on_error(path, e)
+    index = ChunkIndex(max_files_per_chunk)
+    for result in map_func(job, items):
+        path, chunks, error = result.value
+        if error is not None:
+            if on_error is not None:
+                on_error(path, error)
+            continue
+        index.add(path, chunks)
+    return index.similar_pairs(min_ratio)
@@ -0,0 +1,56 @@
+import threading
+from collections import OrderedDict
+from typing import Union
+
+import filetype  # 用于文件类型检测
+
+from src.utils.hash_cache import cached_file_hash
+from .walker import FileEntry
+
+# 读取的文件头字节数，与重复检测的头部样本大小一致，以便共享
+HEADER_SIZE = 4096
+
+UNKNOWN_TYPE = 'unknown'
+
+
+class ContentTypeDetector:
+    """按需检测文件的MIME类型
+
+    只在调用方真正需要类型时才读取文件头。其他读取同一文件头部的环节
+    （如重复检测的头部采样）可以通过 remember_header 共享已读到的字节；
+    检测结果与文件的 (dev, ino, size, mtime_ns) 一起存入哈希缓存。
+    """
+
+    def __init__(self, max_headers: int = 4096):
+        self.max_headers = max_headers
+        self._headers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def remember_header(self, path: str, data: bytes):
+        """保存其他环节已读取的文件头，超过上限时淘汰最旧的"""
+        with self._lock:
+            self._headers[path] = bytes(data[:HEADER_SIZE])
+            self._headers.move_to_end(path)
+            while len(self._headers) > self.max_headers:
+                self._headers.popitem(last=False)
+
+    def read_header(self, path: str) -> bytes:
+        """获取文件头，优先使用共享的缓存"""
+        with self._lock:
+            data = self._headers.pop(path, None)
+        if data is not None:
+            return data
+        with open(path, 'rb') as f:
+            return f.read(HEADER_SIZE)
+
+    def detect(self, target: Union[str, FileEntry]) -> str:
+        """返回文件的MIME类型，无法识别时返回'unknown'"""
+        if isinstance(target, FileEntry):
+            path, stat_result = target.path, target.stat
+        else:
+            path, stat_result = target, None
+        return cached_file_hash(path, 'mime', self._detect_uncached, stat_result)
+
+    def _detect_uncached(self, path: str) -> str:
+        kind = filetype.guess(self.read_header(path))
+        return kind.mime if kind is not None else UNKNOWN_TYPE
@@ -0,0 +1,623 @@
+import os
+import filecmp
+import threading
+from collections import defaultdict, deque
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.utils.hash_cache import cached_file_hash, lookup_file_hash, remember_file_hash
+from src.utils.hash_util import HashUtils
+from .device_io import ReadResult
+
+SAMPLE_SIZE = 4096  # 头部/尾部采样字节数
+COMPARE_BLOCK_SIZE = 1024 * 1024  # 逐块比较时每个文件每次读取的字节数
+
+
+def inode_key(stat_result) -> str:
+    """硬链接分组的键"""
+    return f'{stat_result.st_dev}:{stat_result.st_ino}'
+
+
+def allocated_bytes(stat_result) -> int:
+    """文件实际占用的磁盘空间，稀疏文件小于st_size；没有st_blocks的平台使用st_size"""
+    blocks = getattr(stat_result, 'st_blocks', None)
+    if blocks is None:
+        return stat_result.st_size
+    return blocks * 512
+
+
+def reclaimable_bytes(duplicates: Dict[str, List[str]],
+                      hardlinks: Optional[Dict[str, List[str]]] = None) -> int:
+    """删除每个重复分组中除第一个以外的文件（连同其全部硬链接）可释放的空间
+
+    按st_blocks计算实际占用；在扫描范围之外还有硬链接的inode删除后不释放空间，不计入。
+    """
+    hardlinks = hardlinks or {}
+    total = 0
+    for files in duplicates.values():
+        for path in files[1:]:
+            try:
+                stat_result = os.stat(path)
+            except OSError:
+                continue
+            seen = len(hardlinks.get(inode_key(stat_result), ())) or 1
+            if stat_result.st_nlink > seen:
+                continue
+            total += allocated_bytes(stat_result)
+    return total
+
+
+def find_duplicate_directories(paths: Iterable[str], duplicates: Dict[str, List[str]],
+                               hardlinks: Optional[Dict[str, List[str]]] = None,
+                               algorithm: str = 'md5') -> Dict[str, List[str]]:
+    """自底向上计算目录的Merkle摘要，返回整体重复的目录分组 {目录摘要: [目录, ...]}
+
+    目录摘要由子文件的名称和内容标识、子目录的名称和摘要计算。文件的内容标识
+    直接取自重复分组和硬链接分组，不再读取文件：不在任何分组中的文件内容唯一，
+    包含它的目录及其上级目录都不可能重复。父目录也整体重复的子目录不单独报告。
+    paths 只含扫描范围内的文件，因此每个候选目录还要与不经过滤的完整列表核对：
+    含有被过滤、未参与重复检测或无法读取的项（包括空目录和符号链接）的目录
+    视为唯一，以免只在这些项上不同的目录被当作重复删除。
+    """
+    identities = {}
+    for file_hash, files in duplicates.items():
+        for path in files:
+            identities[path] = f'duplicate:{file_hash}'
+    for key, files in (hardlinks or {}).items():
+        # 同一inode的路径内容相同，只有第一个路径参与了重复检测
+        identity = next((identities[p] for p in files if p in identities), f'inode:{key}')
+        for path in files:
+            identities[path] = identity
+
+    paths = list(paths)
+    if not paths:
+        return {}
+    top = os.path.commonpath([os.path.dirname(path) for path in paths])
+    children_files = defaultdict(list)
+    subdirs = defaultdict(list)
+    # 含有内容唯一文件的目录
+    unique = set()
+    known = {top}
+    for path in paths:
+        directory, name = os.path.split(path)
+        identity = identities.get(path)
+        if identity is None:
+            unique.add(directory)
+        else:
+            children_files[directory].append(('file', name, identity))
+        while directory not in known:
+            known.add(directory)
+            parent, name = os.path.split(directory)
+            subdirs[parent].append(name)
+            directory = parent
+
+    # 子目录的路径总比父目录长，按长度倒序即可保证先算子目录
+    digests = {}
+    for directory in sorted(known, key=len, reverse=True):
+        if directory in unique:
+            continue
+        children = list(children_files.get(directory, ()))
+        for name in subdirs.get(directory, ()):
+            digest = digests.get(os.path.join(directory, name))
+            if digest is None:
+                break
+            children.append(('dir', name, digest))
+        else:
+            if not _listing_matches(directory, children):
+                continue
+            hasher = HashUtils.new_hasher(algorithm)
+            for kind, name, identity in sorted(children):
+                hasher.update(f'{kind}\0{name}\0{identity}\0'.encode('utf-8', 'surrogateescape'))
+            digests[directory] = hasher.hexdigest()
+
+    groups = {}
+    for directory in sorted(digests):
+        groups.setdefault(digests[directory], []).append(directory)
+    groups = {digest: dirs for digest, dirs in groups.items() if len(dirs) > 1}
+    return {digest: dirs for digest, dirs in groups.items()
+            if not _mirrors_parent_group(dirs, digests, groups)}
+
+
+def _list_entries(directory: str) -> set:
+    """目录的完整列表 {(类型, 名称)}，不经过滤也不跟随符号链接"""
+    entries = set()
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.is_symlink():
+                kind = 'link'
+            elif entry.is_dir():
+                kind = 'dir'
+            elif entry.is_file():
+                kind = 'file'
+            else:
+                kind = 'other'
+            entries.add((kind, entry.name))
+    return entries
+
+
+def _listing_matches(directory: str, children) -> bool:
+    """目录的完整列表是否恰好由已得到内容标识的文件和子目录组成"""
+    try:
+        entries = _list_entries(directory)
+    except OSError:
+        return False
+    return entries == {(kind, name) for kind, name, _ in children}
+
+
+def directories_identical(first: str, second: str) -> bool:
+    """逐字节比较两个目录树，不经过滤也不跟随符号链接；删除重复目录前用于再次确认"""
+    try:
+        if os.path.samefile(first, second):
+            return False
+        entries = _list_entries(first)
+        if entries != _list_entries(second):
+            return False
+        for kind, name in entries:
+            a, b = os.path.join(first, name), os.path.join(second, name)
+            if kind == 'dir':
+                same = directories_identical(a, b)
+            elif kind == 'file':
+                same = filecmp.cmp(a, b, shallow=False)
+            elif kind == 'link':
+                same = os.readlink(a) == os.readlink(b)
+            else:
+                same = False
+            if not same:
+                return False
+    except OSError:
+        return False
+    return True
+
+
+def _mirrors_parent_group(dirs: List[str], digests: Dict[str, str],
+                          groups: Dict[str, List[str]]) -> bool:
+    """分组是否只是同一个重复父目录分组中各副本的同名子目录"""
+    parents = {os.path.dirname(d) for d in dirs}
+    names = {os.path.basename(d) for d in dirs}
+    parent_digests = {digests.get(parent) for parent in parents}
+    if len(names) != 1 or len(parent_digests) != 1:
+        return False
+    return parent_digests.pop() in groups
+
+
+def collapse_duplicates(duplicates: Dict[str, List[str]],
+                        duplicate_directories: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """去掉已由重复目录分组覆盖的文件分组
+
+    文件分组的每个路径都位于同一个目录分组的副本中、且相对路径相同时，
+    它只是这些目录副本的一部分，不再单独列出。
+    """
+    if not duplicate_directories:
+        return dict(duplicates)
+    covering = {d: digest for digest, dirs in duplicate_directories.items() for d in dirs}
+    nearest = {}
+
+    def covered_by(directory):
+        """最近的、属于重复目录分组的上级目录"""
+        if directory not in nearest:
+            if directory in covering:
+                nearest[directory] = directory
+            else:
+                parent = os.path.dirname(directory)
+                nearest[directory] = None if parent == directory else covered_by(parent)
+        return nearest[directory]
+
+    def key(path):
+        directory = covered_by(os.path.dirname(path))
+        if directory is None:
+            return None
+        return covering[directory], os.path.relpath(path, directory)
+
+    collapsed = {}
+    for file_hash, files in duplicates.items():
+        keys = {key(path) for path in files}
+        if len(keys) != 1 or None in keys:
+            collapsed[file_hash] = files
+    return collapsed
+
+
+class DuplicateFinder:
+    """分级重复文件检测：按大小分组 -> 头尾采样哈希 -> 完整哈希
+
+    只有大小相同的文件才可能重复，因此大小唯一的文件不会被读取；
+    采样哈希只在同大小分组内计算，完整哈希只在采样也冲突时计算。
+    同一inode的多个硬链接只登记第一个路径参与检测，其余路径单独作为
+    硬链接分组报告。
+
+    设置 compare_max_files 后，文件较大且成员不多的分组不计算完整哈希，
+    而是锁步逐块比较全部成员，在第一个不同的块处拆分分组并停止读取。
+    """
+
+    def __init__(self, hash_func: Callable[[str], str], algorithm: str = 'md5',
+                 sample_size: int = SAMPLE_SIZE,
+                 verify_func: Optional[Callable[[str], str]] = None,
+                 verify_algorithm: Optional[str] = None,
+                 header_sink: Optional[Callable[[str, bytes], None]] = None,
+                 digest_memo=None,
+                 read_throttle: Optional[Callable[[int], None]] = None,
+                 compare_max_files: int = 0, compare_min_size: int = 0,
+                 compare_block_size: int = COMPARE_BLOCK_SIZE):
+        self.hash_func = hash_func
+        self.algorithm = algorithm
+        self.sample_size = sample_size
+        # 可选的加密哈希校验，校验后的分组以校验摘要为键
+        self.verify_func = verify_func
+        self.verify_algorithm = verify_algorithm
+        # 读到的文件头交给其他需要文件头的环节（如类型检测）复用
+        self.header_sink = header_sink
+        # 可选的哈希记录（如断点续扫的检查点），提供 get(阶段, 路径) 和 put(阶段, 路径, 哈希)
+        self.digest_memo = digest_memo
+        # 节流扫描时在读取样本之前以字节数调用
+        self.read_throttle = read_throttle
+        # 成员数不超过 compare_max_files、大小不小于 compare_min_size 的分组逐块比较
+        self.compare_max_files = compare_max_files
+        self.compare_min_size = compare_min_size
+        self.compare_block_size = compare_block_size
+        self.size_groups: Dict[int, List[str]] = {}
+        # 链接数大于1的inode -> 扫描到的全部路径
+        self.links: Dict[str, List[str]] = {}
+        self.stats = {
+            'files': 0,
+            'hardlinks': 0,
+            'sample_hashed': 0,
+            'full_hashed': 0,
+            'verified': 0,
+            'compared': 0,
+            'bytes_read': 0,
+        }
+        self._stats_lock = threading.Lock()
+
+    def add(self, path: str, size: int, stat_result=None):
+        """登记一个待检测文件，传入stat结果时同一inode只登记一次"""
+        self.stats['files'] += 1
+        if stat_result is not None and stat_result.st_nlink > 1:
+            key = inode_key(stat_result)
+            paths = self.links.get(key)
+            if paths is not None:
+                paths.append(path)
+                self.stats['hardlinks'] += 1
+                return
+            self.links[key] = [path]
+        self.size_groups.setdefault(size, []).append(path)
+
+    def paths(self) -> Iterator[str]:
+        """登记过的全部路径，包括同一inode的其他硬链接路径"""
+        for paths in self.size_groups.values():
+            yield from paths
+        for paths in self.links.values():
+            yield from paths[1:]
+
+    def link_groups(self) -> Dict[str, List[str]]:
+        """返回扫描到多个路径的硬链接分组 {'dev:ino': [路径, ...]}"""
+        return {key: paths for key, paths in self.links.items() if len(paths) > 1}
+
+    def get_sample_hash(self, path: str, size: int) -> str:
+        """计算文件头部和尾部样本的哈希值（同样经过哈希缓存）"""
+        return self._read_sample_hash(path, size)[0]
+
+    def _read_sample_hash(self, path: str, size: int) -> Tuple[str, int]:
+        """返回 (样本哈希, 实际读取的字节数)，命中哈希缓存时不读取文件"""
+        read = []
+
+        def compute(p):
+            file_hash, nbytes = self._compute_sample_hash(p, size)
+            read.append(nbytes)
+            return file_hash
+
+        file_hash = cached_file_hash(path, f'{self.algorithm}-sample-{self.sample_size}', compute)
+        return file_hash, sum(read)
+
+    def _compute_sample_hash(self, path: str, size: int) -> Tuple[str, int]:
+        hasher = HashUtils.new_hasher(self.algorithm)
+        if self.read_throttle is not None:
+            self.read_throttle(min(size, 2 * self.sample_size))
+        with open(path, 'rb') as f:
+            head = f.read(self.sample_size)
+            hasher.update(head)
+            if self.header_sink is not None:
+                self.header_sink(path, head)
+            read = len(head)
+            if size > self.sample_size:
+                # 尾部样本不与头部重叠
+                f.seek(max(size - self.sample_size, self.sample_size))
+                tail = f.read(self.sample_size)
+                hasher.update(tail)
+                read += len(tail)
+        self._count('bytes_read', read)
+        return hasher.hexdigest(), read
+
+    def find_duplicates(self, map_func: Optional[Callable] = None,
+                        on_error: Optional[Callable[[str, Exception], None]] = None) -> Dict[str, List[str]]:
+        """执行分级检测，返回 {完整哈希: [路径, ...]}，与原有duplicates结构一致"""
+        return dict(self.iter_duplicates(map_func, on_error))
+
+    def iter_duplicates(self, map_func: Optional[Callable] = None,
+                        on_error: Optional[Callable[[str, Exception], None]] = None
+                        ) -> Iterator[Tuple[str, List[str]]]:
+        """执行分级检测，每确认一个重复分组就产出 (完整哈希, [路径, ...])
+
+        map_func 可传入 executor.map 以并行计算哈希，每个阶段只提交一次批量任务；
+        传给 map_func 的元素总是 (大小, 路径)，调度器可据此按设备分配。
+        """
+        map_func = map_func or map
+
+        # 第一级：大小唯一的文件不可能重复
+        sample_candidates = []
+        full_candidates = []
+        for size, paths in self.size_groups.items():
+            if len(paths) < 2:
+                continue
+            # 样本能覆盖整个文件时直接计算完整哈希
+            if size <= 2 * self.sample_size:
+                full_candidates.append([(size, path) for path in paths])
+            else:
+                sample_candidates.extend((size, path) for path in paths)
+
+        # 第二级：同大小分组内比较头尾样本
+        sample_groups = self._group_by(map_func, sample_candidates, self._sample_hash, on_error)
+        for group in sample_groups.values():
+            if len(group) > 1:
+                full_candidates.append(group)
+
+        # 第三级：样本也冲突时才读取完整内容。大而少的分组逐块比较，
+        # 读到第一个不同的块即停止；其余分组计算完整哈希
+        compare_candidates = []
+        hash_candidates = []
+        for group in full_candidates:
+            if self._should_compare(group):
+                compare_candidates.append(group)
+            else:
+                hash_candidates.append(group)
+        # 逐块比较确认的内容完全相同，不需要再用加密哈希校验
+        yield from self._iter_compared_groups(map_func, compare_candidates, on_error)
+
+        # 候选分组连续排列，一个分组的哈希全部返回后立即确认
+        for group in self._iter_hashed_groups(map_func, hash_candidates, self._full_hash, on_error):
+            if self.verify_func is not None:
+                # 可选的第四级：用加密哈希确认快速哈希的分组
+                members = [(size, path) for size, path, _ in group]
+                verified = self._group_by(map_func, members, self._verify_hash, on_error)
+                for (_, file_hash), verified_group in verified.items():
+                    if len(verified_group) > 1:
+                        yield file_hash, [path for _, path in verified_group]
+            else:
+                yield group[0][2], [path for _, path, _ in group]
+
+    def _should_compare(self, group) -> bool:
+        """分组是否改用逐块比较；全部成员都有已知完整哈希时仍走哈希（直接命中）"""
+        size = group[0][0]
+        if not (0 < len(group) <= self.compare_max_files and size >= self.compare_min_size):
+            return False
+        return not all(self._known_full_hash(path) for _, path in group)
+
+    def _known_full_hash(self, path: str) -> Optional[str]:
+        """不读取文件，从哈希记录或哈希缓存中取得完整哈希"""
+        if self.digest_memo is not None:
+            file_hash = self.digest_memo.get('full', path)
+            if file_hash is not None:
+                return file_hash
+        return self._cached_hash(path, self.algorithm)
+
+    def _iter_compared_groups(self, map_func, candidate_groups, on_error):
+        """并行逐块比较各候选分组，产出内容完全相同的子分组"""
+        # map_func 只接收 (大小, 路径)，以分组的第一个路径代表整个分组
+        members = {group[0][1]: [path for _, path in group] for group in candidate_groups}
+
+        def job(item):
+            identical, errors, nbytes = self._compare_files(members[item[1]], item[0])
+            return ReadResult((identical, errors), nbytes)
+
+        items = [group[0] for group in candidate_groups]
+        for result in map_func(job, items):
+            identical, errors = result.value
+            if on_error is not None:
+                for path, error in errors:
+                    on_error(path, error)
+            yield from identical
+
+    def compare_files(self, paths: List[str], size: int
+                      ) -> Tuple[List[Tuple[str, List[str]]], List[Tuple[str, Exception]]]:
+        """锁步读取同样大小的文件，块不同时立即拆分分组
+
+        只剩一个成员的子分组不再读取。返回 ([(完整哈希, [路径, ...]), ...], [(路径, 错误), ...])，
+        完整哈希在读取的同时计算，与 hash_func 的结果一致，并写入哈希记录和哈希缓存。
+        """
+        return self._compare_files(paths, size)[:2]
+
+    def _compare_files(self, paths, size):
+        """compare_files 的实现，另外返回实际读取的字节数"""
+        errors = []
+        read = 0
+        files = {}
+        stats = {}
+        identical = []
+        try:
+            for path in paths:
+                f = None
+                try:
+                    f = open(path, 'rb', buffering=0)
+                    stats[path] = os.fstat(f.fileno())
+                except OSError as e:
+                    # 打开或stat失败的文件不参与比较，files和stats保持一致
+                    if f is not None:
+                        f.close()
+                    errors.append((path, e))
+                    continue
+                files[path] = f
+            self._count('compared', len(files))
+
+            def close(members):
+                for path in members:
+                    files.pop(path).close()
+
+            pending = [(HashUtils.new_hasher(self.algorithm), list(files))]
+            while pending:
+                next_pending = []
+                for hasher, group in pending:
+                    blocks = {}
+                    for path in group:
+                        if self.read_throttle is not None:
+                            self.read_throttle(self.compare_block_size)
+                        try:
+                            block = files[path].read(self.compare_block_size)
+                        except OSError as e:
+                            errors.append((path, e))
+                            close([path])
+                            continue
+                        read += len(block)
+                        self._count('bytes_read', len(block))
+                        blocks.setdefault(block, []).append(path)
+                    for block, same in blocks.items():
+                        if len(same) < 2:
+                            close(same)
+                            continue
+                        # 分组拆分时各子分组从同一个哈希状态继续
+                        branch = hasher.copy() if len(blocks) > 1 else hasher
+                        if block:
+                            branch.update(block)
+                            next_pending.append((branch, same))
+                        else:
+                            close(same)
+                            identical.append((branch.hexdigest(), same))
+                pending = next_pending
+        finally:
+            for f in files.values():
+                f.close()
+
+        for file_hash, group in identical:
+            self._remember_full_hash(group, stats, file_hash)
+        # 保持与输入相同的路径顺序
+        order = {path: index for index, path in enumerate(paths)}
+        identical = [(file_hash, sorted(group, key=order.get)) for file_hash, group in identical]
+        return identical, errors, read
+
+    def _remember_full_hash(self, paths, stats, file_hash):
+        """记录逐块比较时算出的完整哈希，读取期间被修改的文件不写入缓存"""
+        for path in paths:
+            if self.digest_memo is not None:
+                self.digest_memo.put('full', path, file_hash)
+            try:
+                after = os.stat(path)
+            except OSError:
+                continue
+            before = stats[path]
+            if (after.st_mtime_ns, after.st_size) == (before.st_mtime_ns, before.st_size):
+                remember_file_hash(before, self.algorithm, file_hash)
+
+    def _iter_hashed_groups(self, map_func, candidate_groups, job, on_error):
+        """对连续排列的候选分组批量计算哈希，逐个产出哈希相同的子分组"""
+        # map_func 只接收 (大小, 路径)，分组编号按顺序单独记录
+        indices = deque()
+
+        def items():
+            for index, group in enumerate(candidate_groups):
+                for item in group:
+                    indices.append(index)
+                    yield item
+
+        def safe_job(item):
+            try:
+                file_hash, nbytes = job(*item)
+                return ReadResult((item, file_hash, None), nbytes)
+            except Exception as e:
+                return ReadResult((item, None, e))
+
+        def split(hashed):
+            by_hash = {}
+            for size, path, file_hash in hashed:
+                by_hash.setdefault(file_hash, []).append((size, path, file_hash))
+            return [group for group in by_hash.values() if len(group) > 1]
+
+        current_index = None
+        hashed = []
+        for result in map_func(safe_job, items()):
+            item, file_hash, error = result.value
+            index = indices.popleft()
+            if index != current_index:
+                yield from split(hashed)
+                current_index = index
+                hashed = []
+            if error is not None:
+                if on_error is not None:
+                    on_error(item[1], error)
+                continue
+            hashed.append((item[0], item[1], file_hash))
+        yield from split(hashed)
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _memoized(self, kind, path, compute):
+        """返回 (哈希, 实际读取的字节数)：已记录的哈希直接返回，否则计算后记录"""
+        if self.digest_memo is None:
+            return compute()
+        file_hash = self.digest_memo.get(kind, path)
+        if file_hash is not None:
+            return file_hash, 0
+        file_hash, nbytes = compute()
+        self.digest_memo.put(kind, path, file_hash)
+        return file_hash, nbytes
+
+    def _sample_hash(self, size, path):
+        def compute():
+            self._count('sample_hashed')
+            return self._read_sample_hash(path, size)
+        return self._memoized('sample', path, compute)
+
+    def _full_hash(self, size, path):
+        def compute():
+            # 哈希缓存中已有的完整哈希不读取文件；启用校验而校验哈希未知时
+            # 仍交给 hash_func，使校验哈希在同一次读取中算出
+            file_hash = self._cached_hash(path, self.algorithm)
+            if file_hash is not None and (
+                    self.verify_func is None
+                    or self._cached_hash(path, self.verify_algorithm) is not None):
+                return file_hash, 0
+            # 完整哈希已知而不知道校验算法时，无法判断 hash_func 是否读取文件
+            nbytes = size if file_hash is None or self.verify_algorithm is not None else 0
+            file_hash = self.hash_func(path)
+            self._count('full_hashed')
+            self._count('bytes_read', nbytes)
+            return file_hash, nbytes
+        return self._memoized('full', path, compute)
+
+    def _verify_hash(self, size, path):
+        def compute():
+            file_hash = self._cached_hash(path, self.verify_algorithm)
+            if file_hash is not None:
+                return file_hash, 0
+            file_hash = self.verify_func(path)
+            self._count('verified')
+            # 不知道校验算法时无法判断是否命中缓存，不计读取的字节数
+            return file_hash, size if self.verify_algorithm is not None else 0
+        return self._memoized('verify', path, compute)
+
+    @staticmethod
+    def _cached_hash(path: str, algorithm: Optional[str]) -> Optional[str]:
+        """从哈希缓存中取得文件的哈希，未命中或无法stat时返回None"""
+        if algorithm is None:
+            return None
+        try:
+            return lookup_file_hash(path, algorithm)
+        except OSError:
+            return None
+
+    @staticmethod
+    def _group_by(map_func, items: Iterable[Tuple[int, str]], job, on_error) -> Dict[Tuple[int, str], List[Tuple[int, str]]]:
+        """按 (大小, 哈希) 对文件分组，保持原有顺序；出错的文件被跳过"""
+        def safe_job(item):
+            try:
+                key, nbytes = job(*item)
+                return ReadResult((item, key, None), nbytes)
+            except Exception as e:
+                return ReadResult((item, None, e))
+
+        groups = {}
+        for result in map_func(safe_job, items):
+            item, key, error = result.value
+            if error is not None:
+                if on_error is not None:
+                    on_error(item[1], error)
+                continue
+            groups.setdefault((item[0], key), []).append(item)
+        return groups
@@ -0,0 +1,394 @@
+import os
+import re
+import time
+import struct
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# 网络文件系统：延迟高，需要更多并发请求来掩盖延迟
+NETWORK_FS_TYPES = frozenset({
+    'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'sshfs', 'fuse.sshfs', '9p',
+    'ceph', 'glusterfs', 'fuse.glusterfs', 'lustre', 'afs',
+})
+# 内存文件系统按SSD处理
+MEMORY_FS_TYPES = frozenset({'tmpfs', 'ramfs'})
+
+_OCTAL_ESCAPE = re.compile(r'\\([0-7]{3})')
+
+DEFAULT_PROFILES = {
+    'ssd': {'max_workers': None, 'queue_depth': 32},  # None: 使用扫描器的max_workers
+    'hdd': {'max_workers': 2, 'queue_depth': 4},
+    'network': {'max_workers': 16, 'queue_depth': 64},
+    'unknown': {'max_workers': 4, 'queue_depth': 16},
+}
+
+
+def read_mounts(mounts_path: str = '/proc/mounts') -> List[Tuple[str, str]]:
+    """读取挂载表，返回 [(挂载点, 文件系统类型), ...]，不可用时返回空列表"""
+    mounts = []
+    try:
+        with open(mounts_path, 'r') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 3:
+                    # 挂载点中的空格等字符以八进制转义
+                    mount_point = _OCTAL_ESCAPE.sub(lambda m: chr(int(m.group(1), 8)), fields[1])
+                    mounts.append((mount_point, fields[2]))
+    except OSError:
+        pass
+    return mounts
+
+
+def filesystem_type(path: str, mounts: List[Tuple[str, str]]) -> Optional[str]:
+    """按最长前缀匹配路径所在挂载点的文件系统类型"""
+    path = os.path.realpath(path)
+    best = None
+    for mount_point, fs_type in mounts:
+        prefix = mount_point.rstrip('/') + '/'
+        if path == mount_point or path.startswith(prefix):
+            if best is None or len(mount_point) >= len(best[0]):
+                best = (mount_point, fs_type)
+    return best[1] if best else None
+
+
+def is_rotational(st_dev: int, sys_root: str = '/sys') -> Optional[bool]:
+    """从sysfs读取块设备的rotational标志，分区使用其所在磁盘的值，未知时返回None"""
+    try:
+        device_dir = os.path.join(sys_root, 'dev', 'block',
+                                  f'{os.major(st_dev)}:{os.minor(st_dev)}')
+        device_dir = os.path.realpath(device_dir)
+        if os.path.exists(os.path.join(device_dir, 'partition')):
+            device_dir = os.path.dirname(device_dir)
+        with open(os.path.join(device_dir, 'queue', 'rotational'), 'r') as f:
+            return f.read().strip() == '1'
+    except (OSError, ValueError, OverflowError, AttributeError):
+        # 非Linux平台没有sysfs和os.major
+        return None
+
+
+# linux/fiemap.h
+FS_IOC_FIEMAP = 0xC020660B
+FIEMAP_EXTENT_UNKNOWN = 0x00000002
+_FIEMAP = struct.Struct('=QQIIII')  # fm_start, fm_length, fm_flags, fm_mapped_extents, fm_extent_count, fm_reserved
+_EXTENT = struct.Struct('=QQQQQIIII')  # fe_logical, fe_physical, fe_length, reserved64[2], fe_flags, reserved[3]
+
+
+def physical_offset(path: str) -> Optional[int]:
+    """用FIEMAP获取文件第一个数据块的物理位置，不支持或没有已分配的数据块时返回None"""
+    if fcntl is None:
+        return None
+    buf = bytearray(_FIEMAP.size + _EXTENT.size)
+    _FIEMAP.pack_into(buf, 0, 0, 0xFFFFFFFFFFFFFFFF, 0, 0, 1, 0)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        fcntl.ioctl(fd, FS_IOC_FIEMAP, buf, True)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+    if _FIEMAP.unpack_from(buf, 0)[3] == 0:
+        return None
+    _, physical, _, _, _, flags, _, _, _ = _EXTENT.unpack_from(buf, _FIEMAP.size)
+    if flags & FIEMAP_EXTENT_UNKNOWN:
+        return None
+    return physical
+
+
+def physical_sort_keys(paths: List[str],
+                       offset_func: Callable[[str], Optional[int]] = physical_offset
+                       ) -> List[Tuple[int, int]]:
+    """同一设备上文件的读取排序键：有FIEMAP时按物理位置，否则按inode号排在后面"""
+    keys = []
+    for path in paths:
+        offset = offset_func(path)
+        if offset is not None:
+            keys.append((0, offset))
+            continue
+        try:
+            keys.append((1, os.stat(path).st_ino))
+        except OSError:
+            keys.append((2, 0))
+    return keys
+
+
+def read_order(paths: List[str],
+               rotational_func: Callable[[int], Optional[bool]] = is_rotational,
+               offset_func: Callable[[str], Optional[int]] = physical_offset) -> List[int]:
+    """返回读取顺序（paths的下标）
+
+    按设备首次出现的顺序分组；机械硬盘上的文件按物理位置排序以减少寻道，
+    其他设备保持原有顺序。
+    """
+    devices: Dict[int, List[int]] = {}
+    dir_devices: Dict[str, int] = {}
+    for index, path in enumerate(paths):
+        directory = os.path.dirname(path) or '.'
+        st_dev = dir_devices.get(directory)
+        if st_dev is None:
+            try:
+                st_dev = os.stat(directory).st_dev
+            except OSError:
+                st_dev = -1
+            dir_devices[directory] = st_dev
+        devices.setdefault(st_dev, []).append(index)
+
+    order = []
+    rotational_cache = {}
+    for st_dev, indices in devices.items():
+        if st_dev not in rotational_cache:
+            rotational_cache[st_dev] = st_dev >= 0 and bool(rotational_func(st_dev))
+        if rotational_cache[st_dev]:
+            keys = physical_sort_keys([paths[i] for i in indices], offset_func)
+            indices = [i for _, i in sorted(zip(keys, indices))]
+        order.extend(indices)
+    return order
+
+
+def physical_order_map(map_func: Callable = map, **order_options) -> Callable:
+    """包装map函数：按物理位置顺序计算，按输入顺序返回结果
+
+    元素为 DuplicateFinder 传入的 (大小, 路径)。结果在输入顺序的前缀全部
+    完成后立即产出，因此报告的结果与读取顺序无关。
+    """
+    def mapper(fn: Callable, items: Iterable[Tuple[int, str]]) -> Iterator:
+        items = list(items)
+        order = read_order([path for _, path in items], **order_options)
+        finished = {}
+        next_index = 0
+        for index, result in zip(order, map_func(fn, (items[i] for i in order))):
+            finished[index] = result
+            while next_index in finished:
+                yield finished.pop(next_index)
+                next_index += 1
+    return mapper
+
+
+class DeviceProfile:
+    """单个设备的I/O参数"""
+
+    def __init__(self, st_dev: int, kind: str, fs_type: Optional[str],
+                 max_workers: int, queue_depth: int):
+        self.st_dev = st_dev
+        self.kind = kind
+        self.fs_type = fs_type
+        self.max_workers = max_workers
+        self.queue_depth = queue_depth
+
+    def __repr__(self):
+        return (f"DeviceProfile(dev={self.st_dev}, kind={self.kind!r}, fs={self.fs_type!r}, "
+                f"workers={self.max_workers}, depth={self.queue_depth})")
+
+
+def detect_profile(path: str, st_dev: int, default_workers: int,
+                   profiles: Optional[Dict[str, dict]] = None,
+                   mounts: Optional[List[Tuple[str, str]]] = None,
+                   sys_root: str = '/sys') -> DeviceProfile:
+    """根据文件系统类型和rotational标志确定设备类型及其并发参数"""
+    fs_type = filesystem_type(path, read_mounts() if mounts is None else mounts)
+    if fs_type in NETWORK_FS_TYPES:
+        kind = 'network'
+    elif fs_type in MEMORY_FS_TYPES:
+        kind = 'ssd'
+    else:
+        rotational = is_rotational(st_dev, sys_root)
+        kind = 'unknown' if rotational is None else ('hdd' if rotational else 'ssd')
+    # 配置中的参数覆盖默认值
+    settings = dict(DEFAULT_PROFILES[kind], **(profiles or {}).get(kind, {}))
+    max_workers = settings.get('max_workers') or default_workers
+    queue_depth = max(settings.get('queue_depth') or max_workers, max_workers)
+    return DeviceProfile(st_dev, kind, fs_type, max(1, max_workers), queue_depth)
+
+
+class AdaptiveLimiter:
+    """按观测延迟调整并发上限（加性增、乘性减）
+
+    延迟按读取字节数归一化；每个窗口的平均值明显高于历史最好水平时
+    并发减半，接近最好水平时加一。
+    """
+
+    def __init__(self, max_limit: int, window: int = 16, min_bytes: int = 64 * 1024):
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self.window = window
+        self.min_bytes = min_bytes
+        self.in_flight = 0
+        self.baseline = None
+        self._samples = []
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, elapsed: Optional[float] = None, size: int = 0):
+        with self._cond:
+            self.in_flight -= 1
+            if elapsed is not None:
+                self._record(elapsed / max(size, self.min_bytes))
+            self._cond.notify_all()
+
+    def _record(self, latency):
+        self._samples.append(latency)
+        if len(self._samples) < self.window:
+            return
+        average = sum(self._samples) / len(self._samples)
+        self._samples = []
+        if self.baseline is None or average < self.baseline:
+            self.baseline = average
+        if average > self.baseline * 2:
+            self.limit = max(1, self.limit // 2)
+        elif average < self.baseline * 1.2:
+            self.limit = min(self.max_limit, self.limit + 1)
+        # 基准缓慢上浮，负载长期变化后仍能恢复并发
+        self.baseline *= 1.05
+
+
+class ReadResult:
+    """I/O任务的返回值及任务实际读取的字节数
+
+    DeviceScheduler 按实际读取的字节数归一化延迟；没有读取文件的任务
+    （如命中哈希缓存）和返回其他类型的任务不参与自适应并发的采样。
+    """
+
+    __slots__ = ('value', 'bytes_read')
+
+    def __init__(self, value, bytes_read: int = 0):
+        self.value = value
+        self.bytes_read = bytes_read
+
+
+class _DevicePool:
+    """单个设备的线程池、在途任务上限和自适应并发"""
+
+    def __init__(self, profile: DeviceProfile, adaptive: bool):
+        self.profile = profile
+        self.executor = ThreadPoolExecutor(max_workers=profile.max_workers,
+                                           thread_name_prefix=f"io_{profile.kind}_")
+        self.limiter = AdaptiveLimiter(profile.max_workers) if adaptive else None
+        self.pending = threading.BoundedSemaphore(profile.queue_depth)
+
+    def run(self, fn, item, result: Future):
+        if self.limiter is not None:
+            self.limiter.acquire()
+        start = time.monotonic()
+        elapsed = None
+        bytes_read = 0
+        try:
+            value = fn(item)
+            elapsed = time.monotonic() - start
+            bytes_read = getattr(value, 'bytes_read', 0)
+            result.set_result(value)
+        except BaseException as e:
+            result.set_exception(e)
+        finally:
+            if self.limiter is not None:
+                self.limiter.release(elapsed if bytes_read else None, bytes_read)
+            self.pending.release()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+class DeviceScheduler:
+    """按st_dev分组调度文件I/O，每个设备使用独立的线程池和队列深度
+
+    map() 与 executor.map 接口一致，元素为 DuplicateFinder 传入的 (大小, 路径)，
+    结果按输入顺序返回。各设备的任务由各自的提交线程送入设备线程池，
+    慢设备的队列满时不会阻塞其他设备；physical_order=True 时机械硬盘上的
+    任务按物理位置顺序提交。
+    """
+
+    def __init__(self, default_workers: int, profiles: Optional[Dict[str, dict]] = None,
+                 adaptive: bool = True,
+                 profile_func: Optional[Callable[[str, int], DeviceProfile]] = None,
+                 physical_order: bool = True):
+        self.default_workers = default_workers
+        self.profiles = profiles
+        self.adaptive = adaptive
+        self.physical_order = physical_order
+        self.profile_func = profile_func or self._detect
+        self.pools: Dict[int, _DevicePool] = {}
+        self._dir_devices: Dict[str, int] = {}
+        self._mounts = None
+        self._lock = threading.Lock()
+
+    def _detect(self, path, st_dev):
+        if self._mounts is None:
+            self._mounts = read_mounts()
+        return detect_profile(path, st_dev, self.default_workers, self.profiles, self._mounts)
+
+    def device_of(self, path: str) -> int:
+        """文件所在设备，按所在目录缓存（挂载边界只出现在目录上）"""
+        directory = os.path.dirname(path)
+        st_dev = self._dir_devices.get(directory)
+        if st_dev is None:
+            try:
+                st_dev = os.stat(directory).st_dev
+            except OSError:
+                st_dev = -1
+            self._dir_devices[directory] = st_dev
+        return st_dev
+
+    def _pool(self, st_dev, path) -> _DevicePool:
+        with self._lock:
+            pool = self.pools.get(st_dev)
+            if pool is None:
+                pool = _DevicePool(self.profile_func(path, st_dev), self.adaptive)
+                self.pools[st_dev] = pool
+            return pool
+
+    def map(self, fn: Callable, items: Iterable[Tuple[int, str]]) -> Iterator:
+        items = list(items)
+        results = [Future() for _ in items]
+        by_device = defaultdict(list)
+        for index, item in enumerate(items):
+            by_device[self.device_of(item[1])].append(index)
+
+        def feed(pool, indices):
+            if self.physical_order and pool.profile.kind == 'hdd':
+                keys = physical_sort_keys([items[i][1] for i in indices])
+                indices = [i for _, i in sorted(zip(keys, indices))]
+            for index in indices:
+                # 在途任务达到队列深度时等待，只阻塞本设备的提交线程
+                pool.pending.acquire()
+                pool.executor.submit(pool.run, fn, items[index], results[index])
+
+        feeders = []
+        for st_dev, indices in by_device.items():
+            pool = self._pool(st_dev, items[indices[0]][1])
+            feeder = threading.Thread(target=feed, args=(pool, indices),
+                                      name=f"io_feed_{st_dev}", daemon=True)
+            feeder.start()
+            feeders.append(feeder)
+
+        def iterate():
+            try:
+                for result in results:
+                    yield result.result()
+            finally:
+                for feeder in feeders:
+                    feeder.join()
+        return iterate()
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown()
+        self.pools = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
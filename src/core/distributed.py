@@ -0,0 +1,482 @@
+import os
+import time
+import queue
+import socket
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import (
+    AuthenticationError, Client, Connection, answer_challenge, deliver_challenge
+)
+from typing import Dict, List, Optional, Tuple
+
+from src.config.settings import SCAN_CONFIG
+from .incremental import StoredStat
+from .scan_events import FILE_DISCOVERED
+from .walker import list_directory
+
+# 任务类型
+WALK = 'walk'
+HASH = 'hash'
+_STOP = ('stop',)
+
+
+def parse_address(address):
+    """'host:port' 转为TCP地址元组，其他字符串视为Unix套接字路径"""
+    if isinstance(address, str) and ':' in address and not address.startswith('/'):
+        host, port = address.rsplit(':', 1)
+        return host, int(port)
+    return address
+
+
+def open_listener(address) -> socket.socket:
+    """在TCP地址元组或Unix套接字路径上监听"""
+    if isinstance(address, tuple):
+        return socket.create_server(address)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(address)
+    sock.listen()
+    return sock
+
+
+def plan_partitions(root: str, target: int, follow_symlinks: bool = False,
+                    file_filter=None) -> List[Tuple[str, bool]]:
+    """把目录树划分为 (目录, 是否递归) 分区
+
+    逐层展开递归分区，直到分区数达到target或无法再展开。展开的目录只保留
+    自身的文件（非递归），其子目录各成一个分区；按顺序连接各分区的深度
+    优先遍历结果即为整棵树的遍历顺序。
+    """
+    partitions = [(root, True)]
+    while len(partitions) < target:
+        expanded = []
+        changed = False
+        for path, recursive in partitions:
+            if not recursive:
+                expanded.append((path, recursive))
+                continue
+            _, subdirs, errors = list_directory(path, follow_symlinks, file_filter)
+            if errors or not subdirs:
+                # 列出失败的目录交给工作节点报告错误
+                expanded.append((path, recursive))
+                continue
+            expanded.append((path, False))
+            expanded.extend((subdir, True) for subdir in subdirs)
+            changed = True
+        partitions = expanded
+        if not changed:
+            break
+    return partitions
+
+
+def balance_groups(groups: List[Tuple[int, List[str]]], count: int) -> List[List[Tuple[int, List[str]]]]:
+    """按总字节数把同大小分组分配到count批中（最长处理时间优先）"""
+    batches = [[] for _ in range(max(1, min(count, len(groups))))]
+    loads = [0] * len(batches)
+    for size, paths in sorted(groups, key=lambda group: -group[0] * len(group[1])):
+        index = loads.index(min(loads))
+        batches[index].append((size, paths))
+        loads[index] += size * len(paths)
+    return [batch for batch in batches if batch]
+
+
+def run_walk_task(scanner, path: str, recursive: bool, now: float, file_filter=None) -> dict:
+    """遍历一个分区，返回部分结果和文件的大小表
+
+    file_filter 为协调者的过滤规则，各节点按同一规则遍历。
+    """
+    if file_filter is not None:
+        scanner.file_filter = file_filter
+    results = scanner.new_results()
+    entries = []
+
+    def on_error(error_path, error):
+        results['errors'].append({'path': error_path, 'error': str(error)})
+
+    if recursive:
+        files = scanner.walker.walk(path, on_error=on_error)
+    else:
+        files, _, errors = list_directory(path, scanner.follow_symlinks, scanner.file_filter)
+        for error_path, error in errors:
+            on_error(error_path, error)
+
+    for entry in files:
+        try:
+            for event in scanner.entry_events(entry, now):
+                if event.type != FILE_DISCOVERED:
+                    scanner.collect_event(results, event)
+        except Exception as e:
+            on_error(entry.path, e)
+            continue
+        entries.append((entry.path, StoredStat.from_stat(entry.stat).to_list()))
+    return {'results': results, 'entries': entries}
+
+
+def run_hash_task(scanner, groups: List[Tuple[int, List[str]]], max_workers: int) -> dict:
+    """对完整的同大小分组执行分级重复检测，返回哈希分组"""
+    finder = scanner.new_duplicate_finder()
+    errors = []
+    for size, paths in groups:
+        for path in paths:
+            finder.add(path, size)
+
+    def on_error(path, error):
+        errors.append({'path': path, 'error': str(error)})
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hash_") as executor:
+        duplicates = list(finder.iter_duplicates(scanner.throttled_map(executor.map), on_error))
+    return {'duplicates': duplicates, 'errors': errors}
+
+
+class ScanWorker:
+    """分布式扫描的工作节点，连接协调者并执行分配的任务直到收到停止消息"""
+
+    def __init__(self, address, authkey: bytes, scanner=None):
+        if scanner is None:
+            from .file_scanner import FileScanner
+            scanner = FileScanner(ai_models=None)
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.scanner = scanner
+        self.max_workers = SCAN_CONFIG.get('max_workers', 4)
+
+    def run(self):
+        conn = Client(self.address, authkey=self.authkey)
+        try:
+            while True:
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    return
+                if message[0] == _STOP[0]:
+                    return
+                try:
+                    conn.send(('ok', self.execute(message)))
+                except Exception as e:
+                    conn.send(('error', str(e)))
+        finally:
+            conn.close()
+
+    def execute(self, message) -> dict:
+        kind = message[0]
+        if kind == WALK:
+            _, path, recursive, now, file_filter = message
+            return run_walk_task(self.scanner, path, recursive, now, file_filter)
+        if kind == HASH:
+            return run_hash_task(self.scanner, message[1], self.max_workers)
+        raise ValueError(f"Unknown task: {kind}")
+
+
+def run_worker(address, authkey: bytes, hash_cache_path=None):
+    """工作节点进程的入口"""
+    if hash_cache_path is not None:
+        SCAN_CONFIG['hash_cache_path'] = hash_cache_path
+    ScanWorker(address, authkey).run()
+
+
+def start_local_workers(address, authkey: bytes, count: int) -> List[multiprocessing.Process]:
+    """在本机启动count个工作节点进程
+
+    哈希缓存在提交前持有SQLite写锁，本机的各工作进程使用各自的缓存文件。
+    """
+    context = multiprocessing.get_context('spawn')
+    cache_path = SCAN_CONFIG['hash_cache_path']
+    processes = []
+    for i in range(count):
+        worker_cache = cache_path.with_name(f'{cache_path.stem}_worker{i}{cache_path.suffix}')
+        process = context.Process(target=run_worker, args=(address, authkey, worker_cache),
+                                  name=f"scan_worker_{i}", daemon=True)
+        process.start()
+        processes.append(process)
+    return processes
+
+
+class _Task:
+    __slots__ = ('id', 'message', 'attempts', 'running', 'done')
+
+    def __init__(self, task_id, message):
+        self.id = task_id
+        self.message = message
+        self.attempts = 0
+        self.running = 0
+        self.done = False
+
+
+def _shutdown_socket(sock):
+    """关闭套接字的读写，已关闭的套接字忽略"""
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class ScanCoordinator:
+    """分布式扫描的协调者
+
+    把目录树划分为子树分区交给通过TCP或Unix套接字连接的工作节点遍历，
+    合并各节点返回的部分结果和大小表后，在全局范围内按inode去重、筛选
+    大小相同的候选文件，再把完整的同大小分组分批交给工作节点计算哈希，
+    因此得到的重复分组与单机扫描一致。工作节点断开或任务出错时重新分配；
+    任务超过task_timeout秒未完成时同时分配给其他空闲节点，先返回的结果生效。
+    """
+
+    def __init__(self, scanner, address=None, authkey: Optional[bytes] = None,
+                 partitions_per_worker: Optional[int] = None,
+                 task_timeout: Optional[float] = None, max_attempts: Optional[int] = None,
+                 connect_timeout: float = 60.0, handshake_timeout: float = 10.0):
+        self.scanner = scanner
+        self.authkey = authkey or SCAN_CONFIG.get('distributed_authkey') or os.urandom(32)
+        address = parse_address(address or SCAN_CONFIG.get('distributed_address', ('127.0.0.1', 0)))
+        self.listener = open_listener(address)
+        # accept定期超时以便检查是否已关闭
+        self.listener.settimeout(0.2)
+        # 实际监听的地址（端口为0时由系统分配）
+        self.address = self.listener.getsockname()
+        self.partitions_per_worker = (partitions_per_worker
+                                      or SCAN_CONFIG.get('distributed_partitions_per_worker', 4))
+        self.task_timeout = task_timeout or SCAN_CONFIG.get('distributed_task_timeout', 600)
+        self.max_attempts = max_attempts or SCAN_CONFIG.get('distributed_max_attempts', 3)
+        self.connect_timeout = connect_timeout
+        # 新连接须在该时间内完成认证，否则被关闭
+        self.handshake_timeout = handshake_timeout
+        self.stats = {'dispatched': 0, 'redispatched': 0, 'failed': 0}
+        self._pending = queue.Queue()
+        self._cond = threading.Condition()
+        self._payloads: Dict[int, dict] = {}
+        self._remaining = 0
+        self._workers = 0
+        self._closed = False
+        self._accept_thread = threading.Thread(target=self._accept, name="coordinator_accept",
+                                               daemon=True)
+        self._accept_thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def workers(self) -> int:
+        with self._cond:
+            return self._workers
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                sock, _ = self.listener.accept()
+            except socket.timeout:
+                continue
+            except OSError as e:
+                if not self._closed:
+                    print(f"Error accepting scan worker: {str(e)}")
+                continue
+            # 认证在连接各自的线程中进行，不发送数据的客户端不会阻塞其他节点接入
+            threading.Thread(target=self._authenticate, args=(sock,), name="coordinator_worker",
+                             daemon=True).start()
+
+    def _authenticate(self, sock):
+        """认证新连接，通过后为其服务；超时未完成握手的连接被关闭"""
+        sock.setblocking(True)
+        conn = Connection(os.dup(sock.fileno()))
+        # 超时后关闭套接字的读写，阻塞中的握手随即因EOF失败
+        timer = threading.Timer(self.handshake_timeout, _shutdown_socket, args=(sock,))
+        timer.start()
+        try:
+            # 与 multiprocessing.connection.Client 的双向认证对应
+            deliver_challenge(conn, self.authkey)
+            answer_challenge(conn, self.authkey)
+        except (AuthenticationError, EOFError, OSError) as e:
+            print(f"Rejected scan worker: {str(e)}")
+            conn.close()
+            return
+        finally:
+            timer.cancel()
+            sock.close()
+        with self._cond:
+            if self._closed:
+                conn.close()
+                return
+            self._workers += 1
+            self._cond.notify_all()
+        self._serve(conn)
+
+    def _serve(self, conn):
+        """为一个工作节点分配任务，直到节点断开或协调者关闭"""
+        try:
+            while not self._closed:
+                try:
+                    task = self._pending.get(timeout=0.2)
+                except queue.Empty:
+                    continue
+                with self._cond:
+                    if task.done:
+                        continue
+                    task.attempts += 1
+                    task.running += 1
+                    self.stats['dispatched'] += 1
+                try:
+                    conn.send(task.message)
+                    status, payload = self._wait_result(conn, task)
+                except (EOFError, OSError) as e:
+                    self._fail(task, f"worker disconnected: {str(e)}")
+                    return
+                if status is None:
+                    return
+                if status == 'ok':
+                    self._complete(task, payload)
+                else:
+                    self._fail(task, payload)
+            conn.send(_STOP)
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+            with self._cond:
+                self._workers -= 1
+                self._cond.notify_all()
+
+    def _wait_result(self, conn, task):
+        """等待任务结果，超时后把任务同时交给其他节点，协调者关闭时返回 (None, None)"""
+        deadline = time.monotonic() + self.task_timeout
+        redispatched = False
+        while not conn.poll(0.2):
+            if self._closed:
+                return None, None
+            if not redispatched and time.monotonic() >= deadline:
+                redispatched = True
+                with self._cond:
+                    if not task.done and task.attempts < self.max_attempts:
+                        self.stats['redispatched'] += 1
+                        self._pending.put(task)
+        return conn.recv()
+
+    def _complete(self, task, payload):
+        with self._cond:
+            task.running -= 1
+            if task.done:
+                return
+            task.done = True
+            self._payloads[task.id] = payload
+            self._remaining -= 1
+            self._cond.notify_all()
+
+    def _fail(self, task, error):
+        with self._cond:
+            task.running -= 1
+            if task.done:
+                return
+            if task.attempts < self.max_attempts:
+                self.stats['redispatched'] += 1
+                self._pending.put(task)
+            elif task.running == 0:
+                # 多次失败后放弃该任务，错误记入结果
+                task.done = True
+                self.stats['failed'] += 1
+                self._payloads[task.id] = {'failed': str(error)}
+                self._remaining -= 1
+                self._cond.notify_all()
+
+    def _run_tasks(self, messages) -> List[dict]:
+        """分发一批任务并等待全部完成，按任务顺序返回结果"""
+        tasks = [_Task(i, message) for i, message in enumerate(messages)]
+        with self._cond:
+            self._payloads = {}
+            self._remaining = len(tasks)
+        for task in tasks:
+            self._pending.put(task)
+
+        idle_since = None
+        with self._cond:
+            while self._remaining:
+                if self._workers == 0:
+                    idle_since = idle_since or time.monotonic()
+                    if time.monotonic() - idle_since > self.connect_timeout:
+                        raise ConnectionError("No scan workers connected")
+                else:
+                    idle_since = None
+                self._cond.wait(0.5)
+            return [self._payloads[task.id] for task in tasks]
+
+    def wait_for_workers(self, count: int, timeout: Optional[float] = None) -> bool:
+        """等待至少count个工作节点连接"""
+        deadline = time.monotonic() + (timeout if timeout is not None else self.connect_timeout)
+        with self._cond:
+            while self._workers < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def scan_directory(self, directory: str) -> dict:
+        """分布式扫描目录，返回与 FileScanner.scan_directory 结构相同的结果"""
+        if not os.path.exists(directory):
+            raise FileNotFoundError(f"Directory not found: {directory}")
+        scanner = self.scanner
+        target = max(1, self.workers) * self.partitions_per_worker
+        partitions = plan_partitions(directory, target, scanner.follow_symlinks, scanner.file_filter)
+        now = time.time()
+
+        # 第一阶段：各分区的遍历结果按分区顺序合并，大小表在全局按inode去重
+        results = scanner.new_results()
+        finder = scanner.new_duplicate_finder()
+        payloads = self._run_tasks([(WALK, path, recursive, now, scanner.file_filter)
+                                    for path, recursive in partitions])
+        for (path, _), payload in zip(partitions, payloads):
+            if 'failed' in payload:
+                results['errors'].append({'path': path, 'error': payload['failed']})
+                continue
+            self._merge_results(results, payload['results'])
+            for entry_path, stat in payload['entries']:
+                stat_result = StoredStat(*stat)
+                finder.add(entry_path, stat_result.st_size, stat_result)
+        results['hardlinks'] = finder.link_groups()
+
+        # 第二阶段：完整的同大小分组分批计算哈希
+        groups = [(size, paths) for size, paths in finder.size_groups.items() if len(paths) > 1]
+        batches = balance_groups(groups, target)
+        payloads = self._run_tasks([(HASH, batch) for batch in batches])
+        for batch, payload in zip(batches, payloads):
+            if 'failed' in payload:
+                for _, paths in batch:
+                    results['errors'].extend({'path': path, 'error': payload['failed']}
+                                             for path in paths)
+                continue
+            for file_hash, files in payload['duplicates']:
+                results['duplicates'][file_hash] = files
+            results['errors'].extend(payload['errors'])
+        results['duplicate_directories'] = scanner.find_duplicate_directories(
+            finder.paths(), results['duplicates'], results['hardlinks']
+        )
+        # 近似副本检测需要同时比较多个文件的块，在协调者上进行
+        results['near_duplicates'] = scanner.find_near_duplicates(
+            [info['path'] for info in results['large_files']], results['duplicates'],
+            results['hardlinks'],
+            on_error=lambda path, error: results['errors'].append({'path': path, 'error': str(error)})
+        )
+        return results
+
+    @staticmethod
+    def _merge_results(results, partial):
+        for category, files in partial['classified_files'].items():
+            results['classified_files'][category].extend(files)
+        for key in ('large_files', 'old_files', 'errors'):
+            results[key].extend(partial[key])
+
+    def close(self):
+        """通知工作节点退出并停止监听"""
+        if self._closed:
+            return
+        self._closed = True
+        self._accept_thread.join()
+        self.listener.close()
+        if isinstance(self.address, str):
+            try:
+                os.unlink(self.address)
+            except OSError:
+                pass
+        with self._cond:
+            deadline = time.monotonic() + 5
+            while self._workers and time.monotonic() < deadline:
+                self._cond.wait(0.2)
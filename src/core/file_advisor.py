@@ -2,6 +2,10 @@ import os
 from datetime import datetime
 import numpy as np
 
+from src.utils.cancellation import PartialResult
+from .dedup import collapse_duplicates
+from .scan_events import FILE_CLASSIFIED, DUPLICATE_GROUP, DUPLICATE_DIRECTORY
+
 class FileAdvisor:
     def __init__(self, ai_models):
         self.ai_models = ai_models
@@ -48,34 +52,80 @@ class FileAdvisor:
             print(f"Error analyzing file importance {file_path}: {str(e)}")
             return None
     
-    def generate_recommendations(self, scan_results):
-        """生成文件管理建议"""
-        recommendations = []
+    def generate_recommendations(self, scan_results, cancel=None):
+        """生成文件管理建议
+
+        返回 PartialResult：取消后不再对剩余文件做重要性推断，重复文件的建议照常生成，
+        complete 为False；扫描结果本身不完整时 complete 也为False。
+        """
+        recommendations = PartialResult(complete=scan_results.get('complete', True))
         
         # 分析每个文件的重要性
         for category, files in scan_results['classified_files'].items():
             for file_path in files:
-                importance = self.analyze_file_importance(file_path)
-                if importance:
-                    if importance['importance_level'] == 'high':
-                        recommendations.append({
-                            'file': file_path,
-                            'action': 'backup',
-                            'reason': 'High importance file should be backed up'
-                        })
-                    elif importance['importance_level'] == 'low':
-                        recommendations.append({
-                            'file': file_path,
-                            'action': 'review',
-                            'reason': 'Low importance file could be removed'
-                        })
+                if cancel is not None and cancel.cancelled:
+                    recommendations.complete = False
+                    break
+                recommendation = self._importance_recommendation(file_path)
+                if recommendation:
+                    recommendations.append(recommendation)
         
+        # 处理重复目录，其中的重复文件不再逐组建议
+        duplicate_directories = scan_results.get('duplicate_directories', {})
+        for digest, directories in duplicate_directories.items():
+            recommendations.append(self._duplicate_directory_recommendation(directories))
+
         # 处理重复文件
-        for hash_value, duplicates in scan_results['duplicates'].items():
-            recommendations.append({
-                'files': duplicates,
-                'action': 'remove_duplicates',
-                'reason': f'Found {len(duplicates)} duplicate files'
-            })
+        for hash_value, duplicates in collapse_duplicates(scan_results['duplicates'],
+                                                          duplicate_directories).items():
+            recommendations.append(self._duplicate_recommendation(duplicates))
         
-        return recommendations
\ No newline at end of file
+        return recommendations
+    
+    def iter_recommendations(self, events, cancel=None):
+        """从流式扫描事件中逐条产出管理建议，取消后停止"""
+        for event in events:
+            if cancel is not None and cancel.cancelled:
+                return
+            if event.type == FILE_CLASSIFIED:
+                recommendation = self._importance_recommendation(event.path)
+                if recommendation:
+                    yield recommendation
+            elif event.type == DUPLICATE_GROUP:
+                yield self._duplicate_recommendation(event.data[1])
+            elif event.type == DUPLICATE_DIRECTORY:
+                yield self._duplicate_directory_recommendation(event.data[1])
+    
+    def _importance_recommendation(self, file_path):
+        """根据文件重要性生成建议，中等重要性不生成建议"""
+        importance = self.analyze_file_importance(file_path)
+        if importance:
+            if importance['importance_level'] == 'high':
+                return {
+                    'file': file_path,
+                    'action': 'backup',
+                    'reason': 'High importance file should be backed up'
+                }
+            elif importance['importance_level'] == 'low':
+                return {
+                    'file': file_path,
+                    'action': 'review',
+                    'reason': 'Low importance file could be removed'
+                }
+        return None
+    
+    @staticmethod
+    def _duplicate_recommendation(duplicates):
+        return {
+            'files': duplicates,
+            'action': 'remove_duplicates',
+            'reason': f'Found {len(duplicates)} duplicate files'
+        }
+
+    @staticmethod
+    def _duplicate_directory_recommendation(directories):
+        return {
+            'directories': directories,
+            'action': 'remove_duplicate_directories',
+            'reason': f'Found {len(directories)} identical directories'
+        }
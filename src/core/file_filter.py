@@ -0,0 +1,108 @@
+import os
+import re
+import sys
+import fnmatch
+from typing import Iterable, Optional
+
+# Windows的系统文件属性 FILE_ATTRIBUTE_SYSTEM
+_FILE_ATTRIBUTE_SYSTEM = 0x4
+
+# 不扫描系统文件时跳过的目录和文件名
+SYSTEM_NAMES = frozenset({
+    '$Recycle.Bin', '$RECYCLE.BIN', 'System Volume Information',
+    'pagefile.sys', 'hiberfil.sys', 'swapfile.sys', 'lost+found',
+})
+if sys.platform.startswith('win'):
+    SYSTEM_DIRECTORIES = frozenset(
+        os.path.normcase(os.environ.get(name, default))
+        for name, default in (('SystemRoot', r'C:\Windows'),
+                              ('ProgramData', r'C:\ProgramData'))
+    )
+else:
+    SYSTEM_DIRECTORIES = frozenset({'/proc', '/sys', '/dev', '/run'})
+
+
+def compile_patterns(patterns: Iterable[str]) -> Optional['re.Pattern']:
+    """把多个glob模式合并编译为一个正则，没有模式时返回None"""
+    translated = [fnmatch.translate(os.path.normcase(p)) for p in patterns]
+    if not translated:
+        return None
+    return re.compile('|'.join(f'(?:{t})' for t in translated))
+
+
+class FileFilter:
+    """编译后的扫描过滤规则
+
+    名称模式与文件名或目录名匹配，含路径分隔符的模式与完整路径匹配；
+    匹配的目录在进入前剪枝，文件在stat前按名称排除，按大小的排除使用
+    遍历时已取得的stat结果。
+    """
+
+    def __init__(self, patterns: Iterable[str] = (), min_size: int = 0,
+                 max_size: Optional[int] = None, scan_system_files: bool = True):
+        self.patterns = list(patterns)
+        self.min_size = min_size or 0
+        self.max_size = max_size
+        self.scan_system_files = scan_system_files
+        self._name_regex = compile_patterns(p for p in self.patterns if '/' not in p)
+        self._path_regex = compile_patterns(p for p in self.patterns if '/' in p)
+
+    @classmethod
+    def from_scan_config(cls, config) -> 'FileFilter':
+        """根据 SCAN_CONFIG 创建扫描过滤器"""
+        return cls(
+            config.get('ignore_patterns', ()),
+            config.get('min_file_size', 0),
+            config.get('max_file_size'),
+            config.get('scan_system_files', True),
+        )
+
+    @classmethod
+    def from_backup_config(cls, config) -> 'FileFilter':
+        """根据 BACKUP_CONFIG 创建备份过滤器，只按模式排除"""
+        return cls(config.get('exclude_patterns', ()))
+
+    @property
+    def key(self) -> str:
+        """过滤规则的标识，规则变化时增量扫描需要重新列出目录"""
+        return repr((self.patterns, self.min_size, self.max_size, self.scan_system_files))
+
+    def without_stat_checks(self) -> 'FileFilter':
+        """只保留名称和目录规则的副本"""
+        return FileFilter(self.patterns, scan_system_files=self.scan_system_files)
+
+    def _ignored(self, path: str, name: str) -> bool:
+        if self._name_regex is not None and self._name_regex.match(os.path.normcase(name)):
+            return True
+        if self._path_regex is not None:
+            return self._path_regex.match(os.path.normcase(path)) is not None
+        return False
+
+    def allow_directory(self, path: str, name: str) -> bool:
+        """是否进入子目录"""
+        if self._ignored(path, name):
+            return False
+        if not self.scan_system_files:
+            if name in SYSTEM_NAMES or os.path.normcase(path) in SYSTEM_DIRECTORIES:
+                return False
+        return True
+
+    def allow_name(self, path: str, name: str) -> bool:
+        """stat之前按名称判断文件是否保留"""
+        if self._ignored(path, name):
+            return False
+        return self.scan_system_files or name not in SYSTEM_NAMES
+
+    def allow_stat(self, stat_result) -> bool:
+        """按已取得的stat结果判断文件是否保留"""
+        size = stat_result.st_size
+        if size < self.min_size or (self.max_size is not None and size > self.max_size):
+            return False
+        if not self.scan_system_files:
+            attributes = getattr(stat_result, 'st_file_attributes', 0)
+            if attributes & _FILE_ATTRIBUTE_SYSTEM:
+                return False
+        return True
+
+    def allow_file(self, path: str, name: str, stat_result) -> bool:
+        return self.allow_name(path, name) and self.allow_stat(stat_result)
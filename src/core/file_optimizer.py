@@ -1,6 +1,9 @@
 from PIL import Image
 import os
 
+from .dedup import collapse_duplicates
+from .scan_events import LARGE_FILE, DUPLICATE_GROUP, DUPLICATE_DIRECTORY, NEAR_DUPLICATE, OLD_FILE
+
 class FileOptimizer:
     def __init__(self):
         self.compression_quality = {
@@ -107,29 +110,84 @@ class FileOptimizer:
         
         # 处理大文件
         for file_info in scan_results['large_files']:
-            suggestions.append({
-                'type': 'large_file',
-                'path': file_info['path'],
-                'suggestion': 'Consider compressing or archiving this large file'
-            })
+            suggestions.append(self._large_file_suggestion(file_info['path']))
+
+        # 处理共享大量内容的大文件（追加写入的日志、磁盘快照等）
+        for pair in scan_results.get('near_duplicates', []):
+            suggestions.append(self._near_duplicate_suggestion(pair))
         
+        # 处理重复目录，其中的重复文件不再逐组建议
+        duplicate_directories = scan_results.get('duplicate_directories', {})
+        for digest, directories in duplicate_directories.items():
+            suggestions.append(self._duplicate_directory_suggestion(directories))
+
         # 处理重复文件
-        for hash_value, duplicate_files in scan_results['duplicates'].items():
-            suggestions.append({
-                'type': 'duplicate',
-                'files': duplicate_files,
-                'suggestion': 'These files are identical. Consider removing duplicates'
-            })
+        for hash_value, duplicate_files in collapse_duplicates(scan_results['duplicates'],
+                                                               duplicate_directories).items():
+            suggestions.append(self._duplicate_suggestion(duplicate_files))
         
         # 处理旧文件
         for file_info in scan_results['old_files']:
-            suggestions.append({
-                'type': 'old_file',
-                'path': file_info['path'],
-                'suggestion': 'This file has not been accessed for a long time. Consider archiving or removing'
-            })
+            suggestions.append(self._old_file_suggestion(file_info['path']))
         
         return suggestions
+    
+    def iter_suggestions(self, events):
+        """从流式扫描事件中逐条产出优化建议"""
+        for event in events:
+            if event.type == LARGE_FILE:
+                yield self._large_file_suggestion(event.path)
+            elif event.type == NEAR_DUPLICATE:
+                yield self._near_duplicate_suggestion(event.data)
+            elif event.type == DUPLICATE_GROUP:
+                yield self._duplicate_suggestion(event.data[1])
+            elif event.type == DUPLICATE_DIRECTORY:
+                yield self._duplicate_directory_suggestion(event.data[1])
+            elif event.type == OLD_FILE:
+                yield self._old_file_suggestion(event.path)
+    
+    @staticmethod
+    def _large_file_suggestion(path):
+        return {
+            'type': 'large_file',
+            'path': path,
+            'suggestion': 'Consider compressing or archiving this large file'
+        }
+    
+    @staticmethod
+    def _near_duplicate_suggestion(pair):
+        return {
+            'type': 'near_duplicate',
+            'files': pair['files'],
+            'shared_bytes': pair['shared_bytes'],
+            'reclaimable_bytes': pair['reclaimable_bytes'],
+            'suggestion': (f"These files share {pair['ratio']:.0%} of their content. "
+                           "Consider keeping only the newer version or using a deduplicating archive")
+        }
+
+    @staticmethod
+    def _duplicate_suggestion(duplicate_files):
+        return {
+            'type': 'duplicate',
+            'files': duplicate_files,
+            'suggestion': 'These files are identical. Consider removing duplicates'
+        }
+
+    @staticmethod
+    def _duplicate_directory_suggestion(directories):
+        return {
+            'type': 'duplicate_directory',
+            'directories': directories,
+            'suggestion': 'These directories are identical. Consider keeping only one copy'
+        }
+    
+    @staticmethod
+    def _old_file_suggestion(path):
+        return {
+            'type': 'old_file',
+            'path': path,
+            'suggestion': 'This file has not been accessed for a long time. Consider archiving or removing'
+        }
 
     def get_format_suggestions(self, file_path):
         """获取文件格式转换建议"""
@@ -1,7 +1,29 @@
 import os
-import hashlib
+import time
+from contextlib import nullcontext
 from datetime import datetime
-import filetype  # 用于文件类型检测
+
+from src.config.settings import SCAN_CONFIG, PERFORMANCE_CONFIG
+from src.utils.cancellation import CancellationToken, OperationCancelled
+from src.utils.hash_cache import flush_hash_cache
+from src.utils.hash_util import HashUtils
+from .checkpoint import ScanCheckpoint, checkpointed_walk
+from .chunking import find_similar_files
+from .content_type import ContentTypeDetector
+from .dedup import DuplicateFinder, find_duplicate_directories
+from .device_io import physical_order_map
+from .file_filter import FileFilter
+from .incremental import IncrementalWalker
+from .result_store import FileRecordStore
+from .throttle import ScanThrottle
+from .scan_events import (
+    ScanEvent, FILE_DISCOVERED, FILE_CLASSIFIED, LARGE_FILE, OLD_FILE,
+    DUPLICATE_GROUP, HARDLINK_GROUP, DUPLICATE_DIRECTORY, NEAR_DUPLICATE, SCAN_ERROR,
+    SCAN_CANCELLED
+)
+from .walker import FileEntry, create_walker
+
+SECONDS_PER_DAY = 24 * 60 * 60
 
 class FileScanner:
     def __init__(self, ai_models):
@@ -13,81 +35,426 @@ class FileScanner:
             'audio': ['.mp3', '.wav', '.flac'],
             'archives': ['.zip', '.rar', '.7z']
         }
-        
+        # 扩展名 -> 类别 的反向索引，避免逐类别线性查找
+        self.extension_map = {
+            ext: category
+            for category, extensions in self.file_types.items()
+            for ext in extensions
+        }
+        self.large_file_threshold = 100 * 1024  # 大于100KB (对于测试用例)
+        self.old_file_days = 180  # 超过180天
+        # 忽略规则、大小限制和系统文件规则在遍历时应用
+        self.file_filter = FileFilter.from_scan_config(SCAN_CONFIG)
+        self.follow_symlinks = follow_symlinks = SCAN_CONFIG.get('follow_symlinks', False)
+        # walker_threads > 1 时使用并行工作窃取遍历
+        self.walker = create_walker(
+            SCAN_CONFIG.get('walker_threads', 1),
+            follow_symlinks,
+            deterministic=SCAN_CONFIG.get('walker_deterministic', True),
+            file_filter=self.file_filter
+        )
+        # 增量扫描使用的遍历器，目录未变化时复用上次保存的列表
+        self.incremental_walker = IncrementalWalker(
+            SCAN_CONFIG['scan_state_path'],
+            follow_symlinks,
+            verify=SCAN_CONFIG.get('incremental_verify', 'strict'),
+            file_filter=self.file_filter
+        )
+        # 为True时顺序遍历的完整扫描也定期保存检查点，中断后可用 resume=True 继续
+        self.checkpoint_enabled = (SCAN_CONFIG.get('checkpoint_enabled', False)
+                                   and SCAN_CONFIG.get('walker_threads', 1) <= 1)
+        self.checkpoint_path = SCAN_CONFIG['checkpoint_path']
+        self.checkpoint_interval = SCAN_CONFIG.get('checkpoint_interval', 30)
+        # 正在进行的扫描的检查点，界面关闭时可立即保存
+        self.checkpoint = None
+        # 正在进行的扫描的取消令牌，cancel() 使扫描尽快结束并保留已得到的结果
+        self.cancel_token = None
+        # 内容类型只在需要时检测，不在扫描热路径上打开文件
+        self.content_types = ContentTypeDetector()
+        # 重复检测使用的哈希算法，默认使用xxh3以达到内存带宽级别的速度
+        self.hash_algorithm = SCAN_CONFIG.get('hash_algorithm', 'xxh3_128')
+        self.hash_chunk_size = SCAN_CONFIG.get('chunk_size', 1024 * 1024)
+        self.verify_duplicates = SCAN_CONFIG.get('hash_verify', False)
+        self.verify_algorithm = SCAN_CONFIG.get('hash_verify_algorithm', 'sha256')
+        # 机械硬盘上按物理位置顺序读取待哈希的文件
+        self.physical_read_order = SCAN_CONFIG.get('physical_read_order', True)
+        # 大而少的候选分组锁步逐块比较，读到第一个不同的块即停止
+        self.compare_max_files = SCAN_CONFIG.get('compare_max_files', 4)
+        self.compare_min_size = SCAN_CONFIG.get('compare_min_size', 16 * 1024 * 1024)
+        self.compare_block_size = SCAN_CONFIG.get('compare_block_size', 1024 * 1024)
+        # 重复文件检测之后按Merkle树找出整体重复的目录
+        self.directory_dedup = SCAN_CONFIG.get('directory_dedup', True)
+        # 可选：对大文件做内容定义分块，找出追加写入的日志、快照等近似副本
+        self.near_duplicates = SCAN_CONFIG.get('near_duplicate_enabled', False)
+        self.near_duplicate_min_ratio = SCAN_CONFIG.get('near_duplicate_min_ratio', 0.5)
+        self.chunk_options = {
+            'min_size': SCAN_CONFIG.get('cdc_min_chunk_size', 8 * 1024),
+            'avg_size': SCAN_CONFIG.get('cdc_avg_chunk_size', 32 * 1024),
+            'max_size': SCAN_CONFIG.get('cdc_max_chunk_size', 128 * 1024),
+        }
+        # 节流模式：限制读取和stat速率，按系统负载调整并发，使用idle I/O优先级
+        self.throttle = None
+        if SCAN_CONFIG.get('throttle_enabled', False):
+            self.throttle = ScanThrottle.from_config(
+                SCAN_CONFIG, PERFORMANCE_CONFIG, SCAN_CONFIG.get('max_workers', 4)
+            )
+        # 提前检查算法配置是否有效
+        HashUtils.new_hasher(self.hash_algorithm)
+        HashUtils.new_hasher(self.verify_algorithm)
+
+    @property
+    def file_filter(self):
+        return self._file_filter
+
+    @file_filter.setter
+    def file_filter(self, file_filter):
+        """更换过滤规则，各遍历器随之使用新规则"""
+        self._file_filter = file_filter
+        for walker in (getattr(self, 'walker', None), getattr(self, 'incremental_walker', None)):
+            if walker is not None:
+                walker.file_filter = file_filter
+
     def get_file_hash(self, file_path):
-        """计算文件的MD5哈希值"""
-        hash_md5 = hashlib.md5()
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
-    
-    def scan_directory(self, directory):
-        """扫描目录并返回文件分析结果"""
-        # 检查目录是否存在
-        if not os.path.exists(directory):
-            raise FileNotFoundError(f"Directory not found: {directory}")
-            
-        results = {
+        """按配置的算法计算文件哈希值，文件未变化时直接使用哈希缓存
+
+        扫描进行中时每块读取之前检查取消令牌，取消时抛出 OperationCancelled。
+        启用校验时在同一次读取中算出校验用的加密哈希并写入哈希缓存，
+        校验阶段不再读取文件。
+        """
+        if self.verify_duplicates and self.verify_algorithm != self.hash_algorithm:
+            return HashUtils.get_file_hashes(
+                file_path, [self.hash_algorithm, self.verify_algorithm], *self._read_options()
+            )[self.hash_algorithm]
+        return HashUtils.get_file_hash(file_path, self.hash_algorithm, *self._read_options())
+
+    def get_verify_hash(self, file_path):
+        """使用加密哈希算法校验重复文件"""
+        return HashUtils.get_file_hash(file_path, self.verify_algorithm, *self._read_options())
+
+    def _read_options(self):
+        """返回 (读取块大小, 每块读取前的回调)，节流时按 io_buffer_size 分块读取"""
+        chunk_size = self.hash_chunk_size
+        if self.throttle is not None:
+            chunk_size = self.throttle.chunk_size or chunk_size
+        return chunk_size, self._read_hook()
+
+    def _read_hook(self):
+        """每块读取之前调用的函数：节流时限制读取速率，扫描进行中时检查是否已取消"""
+        throttle = self.throttle.read if self.throttle is not None else None
+        cancel = self.cancel_token
+        if cancel is None:
+            return throttle
+        if throttle is None:
+            return cancel.check
+
+        def hook(nbytes):
+            cancel.raise_if_cancelled()
+            throttle(nbytes)
+        return hook
+
+    def cancel(self, reason='cancelled'):
+        """取消正在进行的扫描，扫描产出 SCAN_CANCELLED 后正常结束"""
+        token = self.cancel_token
+        if token is not None:
+            token.cancel(reason)
+
+    def throttled(self):
+        """节流模式下返回扫描期间生效的上下文，否则返回空上下文"""
+        return self.throttle.running() if self.throttle is not None else nullcontext()
+
+    def throttled_map(self, map_func):
+        """节流模式下让每个哈希任务受并发上限和I/O优先级约束"""
+        return self.throttle.wrap_map(map_func) if self.throttle is not None else map_func
+
+    def new_results(self):
+        """创建空的扫描结果字典"""
+        return {
             'duplicates': {},
+            'hardlinks': {},
+            'duplicate_directories': {},
+            'near_duplicates': [],
             'garbage': [],
             'classified_files': {k: [] for k in self.file_types.keys()},
             'large_files': [],
             'old_files': [],
-            'errors': []
+            'errors': [],
+            # 扫描被取消时为False，其余各项只包含取消前得到的结果
+            'complete': True
         }
-        
-        hash_dict = {}
-        
-        for root, _, files in os.walk(directory):
-            for filename in files:
-                file_path = os.path.join(root, filename)
-                
-                try:
-                    # 获取文件基本信息
-                    file_size = os.path.getsize(file_path)
-                    file_extension = os.path.splitext(filename)[1].lower()
-                    kind = filetype.guess(file_path)
-                    if kind is not None:
-                        file_type = kind.mime
-                    else:
-                        file_type = "unknown"
-                    
-                    # 分类文件
-                    self.classify_file(file_path, file_extension, results)
-                    
-                    # 检查大文件 - 测试时用较小的阈值
-                    if file_size > 100 * 1024:  # 大于100KB (对于测试用例)
-                        results['large_files'].append({
-                            'path': file_path,
-                            'size': file_size
-                        })
-                    
-                    # 检查旧文件
-                    mtime = os.path.getmtime(file_path)
-                    if (datetime.now() - datetime.fromtimestamp(mtime)).days > 180:  # 超过180天
-                        results['old_files'].append({
-                            'path': file_path,
-                            'last_modified': datetime.fromtimestamp(mtime)
-                        })
-                    
-                    # 检查重复文件
-                    file_hash = self.get_file_hash(file_path)
-                    if file_hash in hash_dict:
-                        if file_hash not in results['duplicates']:
-                            results['duplicates'][file_hash] = [hash_dict[file_hash]]
-                        results['duplicates'][file_hash].append(file_path)
-                    else:
-                        hash_dict[file_hash] = file_path
-                        
-                except Exception as e:
-                    print(f"Error processing file {file_path}: {str(e)}")
-                    
+
+    def get_walker(self, incremental=False):
+        """返回本次扫描使用的遍历器"""
+        return self.incremental_walker if incremental else self.walker
+
+    def scan_directory(self, directory, incremental=False, resume=False, cancel=None):
+        """扫描目录并返回文件分析结果
+
+        incremental=True 时只重新列出自上次扫描后有变化的目录，结果与完整扫描一致。
+        resume=True 时从上次中断时保存的检查点继续扫描。
+        被取消时返回已得到的部分结果，results['complete'] 为False。
+        """
+        results = self.new_results()
+        for event in self.iter_scan(directory, incremental=incremental, resume=resume,
+                                    cancel=cancel):
+            self.collect_event(results, event)
         return results
-    
+
+    def scan_to_store(self, directory, map_func=None, incremental=False, resume=False,
+                      cancel=None):
+        """扫描目录并返回列式结果存储，适合千万级文件的目录树
+
+        需要原有字典结构时使用 store.as_results()。
+        """
+        return FileRecordStore.from_events(
+            self.iter_scan(directory, map_func, incremental, resume, cancel), self.file_types.keys()
+        )
+
+    def iter_scan(self, directory, map_func=None, incremental=False, resume=False, cancel=None):
+        """流式扫描目录，在结果确定时立即产出ScanEvent
+
+        map_func 可传入 executor.map 以并行计算重复检测的哈希。
+        checkpoint_enabled 或 resume=True 时完整扫描定期保存检查点；resume=True 时
+        先重放检查点中的记录再按顺序遍历剩余目录，没有可用的检查点时从头扫描。
+        cancel 为取消令牌，未传入时新建一个，可通过 cancel() 取消。取消后不再产出
+        新的结果，最后产出 SCAN_CANCELLED；检查点不删除，之后可以继续。
+        """
+        # 检查目录是否存在（在调用时立即检查，而不是首次迭代时）
+        if not os.path.exists(directory):
+            raise FileNotFoundError(f"Directory not found: {directory}")
+        if incremental and resume:
+            raise ValueError("Incremental scans do not use checkpoints")
+        cancel = cancel or CancellationToken()
+        self.cancel_token = cancel
+        if not incremental and (resume or self.checkpoint_enabled):
+            return self._iter_checkpointed_scan(directory, map_func, resume, cancel)
+        walker = self.get_walker(incremental)
+        return self._iter_scan(
+            map_func, lambda on_error: walker.walk(directory, on_error=on_error, cancel=cancel),
+            cancel=cancel
+        )
+
+    def checkpoint_key(self, directory):
+        """影响检查点内容的扫描配置，变化后旧检查点不再可用"""
+        return repr((os.path.abspath(directory), self.file_filter.key, self.follow_symlinks,
+                     self.hash_algorithm, self.verify_duplicates and self.verify_algorithm))
+
+    def has_checkpoint(self, directory):
+        """目录是否有未完成扫描的检查点"""
+        return ScanCheckpoint.exists(self.checkpoint_path, directory, self.checkpoint_key(directory))
+
+    def save_checkpoint(self):
+        """立即保存正在进行的扫描的检查点"""
+        checkpoint = self.checkpoint
+        if checkpoint is not None:
+            checkpoint.save()
+
+    def _iter_checkpointed_scan(self, directory, map_func, resume, cancel):
+        checkpoint = ScanCheckpoint(self.checkpoint_path, directory,
+                                    self.checkpoint_key(directory), self.checkpoint_interval)
+        if not (resume and checkpoint.load()):
+            checkpoint.start(directory, time.time())
+
+        def walk(on_error):
+            # 先重放已遍历的文件和错误，再从保存的目录栈继续
+            for item in checkpoint.replay():
+                if isinstance(item, FileEntry):
+                    yield item
+                else:
+                    on_error(*item)
+            if checkpoint.pending is not None:
+                yield from checkpointed_walk(checkpoint, self.follow_symlinks,
+                                             self.file_filter, on_error, cancel)
+
+        self.checkpoint = checkpoint
+        completed = False
+        try:
+            yield from self._iter_scan(map_func, walk, checkpoint.started_at, checkpoint, cancel)
+            # 取消的扫描保留检查点
+            completed = not cancel.cancelled
+        finally:
+            if completed:
+                checkpoint.discard()
+            checkpoint.close()
+            if self.checkpoint is checkpoint:
+                self.checkpoint = None
+
+    def _iter_scan(self, map_func, walk, now=None, digest_memo=None, cancel=None):
+        """walk(on_error) 产出FileEntry；now 为判断旧文件的参考时间"""
+        cancel = cancel or CancellationToken()
+        self.cancel_token = cancel
+        errors = []
+        try:
+            with self.throttled():
+                yield from self._iter_entries(map_func, walk, now, digest_memo, cancel, errors)
+        except OperationCancelled:
+            # 已产出的事件仍然有效，补上未产出的错误后标记结果不完整
+            yield from errors
+            yield ScanEvent(SCAN_CANCELLED, data=cancel.reason)
+        finally:
+            # 哈希缓存命中的使用时间在扫描结束时一次写入
+            flush_hash_cache()
+            if self.cancel_token is cancel:
+                self.cancel_token = None
+
+    def _iter_entries(self, map_func, walk, now, digest_memo, cancel, errors):
+        if map_func is None and self.physical_read_order:
+            map_func = physical_order_map()
+        map_func = self.throttled_map(map_func or map)
+        finder = self.new_duplicate_finder(digest_memo)
+        # 扫描的参考时间只取一次
+        if now is None:
+            now = time.time()
+        large_files = []
+
+        def on_error(path, error):
+            print(f"Error processing {path}: {str(error)}")
+            errors.append(ScanEvent(SCAN_ERROR, path, str(error)))
+
+        for entry in walk(on_error):
+            cancel.raise_if_cancelled()
+            if self.throttle is not None:
+                self.throttle.stat()
+            try:
+                events = list(self.entry_events(entry, now))
+                # 登记重复文件候选，哈希推迟到遍历结束后分级计算
+                finder.add(entry.path, entry.size, entry.stat)
+                if any(event.type == LARGE_FILE for event in events):
+                    large_files.append(entry.path)
+            except Exception as e:
+                on_error(entry.path, e)
+                events = []
+            if errors:
+                yield from errors
+                errors.clear()
+            yield from events
+
+        # 硬链接不是重复文件，删除其中一个路径不释放空间，单独报告
+        link_groups = finder.link_groups()
+        for key, files in link_groups.items():
+            yield ScanEvent(HARDLINK_GROUP, data=(key, files))
+
+        # 检查重复文件（每个inode只检测一次），每确认一组就产出
+        duplicates = {}
+        for file_hash, files in finder.iter_duplicates(map_func, on_error):
+            cancel.raise_if_cancelled()
+            if errors:
+                yield from errors
+                errors.clear()
+            duplicates[file_hash] = files
+            yield ScanEvent(DUPLICATE_GROUP, data=(file_hash, files))
+        yield from errors
+        errors.clear()
+
+        # 整体重复的目录，只使用上面已得到的分组，不再读取文件
+        directories = self.find_duplicate_directories(finder.paths(), duplicates, link_groups)
+        for digest, paths in directories.items():
+            yield ScanEvent(DUPLICATE_DIRECTORY, data=(digest, paths))
+
+        # 可选的近似副本检测，只读取大文件
+        cancel.raise_if_cancelled()
+        pairs = self.find_near_duplicates(large_files, duplicates, link_groups, map_func, on_error)
+        for pair in pairs:
+            yield ScanEvent(NEAR_DUPLICATE, data=pair)
+        yield from errors
+
+    def collect_event(self, results, event):
+        """把扫描事件合并到结果字典"""
+        if event.type == FILE_CLASSIFIED:
+            results['classified_files'][event.data].append(event.path)
+        elif event.type == LARGE_FILE:
+            results['large_files'].append({
+                'path': event.path,
+                'size': event.data
+            })
+        elif event.type == OLD_FILE:
+            results['old_files'].append({
+                'path': event.path,
+                'last_modified': event.data
+            })
+        elif event.type == DUPLICATE_GROUP:
+            file_hash, files = event.data
+            results['duplicates'][file_hash] = files
+        elif event.type == HARDLINK_GROUP:
+            key, files = event.data
+            results['hardlinks'][key] = files
+        elif event.type == DUPLICATE_DIRECTORY:
+            digest, directories = event.data
+            results['duplicate_directories'][digest] = directories
+        elif event.type == NEAR_DUPLICATE:
+            results['near_duplicates'].append(event.data)
+        elif event.type == SCAN_ERROR:
+            results['errors'].append({'path': event.path, 'error': event.data})
+        elif event.type == SCAN_CANCELLED:
+            results['complete'] = False
+
+    def find_duplicate_directories(self, paths, duplicates, hardlinks):
+        """根据文件的重复分组找出整体重复的目录，未启用目录去重时返回空字典"""
+        if not self.directory_dedup:
+            return {}
+        return find_duplicate_directories(paths, duplicates, hardlinks, self.hash_algorithm)
+
+    def find_near_duplicates(self, paths, duplicates, hardlinks, map_func=None, on_error=None):
+        """对大文件做内容定义分块，返回共享字节比例高的文件对，未启用时返回空列表
+
+        完全相同的文件和同一inode的硬链接只分块第一个路径。map_func 与重复检测的相同。
+        """
+        if not self.near_duplicates:
+            return []
+        copies = {path for groups in (duplicates, hardlinks)
+                  for files in groups.values() for path in files[1:]}
+        return find_similar_files(
+            [path for path in paths if path not in copies], self.near_duplicate_min_ratio,
+            map_func, on_error=on_error,
+            throttle=self._read_hook(), **self.chunk_options
+        )
+
+    def new_duplicate_finder(self, digest_memo=None):
+        """创建使用本扫描器哈希函数的分级重复检测器，扫描进行中时每次读取之前检查取消令牌"""
+        verify_func = None
+        if self.verify_duplicates and self.verify_algorithm != self.hash_algorithm:
+            verify_func = self.get_verify_hash
+        return DuplicateFinder(self.get_file_hash, self.hash_algorithm, verify_func=verify_func,
+                               verify_algorithm=self.verify_algorithm,
+                               header_sink=self.content_types.remember_header,
+                               digest_memo=digest_memo,
+                               read_throttle=self._read_hook(),
+                               compare_max_files=self.compare_max_files,
+                               compare_min_size=self.compare_min_size,
+                               compare_block_size=self.compare_block_size)
+
+    def get_content_type(self, target):
+        """按需检测文件的MIME类型，接受路径或FileEntry"""
+        return self.content_types.detect(target)
+
+    def process_entry(self, entry, results, now):
+        """根据单次stat的结果完成分类、大文件和旧文件检查"""
+        for event in self.entry_events(entry, now):
+            self.collect_event(results, event)
+
+    def entry_events(self, entry, now):
+        """产出单个文件的发现、分类、大文件和旧文件事件"""
+        yield ScanEvent(FILE_DISCOVERED, entry.path, entry)
+
+        # 分类文件
+        category = self.get_category(entry.extension)
+        if category is not None:
+            yield ScanEvent(FILE_CLASSIFIED, entry.path, category)
+
+        # 检查大文件
+        if entry.size > self.large_file_threshold:
+            yield ScanEvent(LARGE_FILE, entry.path, entry.size)
+
+        # 检查旧文件
+        mtime = entry.mtime
+        if (now - mtime) // SECONDS_PER_DAY > self.old_file_days:
+            yield ScanEvent(OLD_FILE, entry.path, datetime.fromtimestamp(mtime))
+
+    def get_category(self, extension):
+        """获取扩展名对应的类别，未知类别返回None"""
+        return self.extension_map.get(extension)
+
     def classify_file(self, file_path, extension, results):
         """将文件分类到相应类别"""
-        for category, extensions in self.file_types.items():
-            if extension in extensions:
-                results['classified_files'][category].append(file_path)
-                break
\ No newline at end of file
+        category = self.get_category(extension)
+        if category is not None:
+            results['classified_files'][category].append(file_path)
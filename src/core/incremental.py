@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import sqlite3
+import stat as stat_module
+from typing import Callable, Iterator, Optional
+
+from src.utils.cancellation import CancellationToken
+from src.utils.hash_cache import _to_sqlite_int
+from .walker import DirectoryWalker, FileEntry, list_directory
+
+# 目录修改时间与上次列出时间相差不到该值时，无法区分是否在列出后又被修改，需要重新列出
+RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+
+class StoredStat:
+    """上次扫描保存的文件stat信息，提供扫描用到的属性"""
+
+    __slots__ = ('st_mode', 'st_ino', 'st_dev', 'st_nlink', 'st_size', 'st_mtime_ns', 'st_blocks')
+
+    def __init__(self, st_mode, st_ino, st_dev, st_nlink, st_size, st_mtime_ns, st_blocks):
+        self.st_mode = st_mode
+        self.st_ino = st_ino
+        self.st_dev = st_dev
+        self.st_nlink = st_nlink
+        self.st_size = st_size
+        self.st_mtime_ns = st_mtime_ns
+        self.st_blocks = st_blocks
+
+    @property
+    def st_mtime(self):
+        return self.st_mtime_ns / 1e9
+
+    @classmethod
+    def from_stat(cls, st):
+        return cls(st.st_mode, st.st_ino, st.st_dev, st.st_nlink, st.st_size,
+                   st.st_mtime_ns, getattr(st, 'st_blocks', 0))
+
+    def to_list(self):
+        return [self.st_mode, self.st_ino, self.st_dev, self.st_nlink, self.st_size,
+                self.st_mtime_ns, self.st_blocks]
+
+
+class ScanStateStore:
+    """保存每个目录指纹和文件列表的SQLite数据库"""
+
+    def __init__(self, db_path: str):
+        self._conn = sqlite3.connect(str(db_path), timeout=30)
+        columns = [row[1] for row in self._conn.execute('PRAGMA table_info(directories)')]
+        if 'entry_count' in columns:
+            # 旧版本的记录多一个不参与比较的列，状态只是缓存，直接重建
+            self._conn.execute('DROP TABLE directories')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS directories (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                ino INTEGER NOT NULL,
+                listed_at INTEGER NOT NULL,
+                filter_key TEXT NOT NULL,
+                subdirs TEXT NOT NULL,
+                files TEXT NOT NULL,
+                scan_id INTEGER NOT NULL
+            )
+        ''')
+        self._conn.commit()
+
+    def get(self, path: str):
+        return self._conn.execute(
+            'SELECT mtime_ns, ino, listed_at, filter_key, subdirs, files FROM directories WHERE path=?',
+            (path,)
+        ).fetchone()
+
+    def put(self, path, dir_stat, listed_at, filter_key, files, subdirs, scan_id):
+        stored_files = [[entry.name] + StoredStat.from_stat(entry.stat).to_list() for entry in files]
+        names = [os.path.basename(subdir) for subdir in subdirs]
+        self._conn.execute(
+            'INSERT OR REPLACE INTO directories '
+            '(path, mtime_ns, ino, listed_at, filter_key, subdirs, files, scan_id) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (path, dir_stat.st_mtime_ns, _to_sqlite_int(dir_stat.st_ino), listed_at,
+             filter_key, json.dumps(names), json.dumps(stored_files), scan_id)
+        )
+
+    def touch(self, path, scan_id):
+        self._conn.execute('UPDATE directories SET scan_id=? WHERE path=?', (scan_id, path))
+
+    def prune(self, root, scan_id):
+        """删除本次扫描中未访问到的（已删除的）目录记录"""
+        prefix = root.rstrip(os.sep) + os.sep
+        self._conn.execute(
+            'DELETE FROM directories WHERE scan_id != ? AND (path = ? OR substr(path, 1, ?) = ?)',
+            (scan_id, root, len(prefix), prefix)
+        )
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+
+class IncrementalWalker(DirectoryWalker):
+    """增量遍历器：目录指纹未变化时不重新列出目录
+
+    目录指纹为 (st_mtime_ns, st_ino)，目录项增删或重命名都会改变目录的修改时间。
+    文件内容的原地修改不会改变目录的修改时间，因此 verify='strict'（默认）时
+    仍会stat已知的文件，仅省去目录列出；verify='trust' 时直接复用上次保存的
+    stat信息，速度最快，但无法发现原地修改的文件。
+
+    保存的列表只经过名称和目录规则过滤，大小等依赖stat的规则在产出时检查，
+    以免原地修改后进入大小范围的文件被遗漏。
+    """
+
+    def __init__(self, state_path: str, follow_symlinks: bool = False, verify: str = 'strict',
+                 file_filter=None):
+        super().__init__(follow_symlinks, file_filter)
+        self.state_path = state_path
+        self.verify = verify
+        self.stats = {'dirs_listed': 0, 'dirs_reused': 0}
+
+    def walk(self, directory: str,
+             on_error: Optional[Callable[[str, OSError], None]] = None,
+             cancel: Optional[CancellationToken] = None) -> Iterator[FileEntry]:
+        """遍历目录，未变化的目录复用上次的结果
+
+        取消时抛出 OperationCancelled，已列出的目录照常保存，但不清理已删除目录的记录。
+        """
+        self.stats = {'dirs_listed': 0, 'dirs_reused': 0}
+        state = ScanStateStore(self.state_path)
+        scan_id = time.time_ns()
+        listing_filter = self.file_filter.without_stat_checks() if self.file_filter else None
+        filter_key = listing_filter.key if listing_filter else ''
+        completed = False
+        try:
+            stack = [directory]
+            # 跟随符号链接时已进入目录的 (st_dev, st_ino)，避免符号链接环无限遍历
+            visited = set()
+            while stack:
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                current = stack.pop()
+                # 记录以绝对路径为键，产出的路径保持调用方传入的形式
+                key = os.path.abspath(current)
+                try:
+                    dir_stat = os.stat(current)
+                except OSError:
+                    # 交给list_directory报告与完整扫描一致的错误
+                    dir_stat = None
+                if self.follow_symlinks and dir_stat is not None:
+                    if (dir_stat.st_dev, dir_stat.st_ino) in visited:
+                        continue
+                    visited.add((dir_stat.st_dev, dir_stat.st_ino))
+
+                listing = None
+                if dir_stat is not None:
+                    listing = self._reuse(state, key, current, dir_stat, filter_key)
+                if listing is not None:
+                    state.touch(key, scan_id)
+                    self.stats['dirs_reused'] += 1
+                else:
+                    listed_at = time.time_ns()
+                    listing = list_directory(current, self.follow_symlinks, listing_filter, cancel)
+                    # 列出时有错误的目录不保存，下次重新列出以再次报告错误
+                    if dir_stat is not None and not listing[2]:
+                        state.put(key, dir_stat, listed_at, filter_key, listing[0], listing[1], scan_id)
+                    self.stats['dirs_listed'] += 1
+
+                files, subdirs, errors = listing
+                for path, error in errors:
+                    self._report(on_error, path, error)
+                if self.file_filter is None:
+                    yield from files
+                else:
+                    yield from (e for e in files if self.file_filter.allow_stat(e.stat))
+                stack.extend(reversed(subdirs))
+            completed = True
+        finally:
+            # 只有完整遍历后才能判断哪些目录已被删除
+            if completed:
+                state.prune(os.path.abspath(directory), scan_id)
+            state.close()
+
+    def _reuse(self, state, key, path, dir_stat, filter_key):
+        """指纹和过滤规则都未变化时根据保存的记录还原目录内容，否则返回None"""
+        row = state.get(key)
+        if row is None:
+            return None
+        mtime_ns, ino, listed_at, stored_filter_key, subdirs, files = row
+        if stored_filter_key != filter_key:
+            return None
+        if (mtime_ns, ino) != (dir_stat.st_mtime_ns, _to_sqlite_int(dir_stat.st_ino)):
+            return None
+        if dir_stat.st_mtime_ns >= listed_at - RACY_WINDOW_NS:
+            return None
+
+        entries = []
+        for item in json.loads(files):
+            name = item[0]
+            file_path = os.path.join(path, name)
+            if self.verify == 'trust':
+                stat_result = StoredStat(*item[1:])
+            else:
+                try:
+                    stat_result = os.stat(file_path)
+                except OSError:
+                    return None
+                if not stat_module.S_ISREG(stat_result.st_mode):
+                    return None
+            entries.append(FileEntry(file_path, name, stat_result))
+        subdir_paths = [os.path.join(path, name) for name in json.loads(subdirs)]
+        return entries, subdir_paths, []
@@ -0,0 +1,237 @@
+import os
+from array import array
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+from .scan_events import (
+    FILE_DISCOVERED, FILE_CLASSIFIED, LARGE_FILE, OLD_FILE, DUPLICATE_GROUP, HARDLINK_GROUP,
+    DUPLICATE_DIRECTORY, NEAR_DUPLICATE, SCAN_ERROR, SCAN_CANCELLED
+)
+
+NO_CATEGORY = -1
+
+
+class FileRecordStore:
+    """列式扫描结果存储
+
+    每个文件只存一条记录：目录编号（指向去重后的目录表）+ 文件名，以及
+    array 支持的大小、修改时间、类别列。分类列表、大文件、旧文件和重复
+    分组都只保存记录下标，不再重复保存路径字符串和datetime对象。
+    """
+
+    def __init__(self, category_names: Sequence[str]):
+        self.category_names = list(category_names)
+        self._category_codes = {name: code for code, name in enumerate(self.category_names)}
+        # 目录表
+        self.directories: List[str] = []
+        self._directory_ids: Dict[str, int] = {}
+        # 记录列
+        self.dir_ids = array('I')
+        self.basenames: List[str] = []
+        self.sizes = array('q')
+        self.mtimes = array('d')
+        self.categories = array('b')
+        # 下标视图
+        self.large_indices = array('I')
+        self.old_indices = array('I')
+        self.duplicate_groups: Dict[str, array] = {}
+        self.hardlink_groups: Dict[str, array] = {}
+        # 重复目录分组保存目录路径（只含子目录的目录不在目录表中）
+        self.duplicate_directories: Dict[str, List[str]] = {}
+        # 近似副本的文件对
+        self.near_duplicates: List[dict] = []
+        self.errors: List[Dict[str, str]] = []
+        # 扫描被取消时为False
+        self.complete = True
+        # 遍历结束前到达的重复分组和硬链接分组，结束后一次性解析为下标
+        self._pending_groups: Dict[str, List[str]] = {}
+        self._pending_links: Dict[str, List[str]] = {}
+        # 最近一次添加的记录，用于把后续的逐文件事件关联到记录
+        self._last_path = None
+        self._last_index = None
+
+    def __len__(self):
+        return len(self.basenames)
+
+    def add(self, path: str, size: int, mtime: float, category: str = None) -> int:
+        """添加一条文件记录，返回记录下标"""
+        directory, basename = os.path.split(path)
+        dir_id = self._directory_ids.get(directory)
+        if dir_id is None:
+            dir_id = len(self.directories)
+            self._directory_ids[directory] = dir_id
+            self.directories.append(directory)
+        self.dir_ids.append(dir_id)
+        self.basenames.append(basename)
+        self.sizes.append(size)
+        self.mtimes.append(mtime)
+        self.categories.append(
+            self._category_codes[category] if category is not None else NO_CATEGORY
+        )
+        return len(self.basenames) - 1
+
+    def path(self, index: int) -> str:
+        """还原记录的完整路径"""
+        return os.path.join(self.directories[self.dir_ids[index]], self.basenames[index])
+
+    def paths(self, indices: Iterable[int]) -> List[str]:
+        return [self.path(i) for i in indices]
+
+    def category_indices(self, category: str) -> np.ndarray:
+        """某个类别的记录下标"""
+        code = self._category_codes[category]
+        return np.flatnonzero(self.category_column() == code)
+
+    def size_column(self) -> np.ndarray:
+        """大小列的NumPy视图（不复制，视图存在期间不能再添加记录）"""
+        return np.frombuffer(self.sizes, dtype=np.int64)
+
+    def mtime_column(self) -> np.ndarray:
+        return np.frombuffer(self.mtimes, dtype=np.float64)
+
+    def category_column(self) -> np.ndarray:
+        return np.frombuffer(self.categories, dtype=np.int8)
+
+    def category_sizes(self) -> Dict[str, int]:
+        """各类别的总大小"""
+        sizes = self.size_column()
+        codes = self.category_column()
+        return {
+            name: int(sizes[codes == code].sum())
+            for code, name in enumerate(self.category_names)
+        }
+
+    def collect_event(self, event):
+        """把流式扫描事件合并到存储中"""
+        if event.type == FILE_DISCOVERED:
+            entry = event.data
+            self._last_path = entry.path
+            self._last_index = self.add(entry.path, entry.size, entry.mtime)
+        elif event.type == FILE_CLASSIFIED:
+            self.categories[self._index_of(event.path)] = self._category_codes[event.data]
+        elif event.type == LARGE_FILE:
+            self.large_indices.append(self._index_of(event.path))
+        elif event.type == OLD_FILE:
+            self.old_indices.append(self._index_of(event.path))
+        elif event.type == DUPLICATE_GROUP:
+            file_hash, files = event.data
+            self._pending_groups[file_hash] = files
+        elif event.type == HARDLINK_GROUP:
+            key, files = event.data
+            self._pending_links[key] = files
+        elif event.type == DUPLICATE_DIRECTORY:
+            digest, directories = event.data
+            self.duplicate_directories[digest] = directories
+        elif event.type == NEAR_DUPLICATE:
+            self.near_duplicates.append(event.data)
+        elif event.type == SCAN_ERROR:
+            self.errors.append({'path': event.path, 'error': event.data})
+        elif event.type == SCAN_CANCELLED:
+            self.complete = False
+
+    def _index_of(self, path):
+        # 逐文件事件紧跟在该文件的发现事件之后
+        if path != self._last_path:
+            raise KeyError(f"No record for {path}")
+        return self._last_index
+
+    def finish(self):
+        """把缓存的分组路径一次性解析为记录下标"""
+        if not self._pending_groups and not self._pending_links:
+            return
+        wanted = {
+            path
+            for groups in (self._pending_groups, self._pending_links)
+            for files in groups.values()
+            for path in files
+        }
+        index_by_path = {}
+        for index in range(len(self)):
+            path = self.path(index)
+            if path in wanted:
+                index_by_path[path] = index
+        for file_hash, files in self._pending_groups.items():
+            self.duplicate_groups[file_hash] = array('I', (index_by_path[p] for p in files))
+        for key, files in self._pending_links.items():
+            self.hardlink_groups[key] = array('I', (index_by_path[p] for p in files))
+        self._pending_groups = {}
+        self._pending_links = {}
+
+    @classmethod
+    def from_events(cls, events, category_names: Sequence[str]) -> 'FileRecordStore':
+        """从流式扫描事件构建存储"""
+        store = cls(category_names)
+        for event in events:
+            store.collect_event(event)
+        store.finish()
+        return store
+
+    def as_results(self) -> 'ScanResultsView':
+        """返回兼容原有结果字典结构的只读视图"""
+        return ScanResultsView(self)
+
+
+class ScanResultsView(Mapping):
+    """以原有dict结构访问FileRecordStore，各键在首次访问时才生成"""
+
+    KEYS = ('duplicates', 'hardlinks', 'duplicate_directories', 'near_duplicates', 'garbage',
+            'classified_files', 'large_files', 'old_files', 'errors', 'complete')
+
+    def __init__(self, store: FileRecordStore):
+        self.store = store
+        self._cache = {}
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        if key not in self._cache:
+            self._cache[key] = getattr(self, f'_build_{key}')()
+        return self._cache[key]
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def _build_duplicates(self):
+        return {h: self.store.paths(group) for h, group in self.store.duplicate_groups.items()}
+
+    def _build_hardlinks(self):
+        return {key: self.store.paths(group) for key, group in self.store.hardlink_groups.items()}
+
+    def _build_duplicate_directories(self):
+        return {digest: list(dirs) for digest, dirs in self.store.duplicate_directories.items()}
+
+    def _build_near_duplicates(self):
+        return [dict(pair) for pair in self.store.near_duplicates]
+
+    def _build_garbage(self):
+        return []
+
+    def _build_classified_files(self):
+        return {
+            name: self.store.paths(self.store.category_indices(name))
+            for name in self.store.category_names
+        }
+
+    def _build_large_files(self):
+        return [
+            {'path': self.store.path(i), 'size': self.store.sizes[i]}
+            for i in self.store.large_indices
+        ]
+
+    def _build_old_files(self):
+        return [
+            {'path': self.store.path(i), 'last_modified': datetime.fromtimestamp(self.store.mtimes[i])}
+            for i in self.store.old_indices
+        ]
+
+    def _build_errors(self):
+        return list(self.store.errors)
+
+    def _build_complete(self):
+        return self.store.complete
@@ -0,0 +1,27 @@
+from typing import Any, Optional
+
+# 事件类型
+FILE_DISCOVERED = 'file_discovered'  # data: FileEntry
+FILE_CLASSIFIED = 'file_classified'  # data: 类别名
+LARGE_FILE = 'large_file'  # data: 文件大小
+OLD_FILE = 'old_file'  # data: 最后修改时间(datetime)
+DUPLICATE_GROUP = 'duplicate_group'  # path为None，data: (哈希, [路径, ...])
+HARDLINK_GROUP = 'hardlink_group'  # path为None，data: ('dev:ino', [路径, ...])
+DUPLICATE_DIRECTORY = 'duplicate_directory'  # path为None，data: (目录摘要, [目录, ...])
+NEAR_DUPLICATE = 'near_duplicate'  # path为None，data: 共享大量内容的文件对（dict）
+SCAN_ERROR = 'error'  # data: 错误信息
+SCAN_CANCELLED = 'cancelled'  # path为None，data: 取消原因；之前的事件构成不完整的结果
+
+
+class ScanEvent:
+    """流式扫描产生的事件"""
+
+    __slots__ = ('type', 'path', 'data')
+
+    def __init__(self, event_type: str, path: Optional[str] = None, data: Any = None):
+        self.type = event_type
+        self.path = path
+        self.data = data
+
+    def __repr__(self):
+        return f"ScanEvent({self.type!r}, {self.path!r}, {self.data!r})"
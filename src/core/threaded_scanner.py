@@ -1,118 +1,190 @@
-import threading
-from queue import Queue, Empty
-import os
+from contextlib import contextmanager
+from queue import Queue
 from concurrent.futures import ThreadPoolExecutor
-import multiprocessing
+
+from src.config.settings import SCAN_CONFIG
+from src.utils.cancellation import CancellationToken, OperationCancelled
+from src.utils.hash_cache import flush_hash_cache
+from .device_io import DeviceScheduler, physical_order_map
+
+# 队列结束标记，每个工作线程收到一个后退出
+_SENTINEL = None
 
 class ThreadedScanner:
     def __init__(self, scanner, max_workers=None):
         self.scanner = scanner
-        self.max_workers = max_workers or multiprocessing.cpu_count()
-        self.file_queue = Queue()
-        self.results_queue = Queue()
-        self.stop_event = threading.Event()
-    
-    def scan_directory(self, directory):
-        """多线程扫描目录"""
-        # 确保停止事件是重置的
-        self.stop_event.clear()
-        self.file_queue = Queue()
-        self.results_queue = Queue()
-        
+        self.max_workers = max_workers or SCAN_CONFIG['max_workers']
+        # 有界队列：工作线程跟不上时遍历线程阻塞，内存占用有上限
+        self.queue_size = SCAN_CONFIG.get('queue_size', 4096)
+        # 哈希读取按设备分配线程池，避免多块磁盘共用同一并发数
+        self.device_scheduling = SCAN_CONFIG.get('device_scheduling', True)
+        # 机械硬盘上按物理位置顺序读取待哈希的文件
+        self.physical_read_order = SCAN_CONFIG.get('physical_read_order', True)
+        self.io_profiles = []
+        self.large_file_threshold = 100 * 1024 * 1024  # 100MB
+        self.file_queue = Queue(maxsize=self.queue_size)
+        # 当前扫描的取消令牌，与扫描器共用，哈希读取也会检查
+        self.cancel_token = CancellationToken()
+
+    def cancel(self, reason='cancelled'):
+        """取消正在进行的扫描，扫描返回已得到的部分结果"""
+        self.cancel_token.cancel(reason)
+
+    def scan_directory(self, directory, incremental=False, resume=False, cancel=None):
+        """多线程扫描目录，incremental=True 时只重新列出有变化的目录
+
+        resume=True 时改用流式扫描，从检查点继续。被取消时返回已得到的部分结果，
+        results['complete'] 为False。
+        """
+        if resume:
+            results = self.scanner.new_results()
+            for event in self.iter_scan(directory, resume=True, cancel=cancel):
+                self.scanner.collect_event(results, event)
+            return results
+
+        # 每次扫描使用新的取消令牌
+        self.cancel_token = cancel = cancel or CancellationToken()
+        self.scanner.cancel_token = cancel
+        self.file_queue = Queue(maxsize=self.queue_size)
+        self.finder = self.scanner.new_duplicate_finder()
+        self.walker = self.scanner.get_walker(incremental)
+
         # 初始化结果字典
-        results = {
-            'duplicates': {},
-            'garbage': [],
+        results = self.scanner.new_results()
+
+        def on_error(path, error):
+            results['errors'].append({'path': path, 'error': str(error)})
+
+        # 创建线程池，节流模式下整个扫描期间采样系统负载
+        try:
+            with self.scanner.throttled(), \
+                    ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="scanner_") as executor:
+                self._scan_with_threads(executor, directory, results, on_error)
+                cancel.raise_if_cancelled()
+
+                # 分级检测重复文件，哈希计算按设备调度或复用同一个线程池
+                with self._io_map(executor) as io_map:
+                    io_map = self.scanner.throttled_map(io_map)
+                    # 逐组合并，取消时保留已确认的分组
+                    for file_hash, files in self.finder.iter_duplicates(io_map, on_error):
+                        results['duplicates'][file_hash] = files
+                    results['hardlinks'] = self.finder.link_groups()
+                    results['duplicate_directories'] = self.scanner.find_duplicate_directories(
+                        self.finder.paths(), results['duplicates'], results['hardlinks']
+                    )
+                    results['near_duplicates'] = self.scanner.find_near_duplicates(
+                        [info['path'] for info in results['large_files']], results['duplicates'],
+                        results['hardlinks'], io_map, on_error
+                    )
+        except OperationCancelled:
+            results['complete'] = False
+        finally:
+            flush_hash_cache()
+            if self.scanner.cancel_token is cancel:
+                self.scanner.cancel_token = None
+
+        return results
+
+    def iter_scan(self, directory, incremental=False, resume=False, cancel=None):
+        """流式扫描，事件与FileScanner.iter_scan一致，重复检测的哈希在线程池中并行计算
+
+        取消后扫描器产出 SCAN_CANCELLED 并结束。
+        """
+        self.cancel_token = cancel = cancel or CancellationToken()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="scanner_") as executor:
+            with self._io_map(executor) as io_map:
+                yield from self.scanner.iter_scan(directory, map_func=io_map,
+                                                  incremental=incremental, resume=resume,
+                                                  cancel=cancel)
+
+    @contextmanager
+    def _io_map(self, executor):
+        """返回哈希计算使用的map函数，按设备调度时结束后记录各设备的参数"""
+        if not self.device_scheduling:
+            yield physical_order_map(executor.map) if self.physical_read_order else executor.map
+            return
+        scheduler = DeviceScheduler(
+            self.max_workers,
+            SCAN_CONFIG.get('device_profiles'),
+            adaptive=SCAN_CONFIG.get('device_adaptive', True),
+            physical_order=self.physical_read_order
+        )
+        try:
+            yield scheduler.map
+        finally:
+            self.io_profiles = [pool.profile for pool in scheduler.pools.values()]
+            scheduler.shutdown()
+
+    def _scan_with_threads(self, executor, directory, results, on_error):
+        """当前线程遍历目录作为生产者，线程池中的工作线程消费队列"""
+        # 提交文件处理任务
+        process_futures = []
+        for i in range(self.max_workers):
+            future = executor.submit(self._process_files)
+            process_futures.append(future)
+
+        try:
+            self._find_files(directory, on_error)
+        finally:
+            # 遍历结束（或被停止）后为每个工作线程放入一个结束标记
+            for _ in process_futures:
+                self.file_queue.put(_SENTINEL)
+
+        # 每个工作线程的局部结果在结束时合并一次
+        for future in process_futures:
+            local = future.result()
+            for category, files in local['classified_files'].items():
+                results['classified_files'][category].extend(files)
+            results['large_files'].extend(local['large_files'])
+            results['errors'].extend(local['errors'])
+
+    def _walk(self, directory, on_error):
+        """遍历目录，取消后停止产出，已产出的文件照常合并到结果"""
+        cancel = self.cancel_token
+        try:
+            for entry in self.walker.walk(directory, on_error=on_error, cancel=cancel):
+                cancel.raise_if_cancelled()
+                yield entry
+        except OperationCancelled:
+            return
+
+    def _find_files(self, directory, on_error):
+        """遍历目录并将文件记录添加到队列，队列满时阻塞"""
+        for entry in self._walk(directory, on_error):
+            self._throttle_stat()
+            # 遍历线程是唯一的生产者，可以直接登记重复文件候选
+            self.finder.add(entry.path, entry.size, entry.stat)
+            self.file_queue.put(entry)
+
+    def _throttle_stat(self):
+        if self.scanner.throttle is not None:
+            self.scanner.throttle.stat()
+
+    def _process_files(self):
+        """处理文件队列中的文件，直到收到结束标记，返回线程局部结果"""
+        local = {
             'classified_files': {k: [] for k in self.scanner.file_types.keys()},
             'large_files': [],
-            'old_files': []
+            'errors': []
         }
-        
-        # 创建线程池
-        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="scanner_") as executor:
-            # 提交文件搜索任务
-            search_future = executor.submit(self._find_files, directory)
-            
-            # 提交文件处理任务
-            process_futures = []
-            for i in range(self.max_workers):
-                future = executor.submit(self._process_files)
-                process_futures.append(future)
-            
-            # 等待文件搜索完成
-            search_future.result()
-            
-            # 发送停止信号
-            self.stop_event.set()
-            
-            # 等待所有处理任务完成
-            for future in process_futures:
-                future.result()
-            
-            # 收集结果
-            while not self.results_queue.empty():
-                try:
-                    result_type, result_data = self.results_queue.get()
-                    if result_type == 'duplicate':
-                        file_hash, file_path = result_data
-                        if file_hash not in results['duplicates']:
-                            results['duplicates'][file_hash] = []
-                        results['duplicates'][file_hash].append(file_path)
-                    elif result_type == 'classified_files':
-                        category, file_path = result_data
-                        results['classified_files'][category].append(file_path)
-                    else:
-                        results[result_type].append(result_data)
-                except Exception as e:
-                    print(f"Error processing result: {e}")
-        
-        return results
-    
-    def _find_files(self, directory):
-        """遍历目录并将文件添加到队列"""
-        for root, _, files in os.walk(directory):
-            for filename in files:
-                if self.stop_event.is_set():
-                    return
-                file_path = os.path.join(root, filename)
-                self.file_queue.put(file_path)
-    
-    def _process_files(self):
-        """处理文件队列中的文件"""
-        while not self.stop_event.is_set() or not self.file_queue.empty():
+        while True:
+            entry = self.file_queue.get()
+            if entry is _SENTINEL:
+                return local
+            # 已取消时只消费队列，不再处理
+            if self.cancel_token.cancelled:
+                continue
+
             try:
-                # 如果停止事件已设置，立即退出
-                if self.stop_event.is_set():
-                    print(f"Thread {threading.current_thread().name} stopping due to stop event")
-                    return
-                    
-                try:
-                    # 使用非阻塞方式获取队列中的文件，设置超时为0.1秒
-                    file_path = self.file_queue.get(block=True, timeout=0.1)
-                except Empty:
-                    # 如果队列为空并且停止标志已设置，则退出
-                    if self.stop_event.is_set():
-                        return
-                    continue
-                    
-                try:
-                    # 获取文件哈希值
-                    file_hash = self.scanner.get_file_hash(file_path)
-                    self.results_queue.put(('duplicate', (file_hash, file_path)))
-                    
-                    # 检查文件类型
-                    file_extension = os.path.splitext(file_path)[1].lower()
-                    for category, extensions in self.scanner.file_types.items():
-                        if file_extension in extensions:
-                            self.results_queue.put(('classified_files', (category, file_path)))
-                            break
-                    
-                    # 检查文件大小
-                    file_size = os.path.getsize(file_path)
-                    if file_size > 100 * 1024 * 1024:  # 100MB
-                        self.results_queue.put(('large_files', {'path': file_path, 'size': file_size}))
-                    
-                except Exception as e:
-                    print(f"Error processing file {file_path}: {str(e)}")
+                # 检查文件类型
+                category = self.scanner.get_category(entry.extension)
+                if category is not None:
+                    local['classified_files'][category].append(entry.path)
+
+                # 检查文件大小，直接使用遍历时的stat结果
+                if entry.size > self.large_file_threshold:
+                    local['large_files'].append({'path': entry.path, 'size': entry.size})
+
             except Exception as e:
-                print(f"Error processing file: {str(e)}")
\ No newline at end of file
+                print(f"Error processing file {entry.path}: {str(e)}")
+                local['errors'].append({'path': entry.path, 'error': str(e)})
@@ -0,0 +1,292 @@
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+import platform
+import threading
+from contextlib import contextmanager
+from typing import Callable, Optional, Tuple
+
+import psutil
+
+# ioprio_set / ioprio_get 的系统调用号
+_IOPRIO_SYSCALLS = {
+    'x86_64': (251, 252),
+    'amd64': (251, 252),
+    'i386': (289, 290),
+    'i686': (289, 290),
+    'aarch64': (30, 31),
+    'arm64': (30, 31),
+    'riscv64': (30, 31),
+    'armv7l': (314, 315),
+    'ppc64le': (273, 274),
+    's390x': (282, 283),
+}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_CLASS_IDLE = 3
+
+_libc = None
+
+
+def _ioprio_syscall(index: int, *args: int) -> Optional[int]:
+    """调用ioprio_set(index=0)或ioprio_get(index=1)，平台不支持时返回None"""
+    global _libc
+    numbers = _IOPRIO_SYSCALLS.get(platform.machine().lower())
+    if not sys.platform.startswith('linux') or numbers is None:
+        return None
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    result = _libc.syscall(numbers[index], *(ctypes.c_int(arg) for arg in args))
+    if result < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return result
+
+
+def get_io_priority() -> Optional[int]:
+    """返回调用线程的ioprio值，不支持时返回None"""
+    try:
+        # who=0 表示调用线程
+        return _ioprio_syscall(1, IOPRIO_WHO_PROCESS, 0)
+    except OSError:
+        return None
+
+
+def set_io_priority(value: int) -> bool:
+    """设置调用线程的ioprio值，成功时返回True"""
+    try:
+        return _ioprio_syscall(0, IOPRIO_WHO_PROCESS, 0, value) is not None
+    except OSError:
+        return False
+
+
+def set_idle_io_priority() -> bool:
+    """把调用线程设为idle I/O调度类，只在磁盘空闲时得到服务"""
+    return set_io_priority(IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT)
+
+
+@contextmanager
+def idle_io_priority():
+    """with块内调用线程使用idle I/O优先级，结束后恢复原值"""
+    previous = get_io_priority()
+    changed = previous is not None and set_idle_io_priority()
+    try:
+        yield changed
+    finally:
+        if changed:
+            set_io_priority(previous)
+
+
+class TokenBucket:
+    """线程安全的令牌桶
+
+    rate 为每秒补充的令牌数，burst 为桶容量。超过剩余令牌的请求先透支，
+    调用方按欠下的令牌数等待，并发的请求按到达顺序排队。
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self.tokens = self.burst
+        self._clock = clock
+        self._sleep = sleep
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: float = 1) -> float:
+        """取出amount个令牌，不足时阻塞，返回等待的秒数"""
+        with self._lock:
+            now = self._clock()
+            self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+            self._last = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+class ResourceGovernor:
+    """按系统负载自适应调整并发数
+
+    后台线程定期采样CPU、内存使用率和最繁忙磁盘的繁忙度，任一超过上限时
+    并发数减半，否则每次加一（AIMD）。任务通过 slot() 取得执行名额。
+    """
+
+    def __init__(self, max_workers: int, max_cpu: float = 0.9, max_memory: float = 0.75,
+                 max_disk_busy: float = 0.8, interval: float = 1.0,
+                 sample_func: Optional[Callable[[], Tuple[float, float, float]]] = None):
+        self.max_workers = max(1, max_workers)
+        self.limit = self.max_workers
+        self.max_cpu = max_cpu
+        self.max_memory = max_memory
+        self.max_disk_busy = max_disk_busy
+        self.interval = interval
+        self._sample = sample_func or self._sample_system
+        self._active = 0
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._disk_busy = None
+
+    def _sample_system(self) -> Tuple[float, float, float]:
+        """返回 (CPU使用率, 内存使用率, 磁盘繁忙度)，均为0~1"""
+        cpu = psutil.cpu_percent(interval=None) / 100
+        memory = psutil.virtual_memory().percent / 100
+        now = time.monotonic()
+        busy = {}
+        try:
+            for name, counters in (psutil.disk_io_counters(perdisk=True) or {}).items():
+                # busy_time只在Linux等平台提供，其他平台用读写耗时近似
+                busy[name] = getattr(counters, 'busy_time',
+                                     counters.read_time + counters.write_time)
+        except (OSError, RuntimeError):
+            pass
+        disk = 0.0
+        if self._disk_busy is not None:
+            then, previous = self._disk_busy
+            elapsed_ms = max((now - then) * 1000, 1)
+            for name, value in busy.items():
+                if name in previous:
+                    disk = max(disk, (value - previous[name]) / elapsed_ms)
+        self._disk_busy = (now, busy)
+        return cpu, memory, min(disk, 1.0)
+
+    def adjust(self) -> int:
+        """采样一次并调整并发数"""
+        cpu, memory, disk = self._sample()
+        with self._cond:
+            if cpu > self.max_cpu or memory > self.max_memory or disk > self.max_disk_busy:
+                self.limit = max(1, self.limit // 2)
+            else:
+                self.limit = min(self.max_workers, self.limit + 1)
+            self._cond.notify_all()
+            return self.limit
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.adjust()
+            except Exception as e:
+                print(f"Error sampling system load: {str(e)}")
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            # 第一次采样只建立CPU和磁盘计数的基线
+            self._sample()
+            self._thread = threading.Thread(target=self._run, name="resource_governor",
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+
+    @contextmanager
+    def slot(self):
+        """取得一个执行名额，并发数达到上限时等待"""
+        with self._cond:
+            while self._active >= self.limit:
+                self._cond.wait()
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify()
+
+
+class ScanThrottle:
+    """节流扫描的限制条件
+
+    限制每秒读取的字节数和stat的文件数，按系统负载调整哈希并发数，
+    并可把扫描线程设为idle I/O优先级，避免影响同一主机上的业务I/O。
+    """
+
+    def __init__(self, read_rate: Optional[float] = None, stat_rate: Optional[float] = None,
+                 max_workers: int = 1, adaptive: bool = True, idle_io: bool = True,
+                 chunk_size: Optional[int] = None, governor_options: Optional[dict] = None):
+        self.read_bucket = TokenBucket(read_rate) if read_rate else None
+        self.stat_bucket = TokenBucket(stat_rate) if stat_rate else None
+        self.governor = ResourceGovernor(max_workers, **(governor_options or {})) if adaptive else None
+        self.idle_io = idle_io
+        # 读取按块消耗令牌，块越小速率越平滑
+        self.chunk_size = chunk_size
+        self._local = threading.local()
+        self._running = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, scan_config, performance_config, max_workers: int) -> 'ScanThrottle':
+        """根据 SCAN_CONFIG 和 PERFORMANCE_CONFIG 创建"""
+        return cls(
+            scan_config.get('throttle_read_bytes_per_sec'),
+            scan_config.get('throttle_stat_per_sec'),
+            max_workers,
+            adaptive=scan_config.get('throttle_adaptive_workers', True),
+            idle_io=scan_config.get('throttle_idle_io_priority', True),
+            chunk_size=performance_config.get('io_buffer_size'),
+            governor_options={
+                'max_cpu': performance_config.get('max_cpu_usage', 0.9),
+                'max_memory': performance_config.get('max_memory_usage', 0.75),
+                'max_disk_busy': scan_config.get('throttle_max_disk_busy', 0.8),
+                'interval': scan_config.get('throttle_sample_interval', 1.0),
+            }
+        )
+
+    def read(self, nbytes: int):
+        """读取nbytes字节之前调用"""
+        if self.read_bucket is not None:
+            self.read_bucket.consume(nbytes)
+
+    def stat(self, count: int = 1):
+        """stat文件之后调用"""
+        if self.stat_bucket is not None:
+            self.stat_bucket.consume(count)
+
+    @contextmanager
+    def running(self):
+        """扫描期间运行负载采样，调用线程使用idle I/O优先级，可嵌套"""
+        with self._lock:
+            self._running += 1
+            if self._running == 1 and self.governor is not None:
+                self.governor.start()
+        try:
+            if self.idle_io:
+                with idle_io_priority():
+                    yield self
+            else:
+                yield self
+        finally:
+            with self._lock:
+                self._running -= 1
+                if self._running == 0 and self.governor is not None:
+                    self.governor.stop()
+
+    def _enter_worker(self):
+        """工作线程第一次执行任务时设置idle I/O优先级"""
+        if self.idle_io and not getattr(self._local, 'idle', False):
+            self._local.idle = True
+            set_idle_io_priority()
+
+    def wrap_map(self, map_func: Callable = map) -> Callable:
+        """包装map函数，每个任务都受并发上限和I/O优先级约束"""
+        def run(fn, item):
+            self._enter_worker()
+            if self.governor is None:
+                return fn(item)
+            with self.governor.slot():
+                return fn(item)
+
+        def mapper(fn, items):
+            return map_func(lambda item: run(fn, item), items)
+        return mapper
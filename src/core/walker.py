@@ -0,0 +1,379 @@
+import os
+import threading
+from collections import deque
+from queue import Queue, Empty, Full
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from src.utils.cancellation import CancellationToken, OperationCancelled
+
+
+class FileEntry:
+    """单个文件的元数据记录，整个扫描过程只stat一次"""
+
+    __slots__ = ('path', 'name', 'stat')
+
+    def __init__(self, path: str, name: str, stat_result: os.stat_result):
+        self.path = path
+        self.name = name
+        self.stat = stat_result
+
+    @property
+    def size(self) -> int:
+        return self.stat.st_size
+
+    @property
+    def mtime(self) -> float:
+        return self.stat.st_mtime
+
+    @property
+    def extension(self) -> str:
+        return os.path.splitext(self.name)[1].lower()
+
+    def __repr__(self):
+        return f"FileEntry({self.path!r}, size={self.size})"
+
+
+def list_directory(path: str, follow_symlinks: bool = False, file_filter=None,
+                   cancel: Optional[CancellationToken] = None
+                   ) -> Tuple[List[FileEntry], List[str], List[Tuple[str, OSError]]]:
+    """列出单个目录，返回 (文件记录, 子目录, 错误)
+
+    file_filter 排除的子目录不会返回，排除的文件在stat之前按名称跳过。
+    cancel 在每个目录项之前检查，取消时抛出 OperationCancelled。
+    """
+    files = []
+    subdirs = []
+    errors = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                try:
+                    # 符号链接目录只在follow_symlinks时进入，与os.walk一致
+                    if entry.is_dir(follow_symlinks=follow_symlinks):
+                        if file_filter is None or file_filter.allow_directory(entry.path, entry.name):
+                            subdirs.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                    if file_filter is not None and not file_filter.allow_name(entry.path, entry.name):
+                        continue
+                    stat_result = entry.stat()
+                except OSError as e:
+                    errors.append((entry.path, e))
+                    continue
+                if file_filter is not None and not file_filter.allow_stat(stat_result):
+                    continue
+                files.append(FileEntry(entry.path, entry.name, stat_result))
+    except OSError as e:
+        errors.append((path, e))
+    return files, subdirs, errors
+
+
+def directory_key(path: str) -> Optional[Tuple[int, int]]:
+    """目录的 (st_dev, st_ino)，跟随符号链接；无法stat时返回None"""
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+    return stat_result.st_dev, stat_result.st_ino
+
+
+def first_visit(visited: set, path: str) -> bool:
+    """跟随符号链接时记录进入的目录，已进入过时返回False
+
+    符号链接环和指向同一目录的多个链接因此只遍历一次。无法stat的目录返回True，
+    交给列出时报告错误。
+    """
+    key = directory_key(path)
+    if key is None:
+        return True
+    if key in visited:
+        return False
+    visited.add(key)
+    return True
+
+
+class DirectoryWalker:
+    """基于os.scandir的目录遍历器，复用DirEntry缓存的stat结果"""
+
+    def __init__(self, follow_symlinks: bool = False, file_filter=None):
+        self.follow_symlinks = follow_symlinks
+        self.file_filter = file_filter
+
+    def walk(self, directory: str,
+             on_error: Optional[Callable[[str, OSError], None]] = None,
+             cancel: Optional[CancellationToken] = None) -> Iterator[FileEntry]:
+        """深度优先遍历目录，逐个产出FileEntry，取消时抛出 OperationCancelled"""
+        stack = [directory]
+        visited = set() if self.follow_symlinks else None
+        while stack:
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            current = stack.pop()
+            if visited is not None and not first_visit(visited, current):
+                continue
+            files, subdirs, errors = list_directory(current, self.follow_symlinks, self.file_filter,
+                                                    cancel)
+            for path, error in errors:
+                self._report(on_error, path, error)
+            yield from files
+            # 逆序入栈，保证子目录按列出顺序被访问
+            stack.extend(reversed(subdirs))
+
+    @staticmethod
+    def _report(on_error, path, error):
+        if on_error is not None:
+            on_error(path, error)
+
+
+class _WalkState:
+    """一次并行遍历的共享状态"""
+
+    def __init__(self, workers: int, output_size: int):
+        self.deques = [deque() for _ in range(workers)]
+        # 保护pending计数、空闲等待和确定性模式下的列出结果
+        self.cond = threading.Condition()
+        # 已入队但尚未列完的目录数，降为0时遍历结束
+        self.pending = 0
+        self.stopped = False
+        self.output = Queue(maxsize=output_size)
+        # 确定性模式下按目录路径存放等待重放的列出结果，以及重放方正在等待的目录
+        self.listings = {}
+        self.wanted = None
+        # 跟随符号链接时已进入目录的 (st_dev, st_ino)：确定性模式下由重放方按深度优先
+        # 顺序记录，否则由工作线程记录
+        self.visited = set()
+        # 确定性模式下跟随符号链接时，排队目录的上级目录链 (key, 上级链)
+        self.chains = {}
+
+
+_DONE = object()
+
+
+class ParallelWalker(DirectoryWalker):
+    """多线程工作窃取式目录遍历器
+
+    每个线程优先从自己的双端队列尾部取目录（深度优先），自己的队列为空时
+    从其他线程队列的头部窃取（较浅、子树较大的目录）。列出目录得到的子目录
+    推回自己的队列。deterministic=True 时产出顺序与 DirectoryWalker 完全一致，
+    否则按目录列完的顺序产出，首个结果更早到达。
+    两种模式下等待调用方取走的目录列出结果都以 output_size 为上限：确定性模式下
+    达到上限后工作线程只列出重放方正在等待的目录，内存占用不随目录树增长。
+    跟随符号链接时每个目录只进入一次。确定性模式下由重放方按深度优先顺序判断，
+    结果与 DirectoryWalker 一致；工作线程跳过重放方已进入的目录和与上级目录相同的
+    目录（符号链接环），预先列出的其余重复目录在重放时丢弃。
+    """
+
+    def __init__(self, max_workers: int = 4, follow_symlinks: bool = False,
+                 deterministic: bool = False, output_size: int = 1024, file_filter=None):
+        super().__init__(follow_symlinks, file_filter)
+        self.max_workers = max(1, max_workers)
+        self.deterministic = deterministic
+        self.output_size = output_size
+
+    def walk(self, directory: str,
+             on_error: Optional[Callable[[str, OSError], None]] = None,
+             cancel: Optional[CancellationToken] = None) -> Iterator[FileEntry]:
+        """并行遍历目录，错误回调和结果产出都在调用方线程执行
+
+        取消后工作线程停止列出目录，调用方线程抛出 OperationCancelled。
+        """
+        state = _WalkState(self.max_workers, self.output_size)
+        state.deques[0].append(directory)
+        state.pending = 1
+        threads = [
+            threading.Thread(target=self._worker, args=(i, state, cancel),
+                             name=f"walker_{i}", daemon=True)
+            for i in range(self.max_workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            if self.deterministic:
+                yield from self._replay_in_order(directory, state, on_error, cancel)
+            else:
+                yield from self._drain_output(state, on_error, cancel)
+        finally:
+            # 调用方提前结束迭代时通知工作线程退出
+            with state.cond:
+                state.stopped = True
+                state.cond.notify_all()
+            for thread in threads:
+                thread.join()
+
+    def _drain_output(self, state, on_error, cancel):
+        """按目录列完的顺序产出结果"""
+        while True:
+            if cancel is None:
+                item = state.output.get()
+            else:
+                # 工作线程取消后不再产出，定期检查令牌而不是一直等待
+                try:
+                    item = state.output.get(timeout=0.1)
+                except Empty:
+                    cancel.raise_if_cancelled()
+                    continue
+            if item is _DONE:
+                return
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            _, files, _, errors = item
+            for path, error in errors:
+                self._report(on_error, path, error)
+            yield from files
+
+    def _replay_in_order(self, directory, state, on_error, cancel):
+        """按顺序深度优先的访问次序重放各目录的列出结果
+
+        已进入过的目录的整个子树只取出列出结果而不产出，不留在缓冲中。
+        """
+        stack = [(directory, False)]
+        while stack:
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            current, skipped = stack.pop()
+            with state.cond:
+                # 通知因结果达到上限而等待的工作线程列出该目录
+                state.wanted = current
+                state.cond.notify_all()
+                while current not in state.listings:
+                    if cancel is None:
+                        state.cond.wait()
+                    else:
+                        state.cond.wait(0.1)
+                        cancel.raise_if_cancelled()
+                files, subdirs, errors = state.listings.pop(current)
+                if self.follow_symlinks and not skipped:
+                    skipped = not first_visit(state.visited, current)
+            if not skipped:
+                for path, error in errors:
+                    self._report(on_error, path, error)
+                yield from files
+            stack.extend((subdir, skipped) for subdir in reversed(subdirs))
+
+    def _take(self, index, state):
+        """从自己的队列尾部取目录，否则从其他队列头部窃取"""
+        if self._throttled(state):
+            return self._take_wanted(state)
+        own = state.deques[index]
+        try:
+            return own.pop()
+        except IndexError:
+            pass
+        count = len(state.deques)
+        for offset in range(1, count):
+            try:
+                return state.deques[(index + offset) % count].popleft()
+            except IndexError:
+                continue
+        return None
+
+    def _throttled(self, state):
+        """确定性模式下等待重放的结果是否已达到上限"""
+        return self.deterministic and len(state.listings) >= self.output_size
+
+    @staticmethod
+    def _take_wanted(state):
+        """从队列中取出重放方正在等待的目录，它不在任何队列中时返回None"""
+        with state.cond:
+            for queued in state.deques:
+                try:
+                    queued.remove(state.wanted)
+                except ValueError:
+                    continue
+                return state.wanted
+        return None
+
+    def _worker(self, index, state, cancel):
+        own = state.deques[index]
+        while not state.stopped:
+            path = self._take(index, state)
+            if path is None:
+                with state.cond:
+                    # 持锁再次检查，避免错过入队通知
+                    if state.stopped or state.pending == 0:
+                        return
+                    if not any(state.deques) or (
+                            self._throttled(state)
+                            and not any(state.wanted in queued for queued in state.deques)):
+                        state.cond.wait()
+                continue
+
+            enter, chain = True, None
+            if self.follow_symlinks:
+                enter, chain = self._enter(state, path)
+            try:
+                if enter:
+                    files, subdirs, errors = list_directory(path, self.follow_symlinks,
+                                                            self.file_filter, cancel)
+                else:
+                    files, subdirs, errors = [], [], []
+            except OperationCancelled:
+                # 调用方线程检查到取消后结束遍历并通知其他工作线程
+                return
+            if subdirs:
+                with state.cond:
+                    own.extend(subdirs)
+                    if chain is not None:
+                        state.chains.update((subdir, chain) for subdir in subdirs)
+                    state.pending += len(subdirs)
+                    state.cond.notify_all()
+            self._emit(state, (path, files, subdirs, errors))
+
+            with state.cond:
+                state.pending -= 1
+                finished = state.pending == 0
+                if finished:
+                    state.cond.notify_all()
+            if finished and not self.deterministic:
+                self._put(state, _DONE)
+
+    def _enter(self, state, path):
+        """跟随符号链接时判断工作线程是否列出目录，返回 (是否列出, 子目录的上级目录链)"""
+        key = directory_key(path)
+        with state.cond:
+            if not self.deterministic:
+                if key is None:
+                    return True, None
+                if key in state.visited:
+                    return False, None
+                state.visited.add(key)
+                return True, None
+            chain = state.chains.pop(path, None)
+            if key is None:
+                return True, chain
+            ancestor = chain
+            while ancestor is not None:
+                if ancestor[0] == key:
+                    return False, None
+                ancestor = ancestor[1]
+            return key not in state.visited, (key, chain)
+
+    def _emit(self, state, listing):
+        if self.deterministic:
+            with state.cond:
+                state.listings[listing[0]] = listing[1:]
+                state.cond.notify_all()
+        else:
+            self._put(state, listing)
+
+    @staticmethod
+    def _put(state, item):
+        """带背压地放入输出队列，遍历被停止时放弃"""
+        while not state.stopped:
+            try:
+                state.output.put(item, timeout=0.1)
+                return
+            except Full:
+                continue
+
+
+def create_walker(max_workers: int = 1, follow_symlinks: bool = False,
+                  deterministic: bool = True, file_filter=None) -> DirectoryWalker:
+    """根据线程数创建顺序或并行遍历器"""
+    if max_workers and max_workers > 1:
+        return ParallelWalker(max_workers, follow_symlinks, deterministic, file_filter=file_filter)
+    return DirectoryWalker(follow_symlinks, file_filter)
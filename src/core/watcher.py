@@ -0,0 +1,420 @@
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import stat as stat_module
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from src.config.settings import SCAN_CONFIG
+from .walker import FileEntry, directory_key, list_directory
+
+# inotify事件标志，见 <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+_EVENT_HEADER = struct.Struct('iIII')
+_READ_SIZE = 64 * 1024
+
+
+class Inotify:
+    """通过ctypes调用libc的inotify接口"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "inotify is not available on this platform")
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            self._raise_errno()
+
+    def _raise_errno(self, path=None):
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err), path)
+
+    def add_watch(self, path: str, mask: int = WATCH_MASK) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), ctypes.c_uint32(mask))
+        if wd < 0:
+            self._raise_errno(path)
+        return wd
+
+    def rm_watch(self, wd: int):
+        # 目录已删除时内核已自动移除监视，忽略错误
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, timeout: float):
+        """等待最多timeout秒，返回 (wd, mask, name) 列表"""
+        ready, _, _ = select.select([self.fd], [], [], max(timeout, 0))
+        if not ready:
+            return []
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, _READ_SIZE)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + name_len].rstrip(b'\0'))
+                offset += name_len
+                events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class LiveScanner:
+    """基于inotify的实时扫描
+
+    start() 完成一次完整扫描并监视所有目录，之后 poll() 读取事件：同一路径的
+    多个事件合并，在 debounce 秒内没有新事件后统一应用，只重新stat受影响的
+    文件、重新列出受影响的目录，并只对大小分组发生变化的文件重新做重复检测。
+    事件队列溢出（IN_Q_OVERFLOW）时，重新列出修改时间变化的目录并重新stat
+    其余已知文件。results() 使用 FileScanner 的逐文件处理生成结果，内容与
+    完整扫描一致。
+    """
+
+    def __init__(self, scanner, roots: Iterable[str], debounce: Optional[float] = None,
+                 max_delay: Optional[float] = None):
+        self.scanner = scanner
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.debounce = debounce if debounce is not None else SCAN_CONFIG.get('watch_debounce', 0.5)
+        # 事件持续不断时，最迟在max_delay秒后应用
+        self.max_delay = max_delay if max_delay is not None else self.debounce * 10
+        self.inotify = None
+
+        self.entries: Dict[str, FileEntry] = {}
+        self.errors: Dict[str, str] = {}
+        self.dir_files: Dict[str, set] = {}
+        self.dir_subdirs: Dict[str, set] = {}
+        self.dir_mtimes: Dict[str, int] = {}
+        self.size_index = defaultdict(set)
+        self.groups_by_size: Dict[int, Dict[str, List[str]]] = {}
+        self.links_by_size: Dict[int, Dict[str, List[str]]] = {}
+        self._wd_dirs: Dict[int, str] = {}
+        self._dir_wds: Dict[str, int] = {}
+
+        self._pending_dirs = set()
+        self._pending_files = set()
+        self._overflow = False
+        self._pending_since = None
+        self._last_event = 0.0
+
+    def start(self):
+        """创建inotify实例，完整扫描并监视所有根目录"""
+        self.inotify = Inotify()
+        affected = set()
+        for root in self.roots:
+            if not os.path.exists(root):
+                raise FileNotFoundError(f"Directory not found: {root}")
+            self._add_tree(root, affected)
+        self._regroup(affected)
+        return self
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def results(self, now: Optional[float] = None):
+        """返回与 FileScanner.scan_directory 结构相同的结果"""
+        now = time.time() if now is None else now
+        results = self.scanner.new_results()
+        for entry in self.entries.values():
+            self.scanner.process_entry(entry, results, now)
+        for groups in self.groups_by_size.values():
+            results['duplicates'].update(groups)
+        for links in self.links_by_size.values():
+            results['hardlinks'].update(links)
+        results['duplicate_directories'] = self.scanner.find_duplicate_directories(
+            self.entries.keys(), results['duplicates'], results['hardlinks']
+        )
+        results['errors'] = [{'path': path, 'error': error} for path, error in self.errors.items()]
+        results['near_duplicates'] = self.scanner.find_near_duplicates(
+            [info['path'] for info in results['large_files']], results['duplicates'],
+            results['hardlinks'],
+            on_error=lambda path, error: results['errors'].append({'path': path, 'error': str(error)})
+        )
+        return results
+
+    def run(self, stop_event, on_update=None, interval: float = 0.5):
+        """持续处理事件直到stop_event被设置，每次更新后回调on_update(results)"""
+        while not stop_event.is_set():
+            if self.poll(interval) and on_update is not None:
+                on_update(self.results())
+
+    def poll(self, timeout: float = 0.0) -> bool:
+        """读取最多timeout秒的事件，累积的变化被应用时返回True"""
+        end = time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            if self._pending_since is not None and (
+                    now - self._last_event >= self.debounce or
+                    now - self._pending_since >= self.max_delay):
+                self.apply_pending()
+                return True
+            if now >= end:
+                return False
+            wait = end - now
+            if self._pending_since is not None:
+                wait = min(wait, self._last_event + self.debounce - now)
+            for wd, mask, name in self.inotify.read_events(wait):
+                self._dispatch(wd, mask, name)
+
+    def _dispatch(self, wd: int, mask: int, name: str):
+        """把单个事件合并到待处理集合"""
+        now = time.monotonic()
+        self._last_event = now
+        if self._pending_since is None:
+            self._pending_since = now
+
+        if mask & IN_Q_OVERFLOW:
+            self._overflow = True
+            return
+        if mask & IN_IGNORED:
+            directory = self._wd_dirs.pop(wd, None)
+            if directory is not None and self._dir_wds.get(directory) == wd:
+                del self._dir_wds[directory]
+            return
+        directory = self._wd_dirs.get(wd)
+        if directory is None:
+            return
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_ISDIR) or not name:
+            # 目录自身的变化以及子目录的增删和移动，都通过重新列出该目录处理
+            self._pending_dirs.add(directory)
+        else:
+            self._pending_files.add(os.path.join(directory, name))
+
+    def apply_pending(self):
+        """应用累积的变化"""
+        affected = set()
+        if self._overflow:
+            for root in self.roots:
+                self._resync(root, affected)
+        # 先处理上层目录，子树被删除时其下的待处理目录会被跳过
+        for directory in sorted(self._pending_dirs, key=lambda d: d.count(os.sep)):
+            if directory in self.dir_files:
+                self._sync_directory(directory, affected)
+        for path in self._pending_files:
+            if os.path.dirname(path) in self.dir_files:
+                self._refresh_file(path, affected)
+        self._regroup(affected)
+
+        self._pending_dirs.clear()
+        self._pending_files.clear()
+        self._overflow = False
+        self._pending_since = None
+
+    def _on_error(self, path, error):
+        print(f"Error processing {path}: {str(error)}")
+        self.errors[path] = str(error)
+
+    def _watch(self, directory):
+        try:
+            wd = self.inotify.add_watch(directory)
+        except OSError as e:
+            # 如超出 max_user_watches，该目录只在溢出重扫时更新
+            self._on_error(directory, e)
+            return
+        # 目录被移动时同一inode返回原来的wd，旧路径不再持有它
+        previous = self._wd_dirs.get(wd)
+        if previous is not None and previous != directory:
+            self._dir_wds.pop(previous, None)
+        self._wd_dirs[wd] = directory
+        self._dir_wds[directory] = wd
+
+    def _unwatch(self, directory):
+        wd = self._dir_wds.pop(directory, None)
+        if wd is not None and self._wd_dirs.get(wd) == directory:
+            del self._wd_dirs[wd]
+            self.inotify.rm_watch(wd)
+
+    def _add_tree(self, directory, affected):
+        """监视并列出整个子树，先添加监视再列出以免漏掉期间的变化"""
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            if self.scanner.walker.follow_symlinks and self._repeats_ancestor(current):
+                continue
+            self._watch(current)
+            subdirs = self._sync_directory(current, affected, recurse=False)
+            stack.extend(reversed(subdirs))
+
+    def _repeats_ancestor(self, directory):
+        """目录是否与已监视的某个上级目录相同（指向上级的符号链接环）"""
+        key = directory_key(directory)
+        if key is None:
+            return False
+        current = directory
+        parent = os.path.dirname(current)
+        while parent != current and parent in self.dir_mtimes:
+            if directory_key(parent) == key:
+                return True
+            current, parent = parent, os.path.dirname(parent)
+        return False
+
+    def _drop_tree(self, directory, affected):
+        """移除子树中的所有记录和监视"""
+        prefix = directory + os.sep
+        for current in [d for d in self.dir_files if d == directory or d.startswith(prefix)]:
+            for path in self.dir_files.pop(current):
+                self._drop_file(path, affected)
+            self.dir_subdirs.pop(current, None)
+            self.dir_mtimes.pop(current, None)
+            self.errors.pop(current, None)
+            self._unwatch(current)
+        parent = os.path.dirname(directory)
+        if parent in self.dir_subdirs:
+            self.dir_subdirs[parent].discard(directory)
+
+    def _sync_directory(self, directory, affected, recurse=True):
+        """重新列出单个目录，更新其直接包含的文件和子目录，返回新增的子目录"""
+        try:
+            dir_mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            dir_mtime = None
+        files, subdirs, errors = list_directory(directory, self.scanner.walker.follow_symlinks,
+                                                self.scanner.file_filter)
+        listing_errors = [error for path, error in errors if path == directory]
+        if dir_mtime is None or listing_errors:
+            # 目录已删除、被移走或无法读取
+            self._drop_tree(directory, affected)
+            if dir_mtime is not None:
+                self._on_error(directory, listing_errors[0])
+            return []
+
+        self.errors.pop(directory, None)
+        for path, error in errors:
+            self._on_error(path, error)
+        self.dir_mtimes[directory] = dir_mtime
+        known_files = self.dir_files.setdefault(directory, set())
+        listed = {entry.path for entry in files}
+        for path in known_files - listed:
+            self._drop_file(path, affected)
+        for entry in files:
+            self._put_file(entry, affected)
+
+        known_subdirs = self.dir_subdirs.setdefault(directory, set())
+        for subdir in known_subdirs - set(subdirs):
+            self._drop_tree(subdir, affected)
+        added = [subdir for subdir in subdirs if subdir not in known_subdirs]
+        known_subdirs.update(subdirs)
+        parent = os.path.dirname(directory)
+        if parent in self.dir_subdirs:
+            self.dir_subdirs[parent].add(directory)
+        if recurse:
+            for subdir in added:
+                self._add_tree(subdir, affected)
+        return added
+
+    def _resync(self, root, affected):
+        """事件丢失后的定向重扫：只重新列出修改时间变化的目录，其余文件重新stat"""
+        prefix = root + os.sep
+        for directory in [d for d in self.dir_files if d == root or d.startswith(prefix)]:
+            if directory not in self.dir_files:
+                continue
+            try:
+                changed = os.stat(directory).st_mtime_ns != self.dir_mtimes.get(directory)
+            except OSError:
+                changed = True
+            if changed:
+                self._sync_directory(directory, affected)
+            else:
+                for path in list(self.dir_files[directory]):
+                    self._refresh_file(path, affected)
+
+    def _refresh_file(self, path, affected):
+        """重新stat单个文件"""
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            stat_result = None
+        name = os.path.basename(path)
+        if (stat_result is None or not stat_module.S_ISREG(stat_result.st_mode) or
+                not self.scanner.file_filter.allow_file(path, name, stat_result)):
+            self._drop_file(path, affected)
+            return
+        self._put_file(FileEntry(path, name, stat_result), affected)
+
+    def _put_file(self, entry, affected):
+        old = self.entries.get(entry.path)
+        if old is not None:
+            if _same_file(old.stat, entry.stat):
+                return
+            self._drop_file(entry.path, affected)
+        self.entries[entry.path] = entry
+        self.size_index[entry.size].add(entry.path)
+        self.dir_files.setdefault(os.path.dirname(entry.path), set()).add(entry.path)
+        affected.add(entry.size)
+
+    def _drop_file(self, path, affected):
+        self.errors.pop(path, None)
+        entry = self.entries.pop(path, None)
+        if entry is None:
+            return
+        self.size_index[entry.size].discard(path)
+        if not self.size_index[entry.size]:
+            del self.size_index[entry.size]
+        files = self.dir_files.get(os.path.dirname(path))
+        if files is not None:
+            files.discard(path)
+        affected.add(entry.size)
+
+    def _regroup(self, sizes):
+        """对成员有变化的大小分组重新做分级重复检测"""
+        for size in sizes:
+            self.groups_by_size.pop(size, None)
+            self.links_by_size.pop(size, None)
+            paths = self.size_index.get(size)
+            if not paths:
+                continue
+            # 上次重复检测的哈希错误随本次结果重新生成
+            for path in paths:
+                self.errors.pop(path, None)
+            if len(paths) < 2:
+                continue
+            finder = self.scanner.new_duplicate_finder()
+            for path in sorted(paths):
+                finder.add(path, size, self.entries[path].stat)
+            groups = dict(finder.iter_duplicates(on_error=self._on_error))
+            if groups:
+                self.groups_by_size[size] = groups
+            links = finder.link_groups()
+            if links:
+                self.links_by_size[size] = links
+
+
+def _same_file(old, new) -> bool:
+    # 链接数变化（IN_ATTRIB）会影响硬链接分组
+    return (old.st_ino, old.st_dev, old.st_size, old.st_mtime_ns, old.st_nlink) == \
+        (new.st_ino, new.st_dev, new.st_size, new.st_mtime_ns, new.st_nlink)
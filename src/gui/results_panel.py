@@ -3,6 +3,9 @@ from tkinter import ttk
 import logging
 from typing import Dict, Any
 import json
+import os
+
+from core.dedup import collapse_duplicates
 
 class ResultsPanel:
     def __init__(self, parent, optimizer):
@@ -62,8 +65,20 @@ class ResultsPanel:
         # 获取扫描结果
         results = event.data
         
-        # 添加重复文件
-        for hash_value, duplicates in results.get('duplicates', {}).items():
+        # 添加整体重复的目录
+        duplicate_directories = results.get('duplicate_directories', {})
+        for digest, directories in duplicate_directories.items():
+            for directory in directories:
+                self.tree.insert('', 'end', values=(
+                    'Duplicate Folder',
+                    directory,
+                    '',
+                    'Remove'
+                ))
+
+        # 添加重复文件，已由重复目录覆盖的分组不再逐个列出
+        file_groups = collapse_duplicates(results.get('duplicates', {}), duplicate_directories)
+        for hash_value, duplicates in file_groups.items():
             for file_path in duplicates:
                 self.tree.insert('', 'end', values=(
                     'Duplicate',
@@ -3,7 +3,9 @@ from tkinter import ttk
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List
+
+from core.dedup import reclaimable_bytes
 
 class StatisticsPanel:
     def __init__(self, parent):
@@ -52,10 +54,8 @@ class StatisticsPanel:
         total_files = sum(len(files) for files in results['classified_files'].values())
         duplicate_files = sum(len(files) - 1 for files in results['duplicates'].values())
         total_size = sum(file_info['size'] for file_info in results['large_files'])
-        potential_savings = sum(
-            sum(os.path.getsize(f) for f in files[1:])
-            for files in results['duplicates'].values()
-        )
+        # 按实际占用的磁盘块计算，硬链接不算作可释放空间
+        potential_savings = reclaimable_bytes(results['duplicates'], results.get('hardlinks'))
         
         self.total_files_var.set(str(total_files))
         self.duplicate_files_var.set(str(duplicate_files))
@@ -0,0 +1,54 @@
+import threading
+from typing import Iterable, Optional
+
+
+class OperationCancelled(BaseException):
+    """操作被取消令牌中止
+
+    与 asyncio.CancelledError 一样继承 BaseException，不会被各处的
+    except Exception 当作普通错误记录或包装，一直传到发起操作的位置。
+    """
+
+
+class CancellationToken:
+    """协作式取消令牌
+
+    长时间运行的操作在每个目录项、每个文件和每个读取块之前检查令牌，
+    被取消后尽快停止并返回已经得到的部分结果。检查只是一次Event.is_set，
+    可以放在热路径上。令牌取消后不能恢复，每次操作使用新的令牌。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+
+    def cancel(self, reason: str = 'cancelled'):
+        """取消令牌，只记录第一次取消的原因"""
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        """已取消时抛出 OperationCancelled"""
+        if self._event.is_set():
+            raise OperationCancelled(self.reason)
+
+    def check(self, nbytes: int = 0):
+        """与读取回调的签名一致，可直接作为每块读取前的回调"""
+        self.raise_if_cancelled()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待取消，超时返回False"""
+        return self._event.wait(timeout)
+
+
+class PartialResult(list):
+    """可能因取消而不完整的结果列表，complete 为False时只包含取消前得到的部分"""
+
+    def __init__(self, items: Iterable = (), complete: bool = True):
+        super().__init__(items)
+        self.complete = complete
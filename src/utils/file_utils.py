@@ -3,23 +3,32 @@ import shutil
 import hashlib
 import filetype
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import datetime
 import zipfile
 
+from src.utils.cancellation import CancellationToken, OperationCancelled
+from src.utils.hash_cache import cached_file_hash
+
+# 可取消的复制每次读写的块大小
+COPY_CHUNK_SIZE = 1024 * 1024
+
 class FileUtils:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         
     @staticmethod
     def get_file_hash(file_path: str, block_size: int = 65536) -> str:
-        """计算文件的MD5哈希值"""
-        hasher = hashlib.md5()
-        try:
-            with open(file_path, 'rb') as f:
+        """计算文件的MD5哈希值，文件未变化时直接使用哈希缓存"""
+        def compute(path):
+            hasher = hashlib.md5()
+            with open(path, 'rb') as f:
                 for block in iter(lambda: f.read(block_size), b''):
                     hasher.update(block)
             return hasher.hexdigest()
+
+        try:
+            return cached_file_hash(file_path, 'md5', compute)
         except Exception as e:
             raise IOError(f"Failed to calculate hash for {file_path}: {str(e)}")
             
@@ -107,4 +116,32 @@ class FileUtils:
                 shutil.copytree(source, destination)
             return True
         except Exception as e:
-            raise IOError(f"Failed to copy file: {str(e)}")
\ No newline at end of file
+            raise IOError(f"Failed to copy file: {str(e)}")
+
+    @staticmethod
+    def copy_file(source: str, destination: str, cancel: Optional[CancellationToken] = None,
+                  chunk_size: int = COPY_CHUNK_SIZE):
+        """复制文件内容和元数据（与shutil.copy2相同），每块之前检查取消令牌
+
+        取消时删除未写完的目标文件并抛出 OperationCancelled。
+        """
+        if cancel is None:
+            shutil.copy2(source, destination)
+            return
+        try:
+            with open(source, 'rb', buffering=0) as src, open(destination, 'wb') as dst:
+                buffer = bytearray(chunk_size)
+                view = memoryview(buffer)
+                while True:
+                    cancel.raise_if_cancelled()
+                    n = src.readinto(buffer)
+                    if not n:
+                        break
+                    dst.write(view[:n])
+        except OperationCancelled:
+            try:
+                os.remove(destination)
+            except OSError:
+                pass
+            raise
+        shutil.copystat(source, destination)
@@ -0,0 +1,271 @@
+import os
+import time
+import atexit
+import sqlite3
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Sequence
+
+from src.config.settings import SCAN_CONFIG
+
+# 每累计多少次写入提交一次事务
+COMMIT_INTERVAL = 256
+# 命中时的最近使用时间先记在内存中，累计到该数量或提交时批量写入
+TOUCH_FLUSH_INTERVAL = 65536
+
+
+def _to_sqlite_int(value: int) -> int:
+    """把无符号64位整数（如inode号）映射到SQLite的有符号整数范围"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+class HashCache:
+    """持久化的文件哈希缓存
+
+    以 (st_dev, st_ino, size, mtime_ns, algorithm) 为键，文件未变化时
+    直接返回上次计算的哈希值而无需读取文件内容。超过容量上限时按
+    最近使用时间淘汰最旧的条目。命中只在内存中记录使用时间，
+    提交时批量写入，未变化的目录树重复扫描时不逐个文件写数据库。
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 1000000):
+        self.db_path = str(db_path)
+        self.max_entries = max_entries
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._pending_writes = 0
+        # 命中条目的键 -> 最近使用时间，尚未写入数据库
+        self._touched = {}
+        self.hits = 0
+        self.misses = 0
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        try:
+            # WAL模式允许多个扫描进程同时读取
+            self._conn.execute('PRAGMA journal_mode=WAL')
+        except sqlite3.DatabaseError as e:
+            self.logger.warning(f"Failed to enable WAL for hash cache: {str(e)}")
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                dev INTEGER NOT NULL,
+                ino INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                algorithm TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (dev, ino, size, mtime_ns, algorithm)
+            )
+        ''')
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_file_hashes_last_used ON file_hashes (last_used)'
+        )
+        self._conn.commit()
+        self._entries = self._conn.execute('SELECT COUNT(*) FROM file_hashes').fetchone()[0]
+
+    @staticmethod
+    def _key(stat_result: os.stat_result, algorithm: str):
+        return (
+            _to_sqlite_int(stat_result.st_dev),
+            _to_sqlite_int(stat_result.st_ino),
+            stat_result.st_size,
+            stat_result.st_mtime_ns,
+            algorithm,
+        )
+
+    def get(self, stat_result: os.stat_result, algorithm: str) -> Optional[str]:
+        """查询缓存，未命中返回None"""
+        key = self._key(stat_result, algorithm)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT digest FROM file_hashes WHERE dev=? AND ino=? AND size=? '
+                'AND mtime_ns=? AND algorithm=?', key
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[key] = time.time()
+            if len(self._touched) >= TOUCH_FLUSH_INTERVAL:
+                self._commit()
+            return row[0]
+
+    def put(self, stat_result: os.stat_result, algorithm: str, digest: str):
+        """写入缓存"""
+        key = self._key(stat_result, algorithm)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO file_hashes '
+                '(dev, ino, size, mtime_ns, algorithm, digest, last_used) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', key + (digest, time.time())
+            )
+            self._entries += 1
+            self._note_write()
+
+    def get_or_compute(self, file_path: str, algorithm: str,
+                       compute: Callable[[str], str],
+                       stat_result: Optional[os.stat_result] = None) -> str:
+        """命中缓存时直接返回，否则计算并写入缓存
+
+        调用方已有stat结果（如遍历时的DirEntry）时可直接传入，省去一次stat。
+        """
+        if stat_result is None:
+            stat_result = os.stat(file_path)
+        digest = self.get(stat_result, algorithm)
+        if digest is not None:
+            return digest
+
+        digest = compute(file_path)
+        # 计算期间文件被修改时不写入缓存
+        after = os.stat(file_path)
+        if (after.st_mtime_ns, after.st_size) == (stat_result.st_mtime_ns, stat_result.st_size):
+            self.put(stat_result, algorithm, digest)
+        return digest
+
+    def get_or_compute_many(self, file_path: str, algorithms: Sequence[str],
+                            compute: Callable[[str, List[str]], Dict[str, str]],
+                            stat_result: Optional[os.stat_result] = None) -> Dict[str, str]:
+        """多个算法的 get_or_compute，只对未命中的算法调用一次 compute(路径, 算法列表)"""
+        if stat_result is None:
+            stat_result = os.stat(file_path)
+        digests = {algorithm: self.get(stat_result, algorithm) for algorithm in algorithms}
+        missing = [algorithm for algorithm, digest in digests.items() if digest is None]
+        if not missing:
+            return digests
+
+        computed = compute(file_path, missing)
+        after = os.stat(file_path)
+        if (after.st_mtime_ns, after.st_size) == (stat_result.st_mtime_ns, stat_result.st_size):
+            for algorithm in missing:
+                self.put(stat_result, algorithm, computed[algorithm])
+        digests.update(computed)
+        return digests
+
+    def _note_write(self):
+        """累计写入次数，定期提交事务并执行淘汰（调用方需持有锁）"""
+        self._pending_writes += 1
+        if self._pending_writes >= COMMIT_INTERVAL:
+            self._commit()
+
+    def _commit(self):
+        if self._touched:
+            self._conn.executemany(
+                'UPDATE file_hashes SET last_used=? WHERE dev=? AND ino=? AND size=? '
+                'AND mtime_ns=? AND algorithm=?',
+                [(last_used,) + key for key, last_used in self._touched.items()]
+            )
+            self._touched.clear()
+        if self._entries > self.max_entries:
+            self._evict()
+        self._conn.commit()
+        self._pending_writes = 0
+
+    def _evict(self):
+        """淘汰最近最少使用的条目，保留容量的90%"""
+        self._entries = self._conn.execute('SELECT COUNT(*) FROM file_hashes').fetchone()[0]
+        excess = self._entries - int(self.max_entries * 0.9)
+        if excess <= 0:
+            return
+        self._conn.execute(
+            'DELETE FROM file_hashes WHERE rowid IN '
+            '(SELECT rowid FROM file_hashes ORDER BY last_used LIMIT ?)', (excess,)
+        )
+        self._entries -= excess
+        self.logger.debug(f"Evicted {excess} entries from hash cache")
+
+    def flush(self):
+        """提交所有未保存的写入"""
+        with self._lock:
+            if self._conn is not None:
+                self._commit()
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute('DELETE FROM file_hashes')
+            self._conn.commit()
+            self._entries = 0
+            self._pending_writes = 0
+            self._touched.clear()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM file_hashes').fetchone()[0]
+
+    def close(self):
+        """提交并关闭数据库连接"""
+        with self._lock:
+            if self._conn is None:
+                return
+            self._commit()
+            self._conn.close()
+            self._conn = None
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_hash_cache() -> Optional[HashCache]:
+    """获取全局共享的哈希缓存，配置禁用时返回None"""
+    global _default_cache
+    if not SCAN_CONFIG.get('hash_cache_enabled', True):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = HashCache(
+                    SCAN_CONFIG['hash_cache_path'],
+                    SCAN_CONFIG.get('hash_cache_max_entries', 1000000)
+                )
+                atexit.register(_default_cache.close)
+            except (sqlite3.Error, OSError) as e:
+                logging.getLogger(__name__).warning(f"Hash cache unavailable: {str(e)}")
+                SCAN_CONFIG['hash_cache_enabled'] = False
+                return None
+        return _default_cache
+
+
+def flush_hash_cache():
+    """提交全局缓存中未保存的写入和使用时间，每次扫描结束时调用"""
+    cache = _default_cache
+    if cache is not None:
+        cache.flush()
+
+
+def cached_file_hash(file_path: str, algorithm: str, compute: Callable[[str], str],
+                     stat_result: Optional[os.stat_result] = None) -> str:
+    """通过全局缓存计算文件哈希，缓存不可用时直接计算"""
+    cache = get_hash_cache()
+    if cache is None:
+        return compute(file_path)
+    return cache.get_or_compute(file_path, algorithm, compute, stat_result)
+
+
+def cached_file_hashes(file_path: str, algorithms: Sequence[str],
+                       compute: Callable[[str, List[str]], Dict[str, str]],
+                       stat_result: Optional[os.stat_result] = None) -> Dict[str, str]:
+    """通过全局缓存计算多个摘要，未命中的算法一次读取算出"""
+    cache = get_hash_cache()
+    if cache is None:
+        return compute(file_path, list(algorithms))
+    return cache.get_or_compute_many(file_path, algorithms, compute, stat_result)
+
+
+def lookup_file_hash(file_path: str, algorithm: str,
+                     stat_result: Optional[os.stat_result] = None) -> Optional[str]:
+    """只查询全局缓存，缓存不可用或未命中时返回None"""
+    cache = get_hash_cache()
+    if cache is None:
+        return None
+    if stat_result is None:
+        stat_result = os.stat(file_path)
+    return cache.get(stat_result, algorithm)
+
+
+def remember_file_hash(stat_result: os.stat_result, algorithm: str, digest: str):
+    """把在读取过程中顺带算出的摘要写入全局缓存"""
+    cache = get_hash_cache()
+    if cache is not None:
+        cache.put(stat_result, algorithm, digest)
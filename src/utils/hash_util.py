@@ -1,12 +1,169 @@
+import os
+import mmap
+import stat
 import hashlib
+import threading
 import xxhash
-from typing import Union, BinaryIO
+from queue import SimpleQueue
+from typing import Callable, Dict, Optional, Sequence, Union, BinaryIO
 import logging
 
+from src.utils.hash_cache import cached_file_hash, cached_file_hashes
+
+# 支持的哈希算法：名称 -> 构造函数
+HASH_ALGORITHMS = {
+    'md5': hashlib.md5,
+    'sha1': hashlib.sha1,
+    'sha256': hashlib.sha256,
+    'xxhash': xxhash.xxh64,
+    'xxh64': xxhash.xxh64,
+    'xxh3_64': xxhash.xxh3_64,
+    'xxh3_128': xxhash.xxh3_128,
+}
+
+# 用于校验的加密哈希算法
+CRYPTOGRAPHIC_ALGORITHMS = ('md5', 'sha1', 'sha256')
+
+DEFAULT_CHUNK_SIZE = 65536
+
+# 同时计算多个摘要时，超过该大小且有多个CPU才使用多线程
+PARALLEL_MIN_SIZE = 16 * 1024 * 1024  # 16MB
+# 多线程计算时每块的最小大小，摊薄线程间同步的开销
+PARALLEL_CHUNK_SIZE = 1024 * 1024  # 1MB
+
 class HashUtils:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         
+    @staticmethod
+    def new_hasher(algorithm: str):
+        """创建指定算法的哈希对象"""
+        try:
+            return HASH_ALGORITHMS[algorithm.lower()]()
+        except KeyError:
+            raise ValueError(f"Unsupported hash algorithm: {algorithm}")
+            
+    @staticmethod
+    def update_from_file(hasher, f: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                         mmap_threshold: Optional[int] = None,
+                         throttle: Optional[Callable[[int], None]] = None):
+        """把文件对象的剩余内容送入哈希对象
+
+        默认使用预分配缓冲区的readinto；不支持fileno/readinto的对象（管道包装、
+        内存流等）退回read。mmap_threshold 只应在确认文件不会被截断时传入：
+        映射期间文件被截断（如logrotate的copytruncate）会使进程因SIGBUS崩溃，
+        此时不小于该大小的普通文件使用mmap按memoryview切片送入。
+        throttle 在读取每块之前以块大小调用，用于限制读取速率。
+        """
+        mapped = None
+        try:
+            st = os.fstat(f.fileno())
+            if (mmap_threshold is not None and stat.S_ISREG(st.st_mode)
+                    and st.st_size >= mmap_threshold and f.tell() == 0):
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError, AttributeError):
+            # 特殊文件、不支持mmap的文件系统或非真实文件
+            mapped = None
+
+        if mapped is not None:
+            with mapped:
+                if hasattr(mapped, 'madvise'):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                view = memoryview(mapped)
+                try:
+                    for offset in range(0, len(view), chunk_size):
+                        if throttle is not None:
+                            throttle(min(chunk_size, len(view) - offset))
+                        hasher.update(view[offset:offset + chunk_size])
+                finally:
+                    view.release()
+            f.seek(0, os.SEEK_END)
+            return
+
+        if hasattr(f, 'readinto'):
+            buffer = bytearray(chunk_size)
+            view = memoryview(buffer)
+            while True:
+                if throttle is not None:
+                    throttle(chunk_size)
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                hasher.update(view[:n])
+            return
+
+        while True:
+            if throttle is not None:
+                throttle(chunk_size)
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+
+    @classmethod
+    def calculate_hash(cls, data: Union[str, bytes, BinaryIO], algorithm: str,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE,
+                       throttle: Optional[Callable[[int], None]] = None) -> str:
+        """使用指定算法计算哈希值"""
+        hasher = cls.new_hasher(algorithm)
+        
+        try:
+            if isinstance(data, str):
+                hasher.update(data.encode())
+            elif isinstance(data, bytes):
+                hasher.update(data)
+            else:  # 文件对象
+                cls.update_from_file(hasher, data, chunk_size, throttle=throttle)
+                    
+            return hasher.hexdigest()
+        except Exception as e:
+            raise ValueError(f"Failed to calculate {algorithm}: {str(e)}")
+        
+    @classmethod
+    def calculate_hashes(cls, data: Union[str, bytes, BinaryIO], algorithms: Sequence[str],
+                         chunk_size: int = DEFAULT_CHUNK_SIZE,
+                         throttle: Optional[Callable[[int], None]] = None,
+                         threaded: Optional[bool] = None) -> Dict[str, str]:
+        """一次读取计算多个算法的哈希值，返回 {小写算法名: 摘要}
+
+        每块数据依次送入各算法的哈希对象，文件只读一次。threaded 为None时，
+        多个算法、多个CPU且数据不小于 PARALLEL_MIN_SIZE 时各算法在单独的线程中计算。
+        """
+        try:
+            if isinstance(data, (str, bytes)):
+                size = len(data)
+            else:
+                size = cls._remaining_size(data)
+            threaded = cls._use_threads(threaded, algorithms, size)
+            with MultiHasher(algorithms, threaded) as hasher:
+                if isinstance(data, str):
+                    hasher.update(data.encode())
+                elif isinstance(data, bytes):
+                    hasher.update(data)
+                else:  # 文件对象
+                    if threaded:
+                        chunk_size = max(chunk_size, PARALLEL_CHUNK_SIZE)
+                    cls.update_from_file(hasher, data, chunk_size, throttle=throttle)
+                return hasher.hexdigests()
+        except Exception as e:
+            raise ValueError(f"Failed to calculate {', '.join(algorithms)}: {str(e)}")
+
+    @staticmethod
+    def _remaining_size(f: BinaryIO) -> int:
+        """文件对象剩余的字节数，无法确定时返回0"""
+        try:
+            return os.fstat(f.fileno()).st_size - f.tell()
+        except (OSError, ValueError, AttributeError):
+            return 0
+
+    @staticmethod
+    def _use_threads(threaded: Optional[bool], algorithms: Sequence[str], size: int) -> bool:
+        """threaded 为None时按算法数、CPU数和数据大小决定是否多线程计算"""
+        if threaded is not None:
+            return threaded
+        return (len({algorithm.lower() for algorithm in algorithms}) > 1
+                and (os.cpu_count() or 1) > 1 and size >= PARALLEL_MIN_SIZE)
+
     @staticmethod
     def calculate_md5(data: Union[str, bytes, BinaryIO]) -> str:
         """计算MD5哈希值"""
@@ -18,8 +175,7 @@ class HashUtils:
             elif isinstance(data, bytes):
                 hasher.update(data)
             else:  # 文件对象
-                for chunk in iter(lambda: data.read(65536), b''):
-                    hasher.update(chunk)
+                HashUtils.update_from_file(hasher, data)
                     
             return hasher.hexdigest()
         except Exception as e:
@@ -37,8 +193,7 @@ class HashUtils:
             elif isinstance(data, bytes):
                 hasher.update(data)
             else:  # 文件对象
-                for chunk in iter(lambda: data.read(65536), b''):
-                    hasher.update(chunk)
+                HashUtils.update_from_file(hasher, data)
                     
             return hasher.hexdigest()
         except Exception as e:
@@ -55,25 +210,143 @@ class HashUtils:
             elif isinstance(data, bytes):
                 hasher.update(data)
             else:  # 文件对象
-                for chunk in iter(lambda: data.read(65536), b''):
-                    hasher.update(chunk)
+                HashUtils.update_from_file(hasher, data)
                     
             return hasher.hexdigest()
         except Exception as e:
             raise ValueError(f"Failed to calculate xxHash: {str(e)}")
             
     @classmethod
-    def get_file_hash(cls, file_path: str, algorithm: str = 'md5') -> str:
-        """获取文件的哈希值"""
+    def get_file_hash(cls, file_path: str, algorithm: str = 'md5',
+                      chunk_size: int = DEFAULT_CHUNK_SIZE,
+                      throttle: Optional[Callable[[int], None]] = None) -> str:
+        """获取文件的哈希值，文件未变化时直接使用哈希缓存
+
+        throttle 在读取每块之前以块大小调用，命中缓存时不读取文件。
+        """
         try:
-            with open(file_path, 'rb') as f:
-                if algorithm.lower() == 'md5':
-                    return cls.calculate_md5(f)
-                elif algorithm.lower() == 'sha256':
-                    return cls.calculate_sha256(f)
-                elif algorithm.lower() == 'xxhash':
-                    return cls.calculate_xxhash(f)
-                else:
+            algorithm = algorithm.lower()
+            if algorithm not in HASH_ALGORITHMS:
+                raise ValueError(f"Unsupported hash algorithm: {algorithm}")
+            # 缓存键包含算法名，切换算法时不会取到其他算法的摘要
+            return cached_file_hash(
+                file_path, algorithm,
+                lambda path: cls._compute_file_hash(path, algorithm, chunk_size, throttle)
+            )
+        except Exception as e:
+            raise IOError(f"Failed to calculate file hash: {str(e)}")
+            
+    @classmethod
+    def get_file_hashes(cls, file_path: str, algorithms: Sequence[str],
+                        chunk_size: int = DEFAULT_CHUNK_SIZE,
+                        throttle: Optional[Callable[[int], None]] = None,
+                        threaded: Optional[bool] = None) -> Dict[str, str]:
+        """一次读取获取文件的多个哈希值，返回 {小写算法名: 摘要}
+
+        缓存中已有的算法直接使用，其余算法在同一次读取中计算并写入缓存。
+        """
+        try:
+            algorithms = list(dict.fromkeys(algorithm.lower() for algorithm in algorithms))
+            for algorithm in algorithms:
+                if algorithm not in HASH_ALGORITHMS:
                     raise ValueError(f"Unsupported hash algorithm: {algorithm}")
+            return cached_file_hashes(
+                file_path, algorithms,
+                lambda path, missing: cls._compute_file_hashes(path, missing, chunk_size,
+                                                               throttle, threaded)
+            )
         except Exception as e:
-            raise IOError(f"Failed to calculate file hash: {str(e)}")
\ No newline at end of file
+            raise IOError(f"Failed to calculate file hashes: {str(e)}")
+
+    @classmethod
+    def _compute_file_hashes(cls, file_path: str, algorithms: Sequence[str], chunk_size: int,
+                             throttle: Optional[Callable[[int], None]] = None,
+                             threaded: Optional[bool] = None) -> Dict[str, str]:
+        """读取一次文件内容计算多个哈希值"""
+        with open(file_path, 'rb', buffering=0) as f:
+            return cls.calculate_hashes(f, algorithms, chunk_size, throttle, threaded)
+
+    @classmethod
+    def _compute_file_hash(cls, file_path: str, algorithm: str, chunk_size: int,
+                           throttle: Optional[Callable[[int], None]] = None) -> str:
+        """读取文件内容计算哈希值"""
+        # 不使用Python层缓冲，readinto直接填充预分配的缓冲区
+        with open(file_path, 'rb', buffering=0) as f:
+            return cls.calculate_hash(f, algorithm, chunk_size, throttle)
+
+
+class MultiHasher:
+    """把同一份数据送入多个哈希对象，一次读取得到全部摘要
+
+    threaded=True 时第一个哈希对象在调用方线程中更新，其余各用一个线程，
+    update() 等全部更新完成才返回，调用方随后即可覆盖缓冲区。hashlib 对较大的
+    数据块释放GIL，各算法因此可以在多个CPU上同时计算。
+    """
+
+    def __init__(self, algorithms: Sequence[str], threaded: bool = False):
+        names = list(dict.fromkeys(algorithm.lower() for algorithm in algorithms))
+        if not names:
+            raise ValueError("No hash algorithm given")
+        self.hashers = {name: HashUtils.new_hasher(name) for name in names}
+        self._first = self.hashers[names[0]]
+        self._inboxes = []
+        self._threads = []
+        self._done = threading.Semaphore(0)
+        self._error = None
+        if threaded:
+            for name in names[1:]:
+                inbox = SimpleQueue()
+                thread = threading.Thread(target=self._run, args=(self.hashers[name], inbox),
+                                          name=f"hasher_{name}", daemon=True)
+                thread.start()
+                self._inboxes.append(inbox)
+                self._threads.append(thread)
+
+    def _run(self, hasher, inbox):
+        while True:
+            data = inbox.get()
+            if data is None:
+                return
+            try:
+                hasher.update(data)
+            except BaseException as e:
+                self._error = e
+            finally:
+                # 先释放对数据的引用再通知，mmap切片不会在关闭映射时仍被持有
+                data = None
+                self._done.release()
+
+    def update(self, data):
+        """把一块数据送入全部哈希对象"""
+        if not self._threads:
+            for hasher in self.hashers.values():
+                hasher.update(data)
+            return
+        for inbox in self._inboxes:
+            inbox.put(data)
+        try:
+            self._first.update(data)
+        finally:
+            for _ in self._inboxes:
+                self._done.acquire()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def hexdigests(self) -> Dict[str, str]:
+        return {name: hasher.hexdigest() for name, hasher in self.hashers.items()}
+
+    def close(self):
+        """结束更新线程"""
+        for inbox in self._inboxes:
+            inbox.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._inboxes = []
+        self._threads = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,28 @@
+import os
+import atexit
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from src.config.settings import SCAN_CONFIG
+from src.utils import hash_cache
+
+# 测试使用本次运行独立的扫描状态和检查点数据库，不读写 src/data 中的文件；
+# 全局哈希缓存默认禁用，以前运行或其他测试留下的摘要不会影响结果
+_DATA_DIR = Path(tempfile.mkdtemp(prefix='file_cleaner_tests_'))
+atexit.register(shutil.rmtree, _DATA_DIR, ignore_errors=True)
+for key in ('hash_cache_path', 'scan_state_path', 'checkpoint_path'):
+    SCAN_CONFIG[key] = _DATA_DIR / Path(SCAN_CONFIG[key]).name
+SCAN_CONFIG['hash_cache_enabled'] = False
+
+
+def use_temp_hash_cache(test_case, directory):
+    """在测试期间启用位于 directory 中的全新全局哈希缓存，测试结束后关闭并恢复"""
+    cache = hash_cache.HashCache(os.path.join(directory, 'hash_cache.db'))
+    for patcher in (mock.patch.dict(SCAN_CONFIG, {'hash_cache_enabled': True}),
+                    mock.patch.object(hash_cache, '_default_cache', cache)):
+        patcher.start()
+        test_case.addCleanup(patcher.stop)
+    test_case.addCleanup(cache.close)
+    return cache
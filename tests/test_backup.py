@@ -45,6 +45,17 @@ class TestBackup(unittest.TestCase):
         self.assertTrue(os.path.exists(backup_info['path']))
         self.assertEqual(backup_info['files_count'], 3)
         
+    def test_backup_excludes_patterns(self):
+        """测试目录备份跳过排除的文件和目录"""
+        os.makedirs(os.path.join(self.test_dir, 'node_modules', 'pkg'))
+        for name in ('node_modules/pkg/index.js', 'scratch.tmp'):
+            with open(os.path.join(self.test_dir, name), 'w') as f:
+                f.write('excluded')
+
+        backup_info = self.backup.create_backup([self.test_dir])
+
+        self.assertEqual(backup_info['files_count'], 3)
+
     def test_restore_backup(self):
         """测试恢复备份功能"""
         # 创建备份
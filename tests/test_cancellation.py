@@ -0,0 +1,163 @@
+import unittest
+import os
+import random
+import shutil
+import tempfile
+from src.core.backup import AutoBackup
+from src.core.file_advisor import FileAdvisor
+from src.core.file_scanner import FileScanner
+from src.core.scan_events import FILE_DISCOVERED, SCAN_CANCELLED
+from src.core.threaded_scanner import ThreadedScanner
+from src.core.walker import DirectoryWalker, ParallelWalker
+from src.utils.cancellation import CancellationToken, OperationCancelled
+from src.utils.file_utils import FileUtils
+
+
+class CountdownToken(CancellationToken):
+    """检查指定次数之后自动取消"""
+
+    def __init__(self, checks):
+        super().__init__()
+        self.checks = checks
+
+    def raise_if_cancelled(self):
+        self.checks -= 1
+        if self.checks < 0:
+            self.cancel('countdown')
+        super().raise_if_cancelled()
+
+
+class TestScanCancellation(unittest.TestCase):
+    def setUp(self):
+        """测试前创建四个目录，每个目录中有两个与其他目录重复的文件"""
+        self.test_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.test_dir, 'root')
+        for i in range(4):
+            sub_dir = os.path.join(self.root, f'dir{i}')
+            os.makedirs(sub_dir)
+            for k in range(2):
+                with open(os.path.join(sub_dir, f'file{k}.bin'), 'wb') as f:
+                    f.write(random.Random(k).randbytes(300000))
+        self.scanner = FileScanner(ai_models=None)
+        self.scanner.checkpoint_path = os.path.join(self.test_dir, 'checkpoint.db')
+        self.scanner.checkpoint_enabled = True
+        self.token = CancellationToken()
+        # 第一次计算完整哈希时取消，之后的读取立即停止
+        self.get_file_hash = self.scanner.get_file_hash
+        self.scanner.get_file_hash = self.cancel_then_hash
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.test_dir)
+
+    def cancel_then_hash(self, path):
+        self.token.cancel('test')
+        return self.get_file_hash(path)
+
+    def test_cancel_during_hashing_returns_partial_results(self):
+        """测试哈希计算中取消，产出已遍历的文件和取消事件，取消不记为错误，检查点保留"""
+        events = list(self.scanner.iter_scan(self.root, cancel=self.token))
+
+        self.assertEqual(events[-1].type, SCAN_CANCELLED)
+        self.assertEqual(events[-1].data, 'test')
+        self.assertEqual(sum(event.type == FILE_DISCOVERED for event in events), 8)
+        results = self.scanner.new_results()
+        for event in events:
+            self.scanner.collect_event(results, event)
+        self.assertFalse(results['complete'])
+        self.assertEqual(results['duplicates'], {})
+        self.assertEqual(results['errors'], [])
+        self.assertIsNone(self.scanner.cancel_token)
+
+        # 取消的扫描可以从检查点继续，得到完整结果
+        self.assertTrue(self.scanner.has_checkpoint(self.root))
+        self.scanner.get_file_hash = self.get_file_hash
+        resumed = self.scanner.scan_directory(self.root, resume=True)
+        self.assertTrue(resumed['complete'])
+        self.assertEqual(len(resumed['duplicates']), 2)
+        self.assertFalse(self.scanner.has_checkpoint(self.root))
+
+    def test_threaded_scan_cancel(self):
+        """测试多线程扫描在线程池中取消哈希计算，返回不完整的结果而不是抛出异常"""
+        threaded = ThreadedScanner(self.scanner, max_workers=2)
+        results = threaded.scan_directory(self.root, cancel=self.token)
+
+        self.assertFalse(results['complete'])
+        self.assertEqual(results['duplicates'], {})
+        self.assertEqual(results['errors'], [])
+
+        view = self.scanner.scan_to_store(self.root, cancel=CountdownToken(3)).as_results()
+        self.assertFalse(view['complete'])
+
+    def test_walkers_stop_when_cancelled(self):
+        """测试顺序和并行遍历器在取消后抛出 OperationCancelled，不再产出剩余目录"""
+        for walker in (DirectoryWalker(), ParallelWalker(4),
+                       ParallelWalker(4, deterministic=True)):
+            token = CancellationToken()
+            seen = []
+            with self.assertRaises(OperationCancelled):
+                for entry in walker.walk(self.root, cancel=token):
+                    seen.append(entry)
+                    token.cancel()
+            self.assertLess(len(seen), 8)
+
+
+class TestBackupAndAdvisorCancellation(unittest.TestCase):
+    def setUp(self):
+        """测试前创建源文件和备份目录"""
+        self.test_dir = tempfile.mkdtemp()
+        self.backup_dir = tempfile.mkdtemp()
+        self.backup = AutoBackup(self.backup_dir)
+        self.source = os.path.join(self.test_dir, 'large.bin')
+        with open(self.source, 'wb') as f:
+            f.write(random.Random(1).randbytes(3 * 1024 * 1024))
+
+    def tearDown(self):
+        """测试后清理"""
+        self.backup.stop_auto_backup()
+        shutil.rmtree(self.test_dir)
+        shutil.rmtree(self.backup_dir)
+
+    def test_copy_cancelled_midway_removes_partial_file(self):
+        """测试复制到一半取消时删除未写完的目标文件"""
+        destination = os.path.join(self.test_dir, 'copy.bin')
+        with self.assertRaises(OperationCancelled):
+            FileUtils.copy_file(self.source, destination, CountdownToken(2))
+        self.assertFalse(os.path.exists(destination))
+
+        FileUtils.copy_file(self.source, destination, CancellationToken())
+        with open(self.source, 'rb') as a, open(destination, 'rb') as b:
+            self.assertEqual(a.read(), b.read())
+
+    def test_cancelled_backup_is_recorded_as_incomplete(self):
+        """测试取消的备份记入历史并标记为不完整，恢复被取消时返回False"""
+        token = CancellationToken()
+        token.cancel()
+        backup_info = self.backup.create_backup([self.source], cancel=token)
+
+        self.assertFalse(backup_info['complete'])
+        self.assertFalse(backup_info['compressed'])
+        self.assertEqual(backup_info['files_count'], 0)
+        self.assertEqual(self.backup.get_backup_info(backup_info['name']), backup_info)
+        self.assertIsNone(self.backup.cancel_token)
+
+        complete = self.backup.create_backup([self.source], backup_name='full')
+        self.assertTrue(complete['complete'])
+        restore_path = os.path.join(self.test_dir, 'restored')
+        self.assertFalse(self.backup.restore_backup('full', restore_path, cancel=token))
+
+    def test_cancelled_recommendations_are_partial(self):
+        """测试取消后跳过重要性推断，仍给出重复文件建议并标记为不完整"""
+        token = CancellationToken()
+        token.cancel()
+        scan_results = FileScanner(ai_models=None).new_results()
+        scan_results['classified_files']['documents'] = [self.source]
+        scan_results['duplicates'] = {'hash': [self.source, self.source + '.copy']}
+
+        recommendations = FileAdvisor(ai_models=None).generate_recommendations(scan_results, token)
+
+        self.assertFalse(recommendations.complete)
+        self.assertEqual([r['action'] for r in recommendations], ['remove_duplicates'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest import mock
+from src.config.settings import SCAN_CONFIG
+from src.core.file_filter import FileFilter
+from src.core.file_scanner import FileScanner
+from src.core.scan_events import FILE_DISCOVERED, DUPLICATE_GROUP
+from src.core.walker import list_directory
+
+class TestResumableScan(unittest.TestCase):
+    def setUp(self):
+        """测试前创建目录树和使用临时检查点的扫描器"""
+        self.test_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.test_dir, 'root')
+        for i in range(4):
+            sub_dir = os.path.join(self.root, f'dir{i}')
+            os.makedirs(sub_dir)
+            for k in range(3):
+                with open(os.path.join(sub_dir, f'file{k}.txt'), 'w') as f:
+                    # 每个目录中的file{k}内容相同，组成大小各不相同的重复分组
+                    f.write(f'content {k}' * (k + 1))
+        self.scanner = self._new_scanner(os.path.join(self.test_dir, 'checkpoint.db'))
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.test_dir)
+
+    def _new_scanner(self, checkpoint_path):
+        scanner = FileScanner(ai_models=None)
+        scanner.file_filter = FileFilter(SCAN_CONFIG['ignore_patterns'])
+        scanner.checkpoint_path = checkpoint_path
+        scanner.checkpoint_enabled = True
+        # 每个目录和哈希都立即保存
+        scanner.checkpoint_interval = 0
+        return scanner
+
+    def _crash_after(self, event_type, count=1):
+        """扫描到第count个指定类型的事件时复制检查点，模拟进程在此刻被终止"""
+        crashed = os.path.join(self.test_dir, 'crashed.db')
+        for event in self.scanner.iter_scan(self.root):
+            if event.type == event_type:
+                count -= 1
+            if count == 0:
+                shutil.copy(self.scanner.checkpoint_path, crashed)
+                break
+        return self._new_scanner(crashed)
+
+    def test_resume_during_walk(self):
+        """测试遍历中断后继续扫描，已完成的目录不再列出，结果与完整扫描一致"""
+        full = self.scanner.scan_directory(self.root)
+        self.assertFalse(self.scanner.has_checkpoint(self.root))
+
+        resumed = self._crash_after(FILE_DISCOVERED, 4)
+        self.assertTrue(resumed.has_checkpoint(self.root))
+
+        with mock.patch('src.core.checkpoint.list_directory', wraps=list_directory) as listed:
+            results = resumed.scan_directory(self.root, resume=True)
+        self.assertEqual(results, full)
+        self.assertLess(listed.call_count, 5)
+        self.assertFalse(resumed.has_checkpoint(self.root))
+
+    def test_resume_during_duplicate_detection(self):
+        """测试重复检测中断后继续，已算出的哈希不再计算"""
+        full = self.scanner.scan_directory(self.root)
+        resumed = self._crash_after(DUPLICATE_GROUP)
+
+        hashed = []
+        get_file_hash = resumed.get_file_hash
+        resumed.get_file_hash = lambda path: hashed.append(path) or get_file_hash(path)
+        results = resumed.scan_directory(self.root, resume=True)
+        self.assertEqual(results, full)
+        self.assertEqual(len(results['duplicates']), 3)
+        self.assertLess(len(hashed), 12)
+
+    def test_resume_skips_visited_symlink_loops(self):
+        """测试跟随符号链接时已列出的目录随检查点保存，恢复后栈中的符号链接环仍被跳过"""
+        for i in range(4):
+            os.symlink('..', os.path.join(self.root, f'dir{i}', 'loop'))
+        self.scanner.follow_symlinks = True
+        full = self.scanner.scan_directory(self.root)
+        self.assertEqual(sum(map(len, full['duplicates'].values())), 12)
+
+        resumed = self._crash_after(FILE_DISCOVERED, 4)
+        resumed.follow_symlinks = True
+        self.assertEqual(resumed.scan_directory(self.root, resume=True), full)
+
+    def test_changed_configuration_starts_over(self):
+        """测试扫描配置变化后不使用旧的检查点"""
+        resumed = self._crash_after(FILE_DISCOVERED)
+        resumed.follow_symlinks = True
+        self.assertFalse(resumed.has_checkpoint(self.root))
+        self.assertEqual(resumed.scan_directory(self.root, resume=True),
+                         self.scanner.scan_directory(self.root))
+
+if __name__ == '__main__':
+    unittest.main()
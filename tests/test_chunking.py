@@ -0,0 +1,95 @@
+import unittest
+import io
+import os
+import random
+import shutil
+import tempfile
+from src.core.chunking import ChunkIndex, iter_chunks
+from src.core.file_optimizer import FileOptimizer
+from src.core.file_scanner import FileScanner
+
+OPTIONS = {'min_size': 512, 'avg_size': 2048, 'max_size': 8192}
+
+
+def chunk_bytes(data, read_size=4096):
+    return [bytes(chunk) for chunk in iter_chunks(io.BytesIO(data), read_size=read_size, **OPTIONS)]
+
+
+class TestContentDefinedChunking(unittest.TestCase):
+    def setUp(self):
+        """测试前生成随机内容"""
+        self.data = random.Random(23).randbytes(200000)
+
+    def test_boundaries_depend_only_on_content(self):
+        """测试分块结果与读取缓冲区大小无关，块长度在限制范围内"""
+        chunks = chunk_bytes(self.data)
+        self.assertEqual(b''.join(chunks), self.data)
+        self.assertEqual(chunk_bytes(self.data, read_size=999), chunks)
+        self.assertEqual(chunk_bytes(self.data, read_size=1 << 20), chunks)
+        self.assertTrue(all(512 <= len(c) <= 8192 for c in chunks[:-1]))
+        self.assertGreater(len(chunks), 200000 // 8192)
+
+    def test_inserted_bytes_only_change_nearby_chunks(self):
+        """测试中间插入数据和末尾追加数据后，其余块不变，共享比例高"""
+        edited = self.data[:100000] + b'inserted line\n' + self.data[100000:]
+        appended = self.data + random.Random(5).randbytes(30000)
+        index = ChunkIndex()
+        for name, data in (('original', self.data), ('edited', edited), ('appended', appended),
+                           ('other', random.Random(7).randbytes(200000))):
+            chunks = chunk_bytes(data)
+            index.add(name, [(chunk, len(chunk)) for chunk in chunks])
+        # 原文件最后一块以文件末尾为边界，追加后这一块不同
+        last_chunk = chunk_bytes(self.data)[-1]
+
+        pairs = {tuple(pair['files']): pair for pair in index.similar_pairs(0.5)}
+        self.assertEqual(set(pairs), {('original', 'edited'), ('original', 'appended'),
+                                      ('edited', 'appended')})
+        self.assertEqual(pairs['original', 'appended']['shared_bytes'],
+                         len(self.data) - len(last_chunk))
+        self.assertGreater(pairs['original', 'edited']['ratio'], 0.9)
+
+
+class TestNearDuplicateScan(unittest.TestCase):
+    def setUp(self):
+        """测试前创建追加写入的日志和完全相同的副本"""
+        self.test_dir = tempfile.mkdtemp()
+        self.log = random.Random(1).randbytes(300000)
+        self.write('app.log', self.log)
+        self.write('app.log.1', self.log + random.Random(2).randbytes(50000))
+        self.write('copy/app.log', self.log)
+        self.write('unrelated.bin', random.Random(3).randbytes(300000))
+        self.scanner = FileScanner(ai_models=None)
+        self.scanner.checkpoint_enabled = False
+        self.scanner.near_duplicates = True
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.test_dir)
+
+    def write(self, relative_path, content):
+        path = os.path.join(self.test_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+    def test_scan_reports_near_duplicates(self):
+        """测试扫描报告追加写入的大文件，完全相同的副本只参与一次，结果进入优化建议"""
+        results = self.scanner.scan_directory(self.test_dir)
+
+        self.assertEqual(len(results['duplicates']), 1)
+        self.assertEqual(len(results['near_duplicates']), 1)
+        pair = results['near_duplicates'][0]
+        self.assertEqual(sorted(os.path.basename(p) for p in pair['files']), ['app.log', 'app.log.1'])
+        self.assertEqual(pair['reclaimable_bytes'], pair['shared_bytes'])
+        self.assertGreater(pair['ratio'], 0.8)
+
+        view = self.scanner.scan_to_store(self.test_dir).as_results()
+        self.assertEqual(view['near_duplicates'], results['near_duplicates'])
+
+        suggestions = FileOptimizer().suggest_optimizations(results)
+        near = [s for s in suggestions if s['type'] == 'near_duplicate']
+        self.assertEqual(len(near), 1)
+        self.assertEqual(near[0]['reclaimable_bytes'], pair['reclaimable_bytes'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import os
+import shutil
+import tempfile
+from src.core.content_type import ContentTypeDetector
+from src.core.walker import DirectoryWalker
+
+PNG_HEADER = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+
+class TestContentTypeDetector(unittest.TestCase):
+    def setUp(self):
+        """测试前准备"""
+        self.test_dir = tempfile.mkdtemp()
+        self.detector = ContentTypeDetector(max_headers=2)
+        
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.test_dir)
+        
+    def write(self, name, content):
+        path = os.path.join(self.test_dir, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+        
+    def test_detect_from_path_and_entry(self):
+        """测试通过路径或遍历记录检测类型"""
+        png = self.write('image.png', PNG_HEADER)
+        self.write('notes.txt', b'plain text')
+        
+        self.assertEqual(self.detector.detect(png), 'image/png')
+        entries = {e.name: e for e in DirectoryWalker().walk(self.test_dir)}
+        self.assertEqual(self.detector.detect(entries['notes.txt']), 'unknown')
+        
+    def test_shared_header_is_used(self):
+        """测试其他环节读取的文件头被复用而不再读取文件"""
+        path = self.write('header.bin', b'x' * 100)
+        self.detector.remember_header(path, PNG_HEADER)
+        
+        self.assertEqual(self.detector.read_header(path), PNG_HEADER)
+        # 共享的文件头只使用一次
+        self.assertEqual(self.detector.read_header(path), b'x' * 100)
+        
+    def test_shared_headers_are_bounded(self):
+        """测试共享文件头数量有上限"""
+        for i in range(5):
+            self.detector.remember_header(f'/tmp/file{i}', b'data')
+        
+        self.assertEqual(len(self.detector._headers), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,239 @@
+import unittest
+import hashlib
+import os
+import shutil
+import tempfile
+from unittest import mock
+from src.config.settings import SCAN_CONFIG
+from src.core.file_filter import FileFilter
+from src.core.dedup import (
+    DuplicateFinder, collapse_duplicates, directories_identical, find_duplicate_directories,
+    reclaimable_bytes
+)
+from src.core.file_scanner import FileScanner
+from src.utils.hash_util import HashUtils
+
+class TestDuplicateFinder(unittest.TestCase):
+    def setUp(self):
+        """测试前创建临时测试目录"""
+        self.test_dir = tempfile.mkdtemp()
+        self.finder = DuplicateFinder(HashUtils.get_file_hash, sample_size=16)
+        
+    def tearDown(self):
+        """测试后清理临时文件"""
+        shutil.rmtree(self.test_dir)
+        
+    def add_file(self, name, content):
+        """创建文件并登记到检测器"""
+        path = os.path.join(self.test_dir, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        self.finder.add(path, len(content), os.stat(path))
+        return path
+
+        
+    def test_unique_sizes_are_not_read(self):
+        """测试大小唯一的文件不会被读取"""
+        self.add_file('a.bin', b'a' * 100)
+        self.add_file('b.bin', b'b' * 200)
+        
+        duplicates = self.finder.find_duplicates()
+        
+        self.assertEqual(duplicates, {})
+        self.assertEqual(self.finder.stats['bytes_read'], 0)
+        
+    def test_sample_mismatch_skips_full_hash(self):
+        """测试采样不同的同大小文件不会计算完整哈希"""
+        self.add_file('a.bin', b'a' * 100)
+        self.add_file('b.bin', b'b' * 100)
+        
+        duplicates = self.finder.find_duplicates()
+        
+        self.assertEqual(duplicates, {})
+        self.assertEqual(self.finder.stats['sample_hashed'], 2)
+        self.assertEqual(self.finder.stats['full_hashed'], 0)
+        
+    def test_full_hash_confirms_duplicates(self):
+        """测试采样冲突时由完整哈希确认重复"""
+        content = b'x' * 40 + b'middle-a' + b'y' * 40
+        first = self.add_file('a.bin', content)
+        second = self.add_file('b.bin', content)
+        # 头尾相同但中间不同
+        self.add_file('c.bin', b'x' * 40 + b'middle-b' + b'y' * 40)
+        
+        duplicates = self.finder.find_duplicates()
+        
+        self.assertEqual(list(duplicates.values()), [[first, second]])
+        self.assertIn(HashUtils.get_file_hash(first), duplicates)
+        self.assertEqual(self.finder.stats['full_hashed'], 3)
+
+    def test_hardlinks_hashed_once_and_reported_separately(self):
+        """测试同一inode只哈希一次，硬链接不算作重复文件"""
+        original = os.path.join(self.test_dir, 'a.bin')
+        link = os.path.join(self.test_dir, 'a-link.bin')
+        with open(original, 'wb') as f:
+            f.write(b'linked content' * 10)
+        os.link(original, link)
+        for path in (original, link):
+            self.finder.add(path, os.path.getsize(path), os.stat(path))
+        
+        self.assertEqual(self.finder.find_duplicates(), {})
+        self.assertEqual(self.finder.link_groups(), {
+            f'{os.stat(original).st_dev}:{os.stat(original).st_ino}': [original, link]
+        })
+        self.assertEqual(self.finder.stats['bytes_read'], 0)
+        
+    def test_lockstep_compare_stops_at_first_difference(self):
+        """测试逐块比较在第一个不同的块处拆分分组，摘要与完整哈希一致"""
+        self.finder = DuplicateFinder(HashUtils.get_file_hash, sample_size=16,
+                                      compare_max_files=4, compare_block_size=100)
+        content = bytes(range(250)) * 4
+        first = self.add_file('a.bin', content)
+        second = self.add_file('b.bin', content)
+        # 头尾样本相同，第二个块不同
+        self.add_file('c.bin', content[:150] + b'x' + content[151:])
+
+        duplicates = self.finder.find_duplicates()
+
+        self.assertEqual(duplicates, {hashlib.md5(content).hexdigest(): [first, second]})
+        self.assertEqual(self.finder.stats['full_hashed'], 0)
+        self.assertEqual(self.finder.stats['compared'], 3)
+        # 样本 3 * 32 字节，前两个块 3 * 200 字节，其余只读相同的两个文件
+        self.assertEqual(self.finder.stats['bytes_read'], 3 * 32 + 3 * 200 + 2 * 800)
+
+    def test_compare_skips_file_when_fstat_fails(self):
+        """测试打开后fstat失败的文件被关闭并报告错误，其余文件照常比较"""
+        content = b'same content' * 20
+        paths = [self.add_file(f'{name}.bin', content) for name in ('a', 'b', 'c')]
+        failing = os.stat(paths[1]).st_ino
+        fstat = os.fstat
+        handles = []
+
+        def broken_fstat(fd):
+            st = fstat(fd)
+            if st.st_ino == failing:
+                raise OSError('fstat failed')
+            return st
+
+        def tracked_open(*args, **kwargs):
+            handles.append(open(*args, **kwargs))
+            return handles[-1]
+
+        with mock.patch('src.core.dedup.os.fstat', broken_fstat), \
+                mock.patch('src.core.dedup.open', tracked_open, create=True):
+            identical, errors = self.finder.compare_files(paths, len(content))
+
+        self.assertEqual(identical, [(hashlib.md5(content).hexdigest(), [paths[0], paths[2]])])
+        self.assertEqual([path for path, _ in errors], [paths[1]])
+        self.assertEqual(len(handles), 3)
+        self.assertTrue(all(f.closed for f in handles))
+
+    def test_reclaimable_bytes_uses_allocation_and_links(self):
+        """测试可释放空间按占用块计算，有范围外链接的inode不计入"""
+        content = b'z' * 8192
+        first = self.add_file('a.bin', content)
+        copy = self.add_file('b.bin', content)
+        duplicates = self.finder.find_duplicates()
+        
+        self.assertEqual(reclaimable_bytes(duplicates), os.stat(copy).st_blocks * 512)
+        
+        # 副本在扫描范围外还有一个硬链接时，删除它不释放空间
+        os.link(copy, os.path.join(self.test_dir, 'outside.bin'))
+        self.assertEqual(reclaimable_bytes(duplicates, self.finder.link_groups()), 0)
+        self.assertEqual(list(duplicates.values()), [[first, copy]])
+
+class TestDuplicateDirectories(unittest.TestCase):
+    def setUp(self):
+        """测试前创建临时测试目录"""
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """测试后清理临时文件"""
+        shutil.rmtree(self.test_dir)
+
+    def write(self, relative_path, content):
+        path = os.path.join(self.test_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_merkle_digest_from_existing_groups(self):
+        """测试只根据已有的文件分组计算目录摘要，并只报告最上层的重复目录"""
+        root = self.test_dir
+        a, b, c = (os.path.join(root, name) for name in ('a', 'b', 'c'))
+        duplicates = {
+            'h1': [f'{a}/x/1.txt', f'{b}/x/1.txt', f'{c}/1.txt'],
+            'h2': [f'{a}/2.txt', f'{b}/2.txt'],
+        }
+        # 三个3.txt是同一inode的硬链接，没有参与重复检测
+        hardlinks = {'9:9': [f'{a}/x/3.txt', f'{b}/x/3.txt', f'{c}/3.txt']}
+        paths = [p for files in list(duplicates.values()) + list(hardlinks.values()) for p in files]
+        paths.append(f'{c}/unique.txt')
+        # 摘要与磁盘上不经过滤的完整列表核对，文件内容只取自分组
+        for path in paths:
+            self.write(os.path.relpath(path, root), '')
+
+        directories = find_duplicate_directories(paths, duplicates, hardlinks)
+        self.assertEqual(list(directories.values()), [[a, b]])
+
+        # c不重复（含有唯一文件），c中的副本仍单独列出
+        collapsed = collapse_duplicates(duplicates, directories)
+        self.assertEqual(collapsed, {'h1': duplicates['h1']})
+
+        # 名称不同的文件使目录摘要不同
+        renamed = {'h1': [f'{a}/1.txt', f'{b}/one.txt']}
+        self.assertEqual(find_duplicate_directories(renamed['h1'], renamed), {})
+
+    def test_filtered_entries_make_directory_unique(self):
+        """测试只在被过滤的文件（隐藏目录、过小的文件）上不同的目录不报告为重复"""
+        for copy in ('a', 'b'):
+            self.write(f'{copy}/big.bin', 'x' * 4096)
+            self.write(f'{copy}/config.ini', f'setting = {copy}')
+            self.write(f'{copy}/.git/HEAD', f'ref: refs/heads/{copy}')
+        scanner = FileScanner(ai_models=None)
+        scanner.file_filter = FileFilter(SCAN_CONFIG['ignore_patterns'], min_size=1024)
+
+        results = scanner.scan_directory(self.test_dir)
+        self.assertEqual(len(results['duplicates']), 1)
+        self.assertEqual(results['duplicate_directories'], {})
+
+        # 删除前的逐字节确认同样不经过滤
+        a, b = (os.path.join(self.test_dir, copy) for copy in ('a', 'b'))
+        self.assertFalse(directories_identical(a, b))
+        for copy in ('a', 'b'):
+            os.remove(os.path.join(self.test_dir, copy, 'config.ini'))
+            shutil.rmtree(os.path.join(self.test_dir, copy, '.git'))
+        self.assertTrue(directories_identical(a, b))
+        self.assertEqual(list(scanner.scan_directory(self.test_dir)['duplicate_directories'].values()),
+                         [[a, b]])
+
+    def test_scan_reports_duplicate_directories(self):
+        """测试扫描结果报告整体重复的目录，列式存储视图一致"""
+        for copy in ('project', 'backup/project'):
+            for i in range(3):
+                self.write(f'{copy}/src/module{i}.py', f'print({i})')
+            self.write(f'{copy}/README', 'readme')
+        self.write('other/module0.py', 'print(0)')
+        scanner = FileScanner(ai_models=None)
+        scanner.file_filter = FileFilter(SCAN_CONFIG['ignore_patterns'])
+        scanner.checkpoint_enabled = False
+
+        results = scanner.scan_directory(self.test_dir)
+        project = os.path.join(self.test_dir, 'project')
+        backup = os.path.join(self.test_dir, 'backup', 'project')
+        self.assertEqual(sorted(map(sorted, results['duplicate_directories'].values())),
+                         [sorted([backup, project])])
+        self.assertEqual(len(results['duplicates']), 4)
+        remaining = collapse_duplicates(results['duplicates'], results['duplicate_directories'])
+        self.assertEqual([sorted(files) for files in remaining.values()], [sorted([
+            os.path.join(backup, 'src', 'module0.py'),
+            os.path.join(project, 'src', 'module0.py'),
+            os.path.join(self.test_dir, 'other', 'module0.py'),
+        ])])
+
+        view = scanner.scan_to_store(self.test_dir).as_results()
+        self.assertEqual(view['duplicate_directories'], results['duplicate_directories'])
+
+if __name__ == '__main__':
+    unittest.main()
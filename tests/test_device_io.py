@@ -0,0 +1,196 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+from src.config.settings import SCAN_CONFIG
+from src.core.file_filter import FileFilter
+from src.core.file_scanner import FileScanner
+from src.core.threaded_scanner import ThreadedScanner
+from src.core.dedup import DuplicateFinder
+from src.utils.hash_util import HashUtils
+from tests import use_temp_hash_cache
+from src.core.device_io import (
+    AdaptiveLimiter, DeviceProfile, DeviceScheduler, detect_profile, physical_offset,
+    physical_order_map, read_mounts, read_order
+)
+
+class TestDeviceProfiles(unittest.TestCase):
+    def setUp(self):
+        """测试前创建模拟的挂载表和sysfs"""
+        self.test_dir = tempfile.mkdtemp()
+        self.mounts_path = os.path.join(self.test_dir, 'mounts')
+        with open(self.mounts_path, 'w') as f:
+            f.write('/dev/sda1 / ext4 rw 0 0\n')
+            f.write('server:/export /mnt/nfs\\040share nfs4 rw 0 0\n')
+        self.sys_root = os.path.join(self.test_dir, 'sys')
+        disk = os.path.join(self.sys_root, 'block', 'sda')
+        os.makedirs(os.path.join(disk, 'queue'))
+        os.makedirs(os.path.join(disk, 'sda1'))
+        open(os.path.join(disk, 'sda1', 'partition'), 'w').close()
+        with open(os.path.join(disk, 'queue', 'rotational'), 'w') as f:
+            f.write('1\n')
+        os.makedirs(os.path.join(self.sys_root, 'dev', 'block'))
+        os.symlink(os.path.join(disk, 'sda1'), os.path.join(self.sys_root, 'dev', 'block', '8:1'))
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.test_dir)
+
+    def test_profiles_from_mounts_and_sysfs(self):
+        """测试根据文件系统类型和rotational标志选择参数"""
+        mounts = read_mounts(self.mounts_path)
+        self.assertIn(('/mnt/nfs share', 'nfs4'), mounts)
+
+        nfs = detect_profile('/mnt/nfs share/a.txt', os.makedev(0, 50), 8, mounts=mounts,
+                             sys_root=self.sys_root)
+        self.assertEqual((nfs.kind, nfs.fs_type, nfs.max_workers), ('network', 'nfs4', 16))
+
+        hdd = detect_profile('/home/a.txt', os.makedev(8, 1), 8, {'hdd': {'max_workers': 1}},
+                             mounts=mounts, sys_root=self.sys_root)
+        self.assertEqual((hdd.kind, hdd.max_workers, hdd.queue_depth), ('hdd', 1, 4))
+
+        unknown = detect_profile('/home/a.txt', os.makedev(9, 9), 8, mounts=mounts,
+                                 sys_root=self.sys_root)
+        self.assertEqual(unknown.kind, 'unknown')
+
+
+class TestDeviceScheduler(unittest.TestCase):
+    def test_map_preserves_order_with_separate_pools(self):
+        """测试不同设备使用各自的线程池且结果保持输入顺序"""
+        threads = {}
+        lock = threading.Lock()
+
+        def job(item):
+            with lock:
+                threads.setdefault(item[1].split('/')[1], set()).add(threading.current_thread().name)
+            return item[1].upper()
+
+        profiles = {1: DeviceProfile(1, 'hdd', 'ext4', 1, 2), 2: DeviceProfile(2, 'ssd', 'ext4', 4, 8)}
+        scheduler = DeviceScheduler(4, profile_func=lambda path, dev: profiles[dev])
+        scheduler.device_of = lambda path: 1 if path.startswith('/hdd') else 2
+        items = [(i, f'/{"hdd" if i % 3 else "ssd"}/f{i}') for i in range(50)]
+        with scheduler:
+            results = list(scheduler.map(job, items))
+            kinds = sorted(pool.profile.kind for pool in scheduler.pools.values())
+
+        self.assertEqual(results, [path.upper() for _, path in items])
+        self.assertEqual(kinds, ['hdd', 'ssd'])
+        self.assertTrue(all(name.startswith('io_hdd_') for name in threads['hdd']))
+        self.assertEqual(len(threads['hdd']), 1)
+
+    def test_limiter_backs_off_on_latency(self):
+        """测试延迟升高时并发减半，恢复后逐步增加"""
+        limiter = AdaptiveLimiter(8, window=4)
+        for latency in [1.0] * 4 + [5.0] * 4:
+            limiter.acquire()
+            limiter.release(latency, 64 * 1024)
+        self.assertEqual(limiter.limit, 4)
+        for _ in range(8):
+            limiter.acquire()
+            limiter.release(1.0, 64 * 1024)
+        self.assertEqual(limiter.limit, 6)
+
+    def test_limiter_samples_bytes_actually_read(self):
+        """测试延迟按任务实际读取的字节数归一化，命中哈希缓存的任务不参与采样"""
+        test_dir = tempfile.mkdtemp()
+        use_temp_hash_cache(self, test_dir)
+        try:
+            for name in ('a.bin', 'b.bin'):
+                with open(os.path.join(test_dir, name), 'wb') as f:
+                    f.write(b'same content' * 100)
+            samples = []
+            release = AdaptiveLimiter.release
+
+            def record(limiter, elapsed=None, size=0):
+                samples.append(size if elapsed is not None else None)
+                release(limiter, elapsed, size)
+
+            profile = DeviceProfile(1, 'ssd', 'ext4', 2, 4)
+            with mock.patch.object(AdaptiveLimiter, 'release', record):
+                for _ in range(2):
+                    finder = DuplicateFinder(HashUtils.get_file_hash, sample_size=16)
+                    for name in ('a.bin', 'b.bin'):
+                        finder.add(os.path.join(test_dir, name), 1200)
+                    with DeviceScheduler(2, profile_func=lambda path, dev: profile) as scheduler:
+                        self.assertEqual(len(finder.find_duplicates(scheduler.map)), 1)
+
+            # 第一次：采样只读头尾32字节，完整哈希读整个文件；第二次全部命中缓存
+            self.assertEqual(samples, [32, 32, 1200, 1200] + [None] * 4)
+        finally:
+            shutil.rmtree(test_dir)
+
+    def test_threaded_scanner_uses_device_pools(self):
+        """测试按设备调度时扫描结果与共用线程池一致"""
+        test_dir = tempfile.mkdtemp()
+        try:
+            for name in ('a.txt', 'b.txt', 'c.txt'):
+                with open(os.path.join(test_dir, name), 'w') as f:
+                    f.write('same content' if name != 'c.txt' else 'other content')
+            file_scanner = FileScanner(None)
+            file_scanner.file_filter = FileFilter(SCAN_CONFIG['ignore_patterns'])
+            scanner = ThreadedScanner(file_scanner, max_workers=2)
+            scheduled = scanner.scan_directory(test_dir)
+            self.assertEqual(len(scanner.io_profiles), 1)
+
+            scanner.device_scheduling = False
+            self.assertEqual(scanner.scan_directory(test_dir), scheduled)
+            self.assertEqual(len(scheduled['duplicates']), 1)
+        finally:
+            shutil.rmtree(test_dir)
+
+
+class TestPhysicalReadOrder(unittest.TestCase):
+    def setUp(self):
+        """测试前创建若干文件"""
+        self.test_dir = tempfile.mkdtemp()
+        self.paths = []
+        for i in range(6):
+            path = os.path.join(self.test_dir, f'f{i}.bin')
+            with open(path, 'wb') as f:
+                f.write(b'x' * 4096 if i % 2 else os.urandom(4096))
+            self.paths.append(path)
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.test_dir)
+
+    def test_rotational_order_uses_offsets_then_inodes(self):
+        """测试机械硬盘按物理偏移排序，取不到偏移的文件按inode号排在后面"""
+        offsets = {self.paths[0]: 900, self.paths[3]: 100, self.paths[5]: 500}
+        order = read_order(self.paths, rotational_func=lambda st_dev: True,
+                           offset_func=offsets.get)
+        by_inode = sorted((os.stat(p).st_ino, i) for i, p in enumerate(self.paths)
+                          if p not in offsets)
+        self.assertEqual(order, [3, 5, 0] + [i for _, i in by_inode])
+
+        # 非机械硬盘保持原顺序
+        order = read_order(self.paths, rotational_func=lambda st_dev: False,
+                           offset_func=offsets.get)
+        self.assertEqual(order, list(range(len(self.paths))))
+
+    def test_physical_offset_never_raises(self):
+        """测试不支持FIEMAP或文件不存在时返回None"""
+        offset = physical_offset(self.paths[0])
+        self.assertTrue(offset is None or isinstance(offset, int))
+        self.assertIsNone(physical_offset(os.path.join(self.test_dir, 'missing')))
+
+    def test_order_map_preserves_results(self):
+        """测试按物理顺序计算时结果仍按输入顺序返回，查重结果不变"""
+        mapper = physical_order_map(rotational_func=lambda st_dev: True,
+                                    offset_func=lambda path: -len(path) - self.paths.index(path))
+        items = [(4096, path) for path in self.paths]
+        self.assertEqual(list(mapper(lambda item: item[1], items)), self.paths)
+
+        def find(map_func):
+            finder = DuplicateFinder(HashUtils.get_file_hash, sample_size=16)
+            for path in self.paths:
+                finder.add(path, 4096)
+            return {h: sorted(group) for h, group in finder.find_duplicates(map_func).items()}
+
+        self.assertEqual(find(mapper), find(map))
+        self.assertEqual(len(find(mapper)), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client
+from src.config.settings import SCAN_CONFIG
+from src.core.file_filter import FileFilter
+from src.core.file_scanner import FileScanner
+from src.core.walker import DirectoryWalker
+from src.core.distributed import (
+    ScanCoordinator, ScanWorker, plan_partitions, run_walk_task, start_local_workers
+)
+
+class TestDistributedScan(unittest.TestCase):
+    def setUp(self):
+        """测试前创建分布在多个子树中的重复文件"""
+        self.test_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.test_dir, 'root')
+        for i in range(3):
+            for k in range(2):
+                sub_dir = os.path.join(self.root, f'dir{i}', f'sub{k}')
+                os.makedirs(sub_dir)
+                with open(os.path.join(sub_dir, 'photo.jpg'), 'wb') as f:
+                    f.write(b'same image' * 100)
+                with open(os.path.join(sub_dir, f'notes{i}{k}.txt'), 'w') as f:
+                    f.write(f'unique {i} {k}')
+        with open(os.path.join(self.root, 'top.txt'), 'w') as f:
+            f.write('top file')
+        os.link(os.path.join(self.root, 'top.txt'), os.path.join(self.root, 'dir0', 'link.txt'))
+        self.scanner = FileScanner(ai_models=None)
+        self.scanner.file_filter = FileFilter(SCAN_CONFIG['ignore_patterns'])
+        self.scanner.checkpoint_enabled = False
+        self.threads = []
+
+    def tearDown(self):
+        """测试后清理"""
+        for thread in self.threads:
+            thread.join(5)
+        shutil.rmtree(self.test_dir)
+
+    def _start_thread(self, target):
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def test_partitions_cover_tree_in_order(self):
+        """测试按顺序连接各分区的遍历结果与完整遍历一致"""
+        partitions = plan_partitions(self.root, 6)
+        self.assertGreaterEqual(len(partitions), 6)
+        paths = []
+        for path, recursive in partitions:
+            task = run_walk_task(self.scanner, path, recursive, 0)
+            paths.extend(p for p, _ in task['entries'])
+        self.assertEqual(paths, [e.path for e in DirectoryWalker().walk(self.root)])
+
+    def test_local_worker_processes(self):
+        """测试本机工作进程通过TCP完成扫描，结果与单机扫描一致"""
+        expected = self.scanner.scan_directory(self.root)
+        with ScanCoordinator(self.scanner, ('127.0.0.1', 0)) as coordinator:
+            processes = start_local_workers(coordinator.address, coordinator.authkey, 2)
+            self.assertTrue(coordinator.wait_for_workers(2, timeout=60))
+            results = coordinator.scan_directory(self.root)
+        for process in processes:
+            process.join(10)
+
+        self.assertEqual(results, expected)
+        self.assertEqual(len(results['duplicates']), 1)
+        self.assertEqual(len(results['hardlinks']), 1)
+
+    def test_silent_client_does_not_block_workers(self):
+        """测试连接后不发送数据的客户端不阻塞其他节点接入，握手超时后被断开"""
+        coordinator = ScanCoordinator(self.scanner, ('127.0.0.1', 0), handshake_timeout=0.5)
+        silent = socket.create_connection(coordinator.address)
+        try:
+            conn = Client(coordinator.address, authkey=coordinator.authkey)
+            self.assertTrue(coordinator.wait_for_workers(1, timeout=5))
+            conn.close()
+
+            # 协调者只发出认证挑战，超时后关闭连接
+            silent.settimeout(5)
+            while silent.recv(1024):
+                pass
+        finally:
+            silent.close()
+            started = time.monotonic()
+            coordinator.close()
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_failed_and_slow_workers_are_redispatched(self):
+        """测试节点断开或超时未返回时任务被重新分配"""
+        expected = self.scanner.scan_directory(self.root)
+        address = os.path.join(self.test_dir, 'coordinator.sock')
+        with ScanCoordinator(self.scanner, address, task_timeout=0.5) as coordinator:
+            def crashing_worker():
+                conn = Client(coordinator.address, authkey=coordinator.authkey)
+                conn.recv()
+                conn.close()
+
+            def stuck_worker():
+                conn = Client(coordinator.address, authkey=coordinator.authkey)
+                conn.recv()
+                # 不返回结果，直到协调者关闭连接
+                try:
+                    conn.recv()
+                except EOFError:
+                    pass
+
+            self._start_thread(crashing_worker)
+            self._start_thread(stuck_worker)
+            self.assertTrue(coordinator.wait_for_workers(2, timeout=5))
+            self._start_thread(ScanWorker(coordinator.address, coordinator.authkey,
+                                          self.scanner).run)
+            results = coordinator.scan_directory(self.root)
+
+        self.assertEqual(results, expected)
+        self.assertGreaterEqual(coordinator.stats['redispatched'], 2)
+        self.assertEqual(coordinator.stats['failed'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
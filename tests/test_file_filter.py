@@ -0,0 +1,64 @@
+import unittest
+import os
+import shutil
+import tempfile
+from src.core.file_filter import FileFilter
+from src.core.walker import DirectoryWalker, ParallelWalker
+
+class TestFileFilter(unittest.TestCase):
+    def setUp(self):
+        """测试前创建包含应被忽略内容的目录树"""
+        self.test_dir = tempfile.mkdtemp()
+        files = {
+            'keep.txt': b'x' * 100,
+            'tiny.txt': b'x',
+            'huge.bin': b'x' * 5000,
+            'notes.tmp': b'x' * 100,
+            '.hidden': b'x' * 100,
+            '.git/config': b'x' * 100,
+            'node_modules/pkg/index.js': b'x' * 100,
+            'src/main.py': b'x' * 100,
+            'src/build/out.o': b'x' * 100,
+        }
+        for name, data in files.items():
+            path = os.path.join(self.test_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+        self.filter = FileFilter(['.*', '*.tmp', 'node_modules', '*/src/build'],
+                                 min_size=10, max_size=1000)
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.test_dir)
+
+    def _names(self, walker):
+        return sorted(os.path.relpath(e.path, self.test_dir) for e in walker.walk(self.test_dir))
+
+    def test_walk_applies_patterns_and_sizes(self):
+        """测试遍历时按模式剪枝并按大小排除"""
+        expected = ['keep.txt', os.path.join('src', 'main.py')]
+        self.assertEqual(self._names(DirectoryWalker(file_filter=self.filter)), expected)
+        self.assertEqual(self._names(ParallelWalker(max_workers=2, file_filter=self.filter)), expected)
+
+    def test_excluded_directories_are_not_listed(self):
+        """测试被排除的目录不会被进入"""
+        blocked = os.path.join(self.test_dir, 'node_modules')
+        os.chmod(blocked, 0)
+        try:
+            errors = []
+            list(DirectoryWalker(file_filter=self.filter).walk(
+                self.test_dir, on_error=lambda p, e: errors.append(p)))
+            self.assertEqual(errors, [])
+        finally:
+            os.chmod(blocked, 0o755)
+
+    def test_system_files(self):
+        """测试不扫描系统文件时跳过系统目录和文件"""
+        no_system = FileFilter(scan_system_files=False)
+        self.assertFalse(no_system.allow_directory('/data/lost+found', 'lost+found'))
+        self.assertFalse(no_system.allow_name('C:\\pagefile.sys', 'pagefile.sys'))
+        self.assertTrue(FileFilter().allow_name('C:\\pagefile.sys', 'pagefile.sys'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+from src.utils.hash_cache import COMMIT_INTERVAL, HashCache
+
+class TestHashCache(unittest.TestCase):
+    def setUp(self):
+        """测试前准备"""
+        self.test_dir = tempfile.mkdtemp()
+        self.cache = HashCache(os.path.join(self.test_dir, 'cache.db'), max_entries=10)
+        self.compute_calls = 0
+        
+        self.test_file = os.path.join(self.test_dir, 'test.txt')
+        with open(self.test_file, 'w') as f:
+            f.write('test content')
+            
+    def tearDown(self):
+        """测试后清理"""
+        self.cache.close()
+        shutil.rmtree(self.test_dir)
+        
+    def compute(self, path):
+        """记录调用次数的哈希函数"""
+        self.compute_calls += 1
+        with open(path, 'rb') as f:
+            return str(len(f.read()))
+            
+    def test_repeat_lookup_skips_reading(self):
+        """测试文件未变化时不再读取内容"""
+        first = self.cache.get_or_compute(self.test_file, 'md5', self.compute)
+        second = self.cache.get_or_compute(self.test_file, 'md5', self.compute)
+        
+        self.assertEqual(first, second)
+        self.assertEqual(self.compute_calls, 1)
+        self.assertEqual(self.cache.hits, 1)
+        
+    def test_modified_file_is_rehashed(self):
+        """测试修改时间变化后缓存失效"""
+        self.cache.get_or_compute(self.test_file, 'md5', self.compute)
+        st = os.stat(self.test_file)
+        os.utime(self.test_file, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+        
+        self.cache.get_or_compute(self.test_file, 'md5', self.compute)
+        
+        self.assertEqual(self.compute_calls, 2)
+        
+    def test_algorithm_is_part_of_key(self):
+        """测试不同算法的哈希互不干扰"""
+        self.cache.get_or_compute(self.test_file, 'md5', self.compute)
+        self.cache.get_or_compute(self.test_file, 'sha256', self.compute)
+        
+        self.assertEqual(self.compute_calls, 2)
+        
+    def test_many_algorithms_compute_only_missing(self):
+        """测试多个算法只对未命中的算法计算一次"""
+        self.cache.get_or_compute(self.test_file, 'md5', self.compute)
+        requested = []
+
+        def compute_many(path, algorithms):
+            requested.append(algorithms)
+            return {algorithm: self.compute(path) for algorithm in algorithms}
+
+        first = self.cache.get_or_compute_many(self.test_file, ['md5', 'sha256'], compute_many)
+        second = self.cache.get_or_compute_many(self.test_file, ['md5', 'sha256'], compute_many)
+
+        self.assertEqual(first, second)
+        self.assertEqual(requested, [['sha256']])
+
+    def test_eviction_bounds_size(self):
+        """测试超过容量时淘汰最旧条目"""
+        st = os.stat(self.test_file)
+        for i in range(30):
+            self.cache.put(st, f'algo{i}', 'digest')
+        self.cache.flush()
+        
+        self.assertLessEqual(len(self.cache), 10)
+        self.assertIsNotNone(self.cache.get(st, 'algo29'))
+        self.assertIsNone(self.cache.get(st, 'algo0'))
+        
+    def test_hits_update_last_used_in_batches(self):
+        """测试命中不逐次写数据库，使用时间在提交时批量写入"""
+        st = os.stat(self.test_file)
+        self.cache.put(st, 'md5', 'digest')
+        self.cache.flush()
+        conn = self.cache._conn
+        last_used = conn.execute('SELECT last_used FROM file_hashes').fetchone()[0]
+        changes = conn.total_changes
+
+        for _ in range(COMMIT_INTERVAL * 2):
+            self.assertEqual(self.cache.get(st, 'md5'), 'digest')
+        self.assertEqual(conn.total_changes, changes)
+
+        self.cache.flush()
+        self.assertEqual(conn.total_changes, changes + 1)
+        self.assertGreater(conn.execute('SELECT last_used FROM file_hashes').fetchone()[0], last_used)
+
+    def test_concurrent_access(self):
+        """测试多线程并发访问"""
+        st = os.stat(self.test_file)
+        errors = []
+        
+        def worker(n):
+            try:
+                for i in range(50):
+                    self.cache.put(st, f'w{n}', str(i))
+                    self.cache.get(st, f'w{n}')
+            except Exception as e:
+                errors.append(e)
+                
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+            
+        self.assertEqual(errors, [])
+        self.assertEqual(self.cache.get(st, 'w3'), '49')
+
+if __name__ == '__main__':
+    unittest.main()
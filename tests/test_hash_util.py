@@ -0,0 +1,100 @@
+import unittest
+import os
+import io
+import hashlib
+import tempfile
+import shutil
+from unittest import mock
+from src.utils.hash_util import HashUtils, MultiHasher
+
+class TestHashUtils(unittest.TestCase):
+    def setUp(self):
+        """测试前准备"""
+        self.test_dir = tempfile.mkdtemp()
+        self.content = os.urandom(300 * 1024 + 7)
+        self.test_file = os.path.join(self.test_dir, 'data.bin')
+        with open(self.test_file, 'wb') as f:
+            f.write(self.content)
+        self.expected = hashlib.sha256(self.content).hexdigest()
+        
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.test_dir)
+        
+    def hash_with(self, f, **kwargs):
+        """使用update_from_file计算SHA256"""
+        hasher = hashlib.sha256()
+        HashUtils.update_from_file(hasher, f, chunk_size=64 * 1024, **kwargs)
+        return hasher.hexdigest()
+        
+    def test_mmap_path(self):
+        """测试大文件走mmap路径的结果正确"""
+        with open(self.test_file, 'rb') as f:
+            self.assertEqual(self.hash_with(f, mmap_threshold=1), self.expected)
+            
+    def test_readinto_path(self):
+        """测试预分配缓冲区的readinto路径结果正确"""
+        with open(self.test_file, 'rb', buffering=0) as f:
+            self.assertEqual(self.hash_with(f), self.expected)
+            
+    def test_truncated_while_hashing(self):
+        """测试默认路径上文件在哈希过程中被截断时只得到已读部分，不会崩溃"""
+        calls = []
+
+        def truncate_after_first_chunk(size):
+            calls.append(size)
+            if len(calls) == 2:
+                os.truncate(self.test_file, 0)
+
+        with open(self.test_file, 'rb', buffering=0) as f:
+            self.assertEqual(self.hash_with(f, throttle=truncate_after_first_chunk),
+                             hashlib.sha256(self.content[:64 * 1024]).hexdigest())
+
+    def test_non_file_fallback(self):
+        """测试没有文件描述符的对象退回普通读取"""
+        self.assertEqual(self.hash_with(io.BytesIO(self.content), mmap_threshold=1), self.expected)
+        
+    def test_special_file_fallback(self):
+        """测试管道等特殊文件不使用mmap"""
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, b'pipe data')
+        os.close(write_fd)
+        with os.fdopen(read_fd, 'rb', buffering=0) as f:
+            self.assertEqual(self.hash_with(f, mmap_threshold=1),
+                             hashlib.sha256(b'pipe data').hexdigest())
+            
+    def test_get_file_hash_algorithms(self):
+        """测试各算法的文件哈希与直接计算一致"""
+        self.assertEqual(HashUtils.get_file_hash(self.test_file, 'sha256'), self.expected)
+        self.assertEqual(HashUtils.get_file_hash(self.test_file, 'md5'),
+                         hashlib.md5(self.content).hexdigest())
+        with self.assertRaises(IOError):
+            HashUtils.get_file_hash(self.test_file, 'crc32')
+
+    def test_multiple_digests_in_one_pass(self):
+        """测试一次读取计算多个摘要，顺序和多线程两种方式结果与单独计算一致"""
+        expected = {
+            'md5': hashlib.md5(self.content).hexdigest(),
+            'sha256': self.expected,
+            'xxh3_128': HashUtils.calculate_hash(self.content, 'xxh3_128'),
+        }
+        for threaded in (False, True):
+            with open(self.test_file, 'rb', buffering=0) as f:
+                self.assertEqual(HashUtils.calculate_hashes(f, ['MD5', 'sha256', 'xxh3_128', 'md5'],
+                                                            threaded=threaded), expected)
+            # mmap路径上各线程共享只读的映射切片
+            with open(self.test_file, 'rb') as f, MultiHasher(list(expected), threaded) as hasher:
+                HashUtils.update_from_file(hasher, f, chunk_size=64 * 1024, mmap_threshold=1)
+                self.assertEqual(hasher.hexdigests(), expected)
+
+        with mock.patch.object(HashUtils, 'update_from_file',
+                               wraps=HashUtils.update_from_file) as reads:
+            digests = HashUtils.get_file_hashes(self.test_file, ['md5', 'sha256', 'xxh3_128'],
+                                                threaded=True)
+        self.assertEqual(digests, expected)
+        self.assertEqual(reads.call_count, 1)
+        with self.assertRaises(IOError):
+            HashUtils.get_file_hashes(self.test_file, ['md5', 'crc32'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+import os
+import time
+import shutil
+import sqlite3
+import tempfile
+from src.core.walker import DirectoryWalker
+from src.core.incremental import IncrementalWalker
+from src.core.file_scanner import FileScanner
+
+class TestIncrementalWalker(unittest.TestCase):
+    def setUp(self):
+        """测试前创建目录树，并把目录修改时间设为过去以避开时间精度窗口"""
+        self.test_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.test_dir, 'root')
+        self.state_path = os.path.join(self.test_dir, 'state.db')
+        for i in range(3):
+            sub_dir = os.path.join(self.root, f'dir{i}')
+            os.makedirs(sub_dir)
+            for k in range(4):
+                with open(os.path.join(sub_dir, f'file{k}.txt'), 'w') as f:
+                    f.write(f'{i}-{k}')
+        self.past = time.time() - 3600
+        for current, _, _ in os.walk(self.root):
+            self._age(current)
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.test_dir)
+
+    def _age(self, path, offset=0):
+        os.utime(path, (self.past + offset, self.past + offset))
+
+    def _snapshot(self, walker):
+        return [(e.path, e.size, e.stat.st_mtime_ns) for e in walker.walk(self.root)]
+
+    def test_unchanged_tree_is_not_relisted(self):
+        """测试目录未变化时复用上次的列表，结果与完整遍历一致"""
+        walker = IncrementalWalker(self.state_path)
+        first = self._snapshot(walker)
+        self.assertEqual(walker.stats['dirs_listed'], 4)
+
+        second = self._snapshot(walker)
+        self.assertEqual(walker.stats, {'dirs_listed': 0, 'dirs_reused': 4})
+        self.assertEqual(second, first)
+        self.assertEqual(second, self._snapshot(DirectoryWalker()))
+
+    def test_symlink_loop_is_walked_once(self):
+        """测试跟随符号链接时符号链接环不会无限遍历"""
+        os.symlink('..', os.path.join(self.root, 'dir0', 'loop'))
+        self._age(os.path.join(self.root, 'dir0'))
+        walker = IncrementalWalker(self.state_path, follow_symlinks=True)
+
+        first = self._snapshot(walker)
+        self.assertEqual(len(first), 12)
+        self.assertEqual(first, self._snapshot(DirectoryWalker(follow_symlinks=True)))
+        self.assertEqual(self._snapshot(walker), first)
+        self.assertEqual(walker.stats, {'dirs_listed': 0, 'dirs_reused': 4})
+
+    def test_old_state_schema_is_rebuilt(self):
+        """测试旧版本多出entry_count列的状态库被重建后照常使用"""
+        conn = sqlite3.connect(self.state_path)
+        conn.execute('''
+            CREATE TABLE directories (
+                path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, ino INTEGER NOT NULL,
+                listed_at INTEGER NOT NULL, entry_count INTEGER NOT NULL,
+                filter_key TEXT NOT NULL, subdirs TEXT NOT NULL, files TEXT NOT NULL,
+                scan_id INTEGER NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+        walker = IncrementalWalker(self.state_path)
+        first = self._snapshot(walker)
+        self.assertEqual(self._snapshot(walker), first)
+        self.assertEqual(walker.stats['dirs_reused'], 4)
+
+    def test_changed_directory_is_relisted(self):
+        """测试新增和删除文件只会重新列出所在目录"""
+        walker = IncrementalWalker(self.state_path)
+        self._snapshot(walker)
+        with open(os.path.join(self.root, 'dir1', 'new.txt'), 'w') as f:
+            f.write('new')
+        shutil.rmtree(os.path.join(self.root, 'dir2'))
+        self._age(os.path.join(self.root, 'dir1'), 60)
+        self._age(self.root, 60)
+
+        result = self._snapshot(walker)
+        self.assertEqual(walker.stats, {'dirs_listed': 2, 'dirs_reused': 1})
+        self.assertEqual(result, self._snapshot(DirectoryWalker()))
+
+        # 已删除目录的记录被清理
+        with sqlite3.connect(self.state_path) as conn:
+            paths = [row[0] for row in conn.execute('SELECT path FROM directories')]
+        self.assertNotIn(os.path.join(self.root, 'dir2'), paths)
+
+    def test_in_place_modification(self):
+        """测试原地修改的文件：strict模式能发现，trust模式复用旧的stat"""
+        target = os.path.join(self.root, 'dir0', 'file0.txt')
+        strict = IncrementalWalker(self.state_path)
+        self._snapshot(strict)
+        with open(target, 'w') as f:
+            f.write('modified content')
+
+        trusted = self._snapshot(IncrementalWalker(self.state_path, verify='trust'))
+        self.assertEqual(dict((p, s) for p, s, _ in trusted)[target], 3)
+
+        result = self._snapshot(strict)
+        self.assertEqual(strict.stats['dirs_listed'], 0)
+        self.assertEqual(result, self._snapshot(DirectoryWalker()))
+
+    def test_recently_modified_directory_is_relisted(self):
+        """测试修改时间落在时间精度窗口内的目录总是重新列出"""
+        walker = IncrementalWalker(self.state_path)
+        os.utime(os.path.join(self.root, 'dir0'))
+        self._snapshot(walker)
+        self._snapshot(walker)
+        self.assertEqual(walker.stats, {'dirs_listed': 1, 'dirs_reused': 3})
+
+    def test_scanner_incremental_matches_full_scan(self):
+        """测试增量扫描的结果与完整扫描一致"""
+        scanner = FileScanner(ai_models=None)
+        scanner.incremental_walker.state_path = self.state_path
+        full = scanner.scan_directory(self.root)
+
+        self.assertEqual(scanner.scan_directory(self.root, incremental=True), full)
+        self.assertEqual(scanner.scan_directory(self.root, incremental=True), full)
+        self.assertEqual(scanner.incremental_walker.stats['dirs_reused'], 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,8 @@ import unittest
 import os
 import shutil
 import tempfile
+from src.config.settings import SCAN_CONFIG
+from src.core.file_filter import FileFilter
 from src.core.file_scanner import FileScanner
 from src.core.threaded_scanner import ThreadedScanner
 
@@ -23,6 +25,8 @@ class TestScanner(unittest.TestCase):
         self.test_dir = tempfile.mkdtemp()
         self.ai_models = MockAIModels()
         self.scanner = FileScanner(self.ai_models)
+        # 测试文件都小于默认的最小文件大小
+        self.scanner.file_filter = FileFilter(SCAN_CONFIG['ignore_patterns'])
         self.threaded_scanner = ThreadedScanner(self.scanner)
         
         # 创建测试文件
@@ -0,0 +1,70 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from src.config.settings import SCAN_CONFIG
+from src.core.file_filter import FileFilter
+from src.core.file_scanner import FileScanner
+from src.core.result_store import FileRecordStore
+
+class TestFileRecordStore(unittest.TestCase):
+    def setUp(self):
+        """测试前创建临时测试目录和文件"""
+        self.test_dir = tempfile.mkdtemp()
+        self.scanner = FileScanner(None)
+        self.scanner.file_filter = FileFilter(SCAN_CONFIG['ignore_patterns'])
+        
+        sub_dir = os.path.join(self.test_dir, 'sub')
+        os.mkdir(sub_dir)
+        for directory in (self.test_dir, sub_dir):
+            with open(os.path.join(directory, 'same.txt'), 'w') as f:
+                f.write('duplicate content')
+        with open(os.path.join(sub_dir, 'photo.jpg'), 'wb') as f:
+            f.write(b'\xff' * 200 * 1024)
+        old_file = os.path.join(sub_dir, 'old.pdf')
+        with open(old_file, 'w') as f:
+            f.write('old')
+        old_time = time.time() - 400 * 24 * 60 * 60
+        os.utime(old_file, (old_time, old_time))
+        
+    def tearDown(self):
+        """测试后清理临时文件"""
+        shutil.rmtree(self.test_dir)
+        
+    def test_adapter_matches_dict_results(self):
+        """测试兼容视图与原有字典结果一致"""
+        expected = self.scanner.scan_directory(self.test_dir)
+        view = self.scanner.scan_to_store(self.test_dir).as_results()
+        
+        self.assertEqual(set(view.keys()), set(expected.keys()))
+        for key in ('duplicates', 'classified_files', 'large_files', 'old_files', 'errors'):
+            self.assertEqual(view[key], expected[key])
+            
+    def test_directories_are_interned(self):
+        """测试同一目录只保存一次"""
+        store = self.scanner.scan_to_store(self.test_dir)
+        
+        self.assertEqual(len(store), 4)
+        self.assertEqual(len(store.directories), 2)
+        
+    def test_columns_support_vectorized_queries(self):
+        """测试列视图支持向量化统计"""
+        store = self.scanner.scan_to_store(self.test_dir)
+        
+        totals = store.category_sizes()
+        self.assertEqual(totals['images'], 200 * 1024)
+        self.assertEqual(totals['documents'], 2 * len('duplicate content') + 3)
+        self.assertEqual(int(store.size_column().sum()), sum(totals.values()))
+        
+    def test_manual_records(self):
+        """测试直接添加记录和下标视图"""
+        store = FileRecordStore(['images'])
+        index = store.add('/data/a.png', 10, 0.0, 'images')
+        store.add('/data/b.bin', 20, 0.0)
+        
+        self.assertEqual(store.path(index), '/data/a.png')
+        self.assertEqual(list(store.category_indices('images')), [index])
+
+if __name__ == '__main__':
+    unittest.main()
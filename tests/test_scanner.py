@@ -2,8 +2,16 @@ import unittest
 import os
 import shutil
 import tempfile
+import time
+from unittest import mock
+from src.config.settings import SCAN_CONFIG
+from src.core.file_filter import FileFilter
 from src.core.file_scanner import FileScanner
 from src.core.threaded_scanner import ThreadedScanner
+from src.core.file_optimizer import FileOptimizer
+from src.core.scan_events import FILE_DISCOVERED, LARGE_FILE, DUPLICATE_GROUP
+from src.utils.hash_util import HashUtils
+from tests import use_temp_hash_cache
 
 # 创建一个AI模型的模拟对象
 class MockAIModels:
@@ -23,6 +31,8 @@ class TestScanner(unittest.TestCase):
         self.test_dir = tempfile.mkdtemp()
         self.ai_models = MockAIModels()
         self.scanner = FileScanner(self.ai_models)
+        # 测试文件都小于默认的最小文件大小
+        self.scanner.file_filter = FileFilter(SCAN_CONFIG['ignore_patterns'])
         self.threaded_scanner = ThreadedScanner(self.scanner)
         
         # 创建测试文件
@@ -73,6 +83,35 @@ class TestScanner(unittest.TestCase):
         self.assertIn('large_files', results)
         self.assertIn('classified_files', results)
         
+        # 只有真正重复的文件才会出现在结果中
+        duplicate_count = sum(len(files) for files in results['duplicates'].values())
+        self.assertEqual(duplicate_count, 2)
+        
+    def test_threaded_scan_processes_all_queued_files(self):
+        """测试有界队列下遍历结束时已排队的文件全部被处理"""
+        for i in range(200):
+            with open(os.path.join(self.test_dir, f'extra{i}.txt'), 'w') as f:
+                f.write(f'extra {i}')
+        self.threaded_scanner.queue_size = 2
+        
+        results = self.threaded_scanner.scan_directory(self.test_dir)
+        
+        self.assertEqual(len(results['classified_files']['documents']), 204)
+        self.assertTrue(self.threaded_scanner.file_queue.empty())
+        
+    def test_hardlinks_reported_separately(self):
+        """测试硬链接单独报告，不算作重复文件"""
+        original = os.path.join(self.test_dir, 'test1.txt')
+        link = os.path.join(self.test_dir, 'test1-link.txt')
+        os.link(original, link)
+        
+        for scanner in (self.scanner, self.threaded_scanner):
+            results = scanner.scan_directory(self.test_dir)
+            self.assertEqual([sorted(files) for files in results['hardlinks'].values()],
+                             [sorted([original, link])])
+            duplicate_count = sum(len(files) for files in results['duplicates'].values())
+            self.assertEqual(duplicate_count, 2)
+        
     def test_file_classification(self):
         """测试文件分类功能"""
         results = self.scanner.scan_directory(self.test_dir)
@@ -82,6 +121,74 @@ class TestScanner(unittest.TestCase):
         txt_files = results['classified_files']['documents']
         self.assertTrue(any(f.endswith('.txt') for f in txt_files))
         
+    def test_old_file_detection(self):
+        """测试旧文件检测使用遍历时的stat结果"""
+        old_path = os.path.join(self.test_dir, 'test1.txt')
+        old_time = time.time() - 365 * 24 * 60 * 60
+        os.utime(old_path, (old_time, old_time))
+        
+        results = self.scanner.scan_directory(self.test_dir)
+        
+        old_paths = [f['path'] for f in results['old_files']]
+        self.assertEqual(old_paths, [old_path])
+        
+    def test_walker_visits_subdirectories(self):
+        """测试scandir遍历器覆盖子目录中的文件"""
+        sub_dir = os.path.join(self.test_dir, 'sub', 'deeper')
+        os.makedirs(sub_dir)
+        nested = os.path.join(sub_dir, 'nested.txt')
+        with open(nested, 'w') as f:
+            f.write('nested')
+        
+        entries = {e.path: e for e in self.scanner.walker.walk(self.test_dir)}
+        
+        self.assertEqual(len(entries), 6)
+        self.assertEqual(entries[nested].size, 6)
+        self.assertEqual(entries[nested].extension, '.txt')
+        
+    def test_configurable_hash_algorithm(self):
+        """测试重复检测使用配置的哈希算法"""
+        use_temp_hash_cache(self, self.test_dir)
+        self.scanner.hash_algorithm = 'xxh3_64'
+        results = self.scanner.scan_directory(self.test_dir)
+        self.assertEqual([len(k) for k in results['duplicates']], [16])
+        
+        # 加密校验模式下以SHA-256摘要作为分组键，校验哈希与快速哈希在同一次读取中算出
+        self.scanner.verify_duplicates = True
+        with mock.patch.object(HashUtils, '_compute_file_hash',
+                               wraps=HashUtils._compute_file_hash) as single:
+            results = self.scanner.scan_directory(self.test_dir)
+        self.assertEqual([len(k) for k in results['duplicates']], [64])
+        self.assertEqual(sum(len(v) for v in results['duplicates'].values()), 2)
+        single.assert_not_called()
+        
+    def test_iter_scan_streams_events(self):
+        """测试流式扫描按类型产出事件，且与一次性扫描结果一致"""
+        events = list(self.scanner.iter_scan(self.test_dir))
+        types = [event.type for event in events]
+        
+        self.assertEqual(types.count(FILE_DISCOVERED), 5)
+        self.assertEqual(types.count(LARGE_FILE), 1)
+        # 逐文件事件先于需要全局信息的重复分组事件
+        self.assertEqual(types[0], FILE_DISCOVERED)
+        self.assertEqual(types[-1], DUPLICATE_GROUP)
+        
+        results = self.scanner.new_results()
+        for event in events:
+            self.scanner.collect_event(results, event)
+        self.assertEqual(results['duplicates'], self.scanner.scan_directory(self.test_dir)['duplicates'])
+        
+        suggestions = list(FileOptimizer().iter_suggestions(events))
+        self.assertEqual([s['type'] for s in suggestions], ['large_file', 'duplicate'])
+        
+    def test_threaded_iter_scan(self):
+        """测试多线程流式扫描"""
+        events = list(self.threaded_scanner.iter_scan(self.test_dir))
+        
+        groups = [event.data[1] for event in events if event.type == DUPLICATE_GROUP]
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(len(groups[0]), 2)
+        
     def test_error_handling(self):
         """测试错误处理"""
         # 测试不存在的目录
@@ -0,0 +1,131 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+import time
+from src.core.file_scanner import FileScanner
+from src.core.threaded_scanner import ThreadedScanner
+from src.core.throttle import (
+    IOPRIO_CLASS_IDLE, IOPRIO_CLASS_SHIFT, ResourceGovernor, ScanThrottle, TokenBucket,
+    get_io_priority, idle_io_priority, set_idle_io_priority
+)
+
+class TestLimiters(unittest.TestCase):
+    def test_token_bucket_waits_for_debt(self):
+        """测试令牌用完后按欠下的令牌数等待"""
+        now = [0.0]
+        waits = []
+        bucket = TokenBucket(100, clock=lambda: now[0], sleep=waits.append)
+        self.assertEqual(bucket.consume(100), 0)
+        self.assertAlmostEqual(bucket.consume(50), 0.5)
+        # 并发的第二个请求排在前一个之后
+        self.assertAlmostEqual(bucket.consume(50), 1.0)
+        now[0] = 2.0
+        self.assertEqual(bucket.consume(50), 0)
+        self.assertEqual(len(waits), 2)
+
+    def test_governor_scales_workers(self):
+        """测试负载超限时并发数减半，恢复后逐个增加，名额不超过并发数"""
+        samples = [(0.95, 0.1, 0.0), (0.1, 0.9, 0.0), (0.1, 0.1, 0.95), (0.1, 0.1, 0.1)]
+        governor = ResourceGovernor(8, sample_func=lambda: samples.pop(0))
+        self.assertEqual([governor.adjust() for _ in range(4)], [4, 2, 1, 2])
+
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def job():
+            with governor.slot():
+                with lock:
+                    active.append(1)
+                    peak.append(len(active))
+                time.sleep(0.01)
+                with lock:
+                    active.pop()
+
+        threads = [threading.Thread(target=job) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(max(peak), 2)
+
+    @unittest.skipIf(get_io_priority() is None, 'ioprio is not supported')
+    def test_idle_io_priority_is_per_thread(self):
+        """测试idle I/O优先级只作用于调用线程，退出with块后恢复"""
+        before = get_io_priority()
+        results = {}
+
+        def worker():
+            results['set'] = set_idle_io_priority()
+            results['class'] = get_io_priority() >> IOPRIO_CLASS_SHIFT
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        self.assertEqual(results, {'set': True, 'class': IOPRIO_CLASS_IDLE})
+        self.assertEqual(get_io_priority(), before)
+
+        with idle_io_priority() as changed:
+            self.assertTrue(changed)
+            self.assertEqual(get_io_priority() >> IOPRIO_CLASS_SHIFT, IOPRIO_CLASS_IDLE)
+        self.assertEqual(get_io_priority(), before)
+
+
+class CountingThrottle(ScanThrottle):
+    """记录读取字节数和stat次数"""
+
+    def __init__(self, **kwargs):
+        super().__init__(read_rate=1 << 40, stat_rate=1 << 20, max_workers=2, **kwargs)
+        self.bytes_read = 0
+        self.stats = 0
+        self._count_lock = threading.Lock()
+
+    def read(self, nbytes):
+        with self._count_lock:
+            self.bytes_read += nbytes
+        super().read(nbytes)
+
+    def stat(self, count=1):
+        self.stats += count
+        super().stat(count)
+
+
+class TestThrottledScan(unittest.TestCase):
+    def setUp(self):
+        """测试前创建包含重复文件的目录"""
+        self.test_dir = tempfile.mkdtemp()
+        for i in range(3):
+            with open(os.path.join(self.test_dir, f'copy{i}.bin'), 'wb') as f:
+                f.write(b'x' * 20000)
+        with open(os.path.join(self.test_dir, 'other.bin'), 'wb') as f:
+            f.write(b'y' * 20000)
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.test_dir)
+
+    def test_throttled_scan_matches_normal_scan(self):
+        """测试节流扫描的结果与普通扫描一致，读取和stat都经过限速"""
+        scanner = FileScanner(ai_models=None)
+        throttle = CountingThrottle(governor_options={'interval': 0.01})
+        scanner.throttle = throttle
+        # 先进行节流扫描，避免哈希缓存命中后不再读取文件
+        throttled = scanner.scan_directory(self.test_dir)
+        self.assertEqual(throttle.stats, 4)
+        self.assertGreater(throttle.bytes_read, 0)
+        self.assertIsNone(throttle.governor._thread)
+
+        scanner.throttle = None
+        expected = scanner.scan_directory(self.test_dir)
+        self.assertEqual(throttled, expected)
+        scanner.throttle = throttle
+
+        threaded = ThreadedScanner(scanner, max_workers=2)
+        self.assertEqual(threaded.scan_directory(self.test_dir)['duplicates'],
+                         expected['duplicates'])
+        self.assertEqual(throttle.stats, 8)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from src.core.walker import DirectoryWalker, ParallelWalker
+
+class TestWalker(unittest.TestCase):
+    def setUp(self):
+        """测试前创建多层目录树"""
+        self.test_dir = tempfile.mkdtemp()
+        for i in range(4):
+            for j in range(3):
+                sub_dir = os.path.join(self.test_dir, f'dir{i}', f'sub{j}')
+                os.makedirs(sub_dir)
+                for k in range(5):
+                    with open(os.path.join(sub_dir, f'file{k}.txt'), 'w') as f:
+                        f.write(f'{i}-{j}-{k}')
+        with open(os.path.join(self.test_dir, 'root.txt'), 'w') as f:
+            f.write('root')
+            
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.test_dir)
+        
+    def test_deterministic_order_matches_sequential(self):
+        """测试确定性模式下输出顺序与顺序遍历一致"""
+        expected = [e.path for e in DirectoryWalker().walk(self.test_dir)]
+        walker = ParallelWalker(max_workers=4, deterministic=True)
+        
+        for _ in range(3):
+            self.assertEqual([e.path for e in walker.walk(self.test_dir)], expected)
+            
+    def test_unordered_mode_finds_all_files(self):
+        """测试非确定性模式覆盖全部文件"""
+        expected = sorted(e.path for e in DirectoryWalker().walk(self.test_dir))
+        walker = ParallelWalker(max_workers=3)
+        
+        self.assertEqual(sorted(e.path for e in walker.walk(self.test_dir)), expected)
+        self.assertEqual(len(expected), 61)
+        
+    def test_errors_reported_on_caller_thread(self):
+        """测试无法访问的路径通过回调报告"""
+        errors = []
+        missing = os.path.join(self.test_dir, 'missing')
+        
+        entries = list(ParallelWalker(max_workers=2).walk(missing, on_error=lambda p, e: errors.append(p)))
+        
+        self.assertEqual(entries, [])
+        self.assertEqual(errors, [missing])
+        
+    def test_deterministic_buffer_is_bounded(self):
+        """测试确定性模式下调用方较慢时，等待重放的列出结果不超过上限"""
+        for i in range(40):
+            os.makedirs(os.path.join(self.test_dir, 'wide', f'd{i:02d}'))
+        buffered = []
+
+        class RecordingWalker(ParallelWalker):
+            def _emit(self, state, listing):
+                super()._emit(state, listing)
+                buffered.append(len(state.listings))
+
+        expected = [e.path for e in DirectoryWalker().walk(self.test_dir)]
+        walker = RecordingWalker(max_workers=4, deterministic=True, output_size=2)
+        paths = []
+        for entry in walker.walk(self.test_dir):
+            paths.append(entry.path)
+            time.sleep(0.001)
+
+        self.assertEqual(paths, expected)
+        # 达到上限时仍在列出的目录最多每个线程一个
+        self.assertLessEqual(max(buffered), 2 + 4)
+
+    def test_symlink_loops_are_walked_once(self):
+        """测试跟随符号链接时符号链接环和指向同一目录的链接只遍历一次"""
+        os.symlink('..', os.path.join(self.test_dir, 'dir0', 'sub0', 'loop'))
+        os.symlink(os.path.join(self.test_dir, 'dir1'), os.path.join(self.test_dir, 'alias'))
+        os.symlink(self.test_dir, os.path.join(self.test_dir, 'dir2', 'root'))
+        expected = [e.path for e in DirectoryWalker(follow_symlinks=True).walk(self.test_dir)]
+
+        self.assertEqual(len(expected), 61)
+        self.assertEqual(len({os.path.realpath(path) for path in expected}), 61)
+        for output_size in (1024, 2):
+            walker = ParallelWalker(max_workers=4, follow_symlinks=True, deterministic=True,
+                                    output_size=output_size)
+            self.assertEqual([e.path for e in walker.walk(self.test_dir)], expected)
+        walker = ParallelWalker(max_workers=4, follow_symlinks=True)
+        self.assertEqual(len([e.path for e in walker.walk(self.test_dir)]), 61)
+
+    def test_early_exit_stops_workers(self):
+        """测试提前结束迭代时工作线程退出"""
+        walker = ParallelWalker(max_workers=4, output_size=1)
+        iterator = walker.walk(self.test_dir)
+        next(iterator)
+        iterator.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+from src.config.settings import SCAN_CONFIG
+from src.core.file_filter import FileFilter
+from src.core.file_scanner import FileScanner
+from src.core.watcher import LiveScanner, IN_Q_OVERFLOW
+
+
+def normalize(results):
+    """忽略顺序比较扫描结果"""
+    return {
+        'duplicates': {h: sorted(files) for h, files in results['duplicates'].items()},
+        'classified_files': {k: sorted(v) for k, v in results['classified_files'].items()},
+        'large_files': sorted(f['path'] for f in results['large_files']),
+        'old_files': sorted(f['path'] for f in results['old_files']),
+        'errors': sorted(e['path'] for e in results['errors']),
+    }
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), 'inotify is Linux only')
+class TestLiveScanner(unittest.TestCase):
+    def setUp(self):
+        """测试前创建目录树并开始监视"""
+        self.test_dir = tempfile.mkdtemp()
+        for i in range(2):
+            os.makedirs(os.path.join(self.test_dir, f'dir{i}'))
+            self._write(f'dir{i}/photo.jpg', b'same image')
+            self._write(f'dir{i}/notes{i}.txt', f'notes {i}'.encode())
+        self.scanner = FileScanner(ai_models=None)
+        self.scanner.file_filter = FileFilter(SCAN_CONFIG['ignore_patterns'])
+        self.live = LiveScanner(self.scanner, [self.test_dir], debounce=0.05).start()
+
+    def tearDown(self):
+        """测试后清理"""
+        self.live.close()
+        shutil.rmtree(self.test_dir)
+
+    def _write(self, name, data):
+        with open(os.path.join(self.test_dir, name), 'wb') as f:
+            f.write(data)
+
+    def _settle(self):
+        """处理事件直到没有新的变化"""
+        while self.live.poll(0.5):
+            pass
+
+    def assertMatchesFullScan(self):
+        self.assertEqual(normalize(self.live.results()),
+                         normalize(self.scanner.scan_directory(self.test_dir)))
+
+    def test_initial_state_matches_full_scan(self):
+        """测试启动时的结果与完整扫描一致"""
+        self.assertEqual(len(self.live.results()['duplicates']), 1)
+        self.assertMatchesFullScan()
+
+    def test_symlink_loop_is_not_watched(self):
+        """测试跟随符号链接时指向上级目录的符号链接环不会无限监视"""
+        os.symlink('..', os.path.join(self.test_dir, 'dir0', 'loop'))
+        self.live.close()
+        self.scanner.walker.follow_symlinks = True
+        self.live = LiveScanner(self.scanner, [self.test_dir], debounce=0.05).start()
+
+        self.assertEqual(sorted(self.live.dir_files),
+                         sorted([self.test_dir] + [os.path.join(self.test_dir, f'dir{i}')
+                                                  for i in range(2)]))
+        self.assertEqual(len(self.live.entries), 4)
+
+    def test_file_and_directory_changes(self):
+        """测试文件和目录的增删改都会更新结果"""
+        self._write('dir0/notes0.txt', b'notes 1')
+        self._write('dir1/photo.jpg', b'edited image')
+        os.remove(os.path.join(self.test_dir, 'dir1', 'notes1.txt'))
+        os.makedirs(os.path.join(self.test_dir, 'new', 'deep'))
+        self._write('new/deep/copy.jpg', b'same image')
+        os.rename(os.path.join(self.test_dir, 'dir1'), os.path.join(self.test_dir, 'moved'))
+        self._settle()
+
+        self.assertMatchesFullScan()
+        files = self.live.results()['classified_files']
+        self.assertIn(os.path.join(self.test_dir, 'moved', 'photo.jpg'), files['images'])
+
+        # 移动后的目录仍被监视
+        self._write('moved/late.txt', b'notes 0')
+        shutil.rmtree(os.path.join(self.test_dir, 'new'))
+        self._settle()
+        self.assertMatchesFullScan()
+
+    def test_overflow_triggers_resync(self):
+        """测试事件队列溢出后重新同步"""
+        self._write('dir0/extra.jpg', b'same image')
+        os.remove(os.path.join(self.test_dir, 'dir0', 'notes0.txt'))
+        # 原地修改不会改变dir1的修改时间，需要重新stat才能发现
+        self._write('dir1/notes1.txt', b'rewritten')
+        # 丢弃已产生的事件，模拟内核事件队列溢出
+        self.live.inotify.read_events(0.1)
+        self.live._dispatch(-1, IN_Q_OVERFLOW, '')
+        self.live.apply_pending()
+
+        self.assertMatchesFullScan()
+
+if __name__ == '__main__':
+    unittest.main()